@@ -12,4 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-__all__ = ["dataloader", "dataprep", "datacleaner"]
+__all__ = [
+    "dataloader",
+    "dataprep",
+    "datacleaner",
+    "gcs_utils",
+    "memo_cache",
+    "negative_cache",
+    "http_fetcher",
+    "image_utils",
+    "metrics",
+    "checkpoint",
+]
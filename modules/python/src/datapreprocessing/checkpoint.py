@@ -0,0 +1,247 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import io
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Set
+
+import pandas as pd
+
+from .gcs_utils import get_bucket, list_blob_names
+
+# Name of the Parquet object of a completed chunk, under the chunks folder of a run
+CHUNK_BLOB_NAME = re.compile(r"/chunk-(\d+)\.parquet$")
+
+
+class RunCheckpoint:
+    """
+    Persists the result of every completed chunk of a run to GCS, so a restarted run only processes the
+    remaining chunks.
+
+    The run is stored under gs://{bucket_name}/{prefix}/{run_id}/:
+        - manifest.json describes the run: its fingerprint, the number of chunks, the chunks completed by the
+          last attempt, and whether the run is complete.
+        - chunks/chunk-{index}.parquet holds the result of a chunk, with its DataFrame attrs (the chunk
+          metrics). An upload is atomic, so an object only exists for a chunk that completed. Completed chunks
+          are listed from these objects rather than recorded in the manifest, which GCS would only allow to be
+          rewritten about once per second.
+
+    The fingerprint covers the contents of the chunks and the processing configuration. When a run ID is
+    reused with different chunks or configuration, or after its run completed, its earlier results are
+    discarded. The caller marks the run complete with finish once its output is written, which deletes the
+    chunk objects and only keeps the manifest. Checkpoints of runs that are never finished are left to a
+    lifecycle rule of the bucket.
+
+    Attributes:
+        bucket_name (str): The name of the GCS bucket.
+        prefix (str): The folder of the checkpoints in the GCS bucket.
+        run_id (str): The ID of the run, stable across restarts of the run.
+        logger (logging.Logger): A logger object for logging information and errors.
+
+    Methods:
+        get_run_prefix() -> str: Returns the folder of the run.
+        get_chunk_blob_name(index: int) -> str: Returns the name of the object of a chunk.
+        fingerprint(chunks, config) -> str: Returns the fingerprint of a run.
+        start(chunks, config) -> Set[int]: Starts or resumes the run and returns the completed chunks.
+        save_chunk(index: int, df: pd.DataFrame): Persists the result of a completed chunk.
+        load_chunk(index: int) -> pd.DataFrame: Loads the result of a completed chunk.
+        record(completed): Records the chunks completed by an attempt in the manifest.
+        finish(): Marks the run complete and deletes its chunks.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, bucket_name: str, prefix: str, run_id: str):
+        """
+        Initializes a RunCheckpoint object.
+
+        Args:
+            bucket_name (str): The name of the GCS bucket.
+            prefix (str): The folder of the checkpoints in the GCS bucket.
+            run_id (str): The ID of the run, stable across restarts of the run.
+        """
+        self.bucket_name = bucket_name
+        self.prefix = prefix.strip("/")
+        self.run_id = run_id
+        self._fingerprint = None
+        self._num_chunks = None
+
+    def get_run_prefix(self) -> str:
+        """
+        Returns the folder of the run in the GCS bucket.
+
+        Returns:
+            str: The folder of the run.
+        """
+        return f"{self.prefix}/{self.run_id}"
+
+    def get_chunk_blob_name(self, index: int) -> str:
+        """
+        Returns the name of the object holding the result of a chunk.
+
+        Args:
+            index (int): The index of the chunk.
+
+        Returns:
+            str: The name of the object.
+        """
+        return f"{self.get_run_prefix()}/chunks/chunk-{index:06d}.parquet"
+
+    def fingerprint(
+        self, chunks: List[pd.DataFrame], config: Optional[Dict[str, Any]] = None
+    ) -> str:
+        """
+        Returns the fingerprint of a run, a hash of the contents of its chunks and of its configuration.
+
+        Args:
+            chunks (List[pd.DataFrame]): The input chunks.
+            config (Dict[str, Any], optional): The processing configuration. Defaults to None.
+
+        Returns:
+            str: The fingerprint.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(config or {}, sort_keys=True, default=str).encode())
+        for chunk in chunks:
+            digest.update(str(len(chunk)).encode())
+            digest.update(pd.util.hash_pandas_object(chunk, index=True).to_numpy())
+        return digest.hexdigest()
+
+    def _manifest_blob(self):
+        return get_bucket(self.bucket_name).blob(
+            f"{self.get_run_prefix()}/manifest.json"
+        )
+
+    def _write_manifest(self, **fields) -> None:
+        manifest = {
+            "run_id": self.run_id,
+            "fingerprint": self._fingerprint,
+            "num_chunks": self._num_chunks,
+            **fields,
+        }
+        self._manifest_blob().upload_from_string(
+            json.dumps(manifest, indent=2), content_type="application/json"
+        )
+
+    def _list_completed(self) -> Set[int]:
+        names = list_blob_names(
+            self.bucket_name, f"{self.get_run_prefix()}/chunks/", refresh=True
+        )
+        completed = set()
+        for name in names:
+            match = CHUNK_BLOB_NAME.search(name)
+            if match:
+                completed.add(int(match.group(1)))
+        return completed
+
+    def _delete_chunks(self) -> None:
+        bucket = get_bucket(self.bucket_name)
+        for index in self._list_completed():
+            bucket.blob(self.get_chunk_blob_name(index)).delete()
+
+    def start(
+        self, chunks: List[pd.DataFrame], config: Optional[Dict[str, Any]] = None
+    ) -> Set[int]:
+        """
+        Starts the run, or resumes it if an incomplete run with the same fingerprint exists. Results of a run
+        with a different fingerprint or of a complete run are deleted.
+
+        Args:
+            chunks (List[pd.DataFrame]): The input chunks.
+            config (Dict[str, Any], optional): The processing configuration. Defaults to None.
+
+        Returns:
+            Set[int]: The indices of the chunks completed by earlier attempts of the run.
+        """
+        self._fingerprint = self.fingerprint(chunks, config)
+        self._num_chunks = len(chunks)
+        manifest_blob = self._manifest_blob()
+        manifest = None
+        if manifest_blob.exists():
+            manifest = json.loads(manifest_blob.download_as_bytes())
+
+        if manifest is not None and manifest.get("complete"):
+            self.logger.info(f"Run '{self.run_id}' already completed, starting over")
+            self._delete_chunks()
+        elif manifest is not None and manifest.get("fingerprint") == self._fingerprint:
+            completed = self._list_completed()
+            self.logger.info(
+                f"Resuming run '{self.run_id}' with {len(completed)}/{len(chunks)} chunks completed"
+            )
+            return completed
+        elif manifest is not None:
+            self.logger.warning(
+                f"Run '{self.run_id}' was checkpointed with different chunks or configuration, starting over"
+            )
+            self._delete_chunks()
+
+        self._write_manifest(complete=False)
+        self.logger.info(
+            f"Checkpointing run '{self.run_id}' to gs://{self.bucket_name}/{self.get_run_prefix()}"
+        )
+        return set()
+
+    def save_chunk(self, index: int, df: pd.DataFrame) -> None:
+        """
+        Persists the result of a completed chunk as Parquet, including its DataFrame attrs.
+
+        Args:
+            index (int): The index of the chunk.
+            df (pd.DataFrame): The result of the chunk.
+        """
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        buffer.seek(0)
+        get_bucket(self.bucket_name).blob(
+            self.get_chunk_blob_name(index)
+        ).upload_from_file(buffer, content_type="application/vnd.apache.parquet")
+
+    def load_chunk(self, index: int) -> pd.DataFrame:
+        """
+        Loads the result of a completed chunk, including its DataFrame attrs.
+
+        Args:
+            index (int): The index of the chunk.
+
+        Returns:
+            pd.DataFrame: The result of the chunk.
+        """
+        data = (
+            get_bucket(self.bucket_name)
+            .blob(self.get_chunk_blob_name(index))
+            .download_as_bytes()
+        )
+        return pd.read_parquet(io.BytesIO(data))
+
+    def record(self, completed: Set[int]) -> None:
+        """
+        Records the chunks completed by an attempt of the run in the manifest. Their objects are kept, so the
+        run can be resumed until it is finished.
+
+        Args:
+            completed (Set[int]): The indices of the completed chunks.
+        """
+        self._write_manifest(complete=False, completed=sorted(completed))
+
+    def finish(self) -> None:
+        """
+        Marks the run complete and deletes its chunk objects. Call it once the output of the run is written,
+        a restart before then still resumes from the chunks.
+        """
+        self._write_manifest(complete=True)
+        self._delete_chunks()
+        self.logger.info(f"Finished run '{self.run_id}'")
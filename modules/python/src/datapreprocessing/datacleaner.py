@@ -12,20 +12,85 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import contextvars
+import hashlib
+import json
 import logging
 import os
 import re
-import socket
+import tempfile
+import threading
 import urllib.error
-import urllib.request
-from typing import List
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
 
 import jsonpickle
+import numpy as np
 import pandas as pd
 import spacy
-from google.cloud import storage
+from google.api_core.exceptions import PreconditionFailed
 from google.cloud.storage.retry import DEFAULT_RETRY
 
+from . import metrics
+from .gcs_utils import get_bucket, get_storage_client, list_blob_names, per_process
+from .http_fetcher import HttpFetcher, get_http_fetcher
+from .image_utils import CorruptImageError, encode_jpeg, open_image
+from .memo_cache import MemoCache, get_memo_cache
+from .negative_cache import NegativeCache, get_negative_cache
+
+# Size of the reads used to stream an image response body into its buffer
+IMAGE_READ_CHUNK_SIZE = 64 * 1024
+
+# Marks the start of a quoted key or value in a product specification entry
+SPEC_VALUE_PREFIX = '=>"'
+
+
+class ImageFetchCancelled(Exception):
+    """Raised by DataPreprocessor.fetch_image when a hedged download loses the race."""
+
+
+def close_fetched_image(future: Future) -> None:
+    """Closes the image buffer of a fetch that finished after it was no longer needed."""
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+# Name of the canonical object of a deduplicated image, keyed by the SHA-256 of its stored bytes
+CONTENT_BLOB_NAME = re.compile(r"/sha256-([0-9a-f]{64})\.jpg$")
+
+# Characters removed from a product category tree before it is split
+CATEGORY_TREE_PUNCTUATION = r'[\[\]"]'
+
+SPACY_MODEL = "en_core_web_sm"
+# Lemmas only need the tagger, attribute ruler and lemmatizer
+SPACY_DISABLED_COMPONENTS = ("parser", "ner")
+
+
+def load_spacy_model(
+    name: str = SPACY_MODEL, disable: Tuple[str, ...] = SPACY_DISABLED_COMPONENTS
+):
+    """
+    Returns the spaCy model of the current process, downloading it only if it is not installed. The model is
+    loaded once per worker process and shared by every chunk and thread of that process.
+
+    Args:
+        name (str, optional): The name of the spaCy model. Defaults to SPACY_MODEL.
+        disable (Tuple[str, ...], optional): The pipeline components to disable. Defaults to SPACY_DISABLED_COMPONENTS.
+
+    Returns:
+        spacy.language.Language: The loaded spaCy model.
+    """
+
+    def load():
+        try:
+            return spacy.load(name, disable=list(disable))
+        except OSError:
+            spacy.cli.download(name)
+            return spacy.load(name, disable=list(disable))
+
+    return per_process(("spacy_model", name, tuple(disable)), load)
+
 
 class DataPreprocessor:
     """
@@ -33,23 +98,152 @@ class DataPreprocessor:
     and attribute parsing.
 
     Attributes:
+        max_download_workers (int): The number of image downloads kept in flight per worker. Defaults to 1 (sequential).
+        max_in_memory_image_bytes (int): The size above which a downloaded image is spooled to disk instead of memory.
+        download_dir (str): The directory used for images larger than max_in_memory_image_bytes.
+        skip_existing_images (bool): Whether to reuse product images already present in GCS (incremental ingestion).
+        nlp_batch_size (int): The number of descriptions per nlp.pipe batch.
+        description_cache_size (int): The number of lemmatized descriptions kept in memory per process.
+        description_cache_path (str): The path of a SQLite database persisting lemmatized descriptions, or None.
+        json_backend (str): The encoder of the parsed attributes, "json" or "jsonpickle".
+        max_category_depth (int): The fixed number of category level columns, or None for the depth of each chunk.
+        arrow_strings (bool): Whether to split the category tree as Arrow-backed strings.
+        hedged_fetch_urls (int): The number of candidate URLs of a product raced against each other.
+        hedge_delay (float): The seconds to wait before starting the next hedged request.
+        use_negative_cache (bool): Whether to skip image URLs that failed in earlier chunks or runs.
+        negative_cache_ttls (Dict[str, int]): The seconds a failure is remembered, per error class.
+        max_connections_per_host (int): The maximum number of concurrent image requests per host and process.
+        host_requests_per_second (float): The image request rate limit per host and process, or None for no limit.
+        request_timeout (Tuple[float, float]): The connect and read timeouts of an image request, in seconds.
+        normalize_images (bool): Whether images are decoded, validated, resized and re-encoded as JPEG before upload.
+        max_image_edge (int): The maximum width and height of a normalized image, in pixels.
+        image_quality (int): The JPEG quality of a normalized image.
+        keep_original_images (bool): Whether the original image is also uploaded, next to the normalized one.
+        dedup_images (bool): Whether identical images are stored once, shared by every product showing them.
+        stream_batch_size (int): The number of rows process_data streams through the stages at a time, or None for the whole chunk.
+        prefetch_batches (int): The number of batches whose images are downloaded ahead of the batch in the NLP stages.
         logger (logging.Logger): A logger object for logging information and errors.
 
     Methods:
         extract_url(image_list: str) -> List[str]: Extracts image URLs from a string.
+        get_http_fetcher() -> HttpFetcher: Returns the per-process HTTP fetcher used for image downloads.
+        setup(): Loads the per-process resources used by process_data ahead of the first chunk.
+        fetch_image(image_url, cancel_event): Streams an image into an in-memory buffer that spills to disk only when oversized.
+        upload_image(image_file, destination_blob_name, gcs_bucket, if_generation_match): Uploads an image from a file-like object to GCS.
+        store_image(image_file, destination_blob_name, gcs_bucket) -> str: Normalizes and deduplicates an image when configured and uploads it to GCS.
+        fetch_first_image(image_urls, ray_worker_node_id, negative_cache, failed): Races candidate image URLs and returns the first good response.
+        classify_download_error(err) -> str: Maps an image download error to its error class.
+        handle_download_error(err, image_url, ray_worker_node_id, negative_cache): Logs and records expected download errors and re-raises others.
+        store_downloaded_image(image_url, image_file_name, destination_blob_name, ray_worker_node_id, gcs_bucket) -> str: Downloads an image, stores it in GCS and returns its blob name.
         download_image(image_url, image_file_name, destination_blob_name, ray_worker_node_id, gcs_bucket): Downloads an image and uploads it to GCS.
-        prep_product_desc(df): Prepares the product description by performing NLP preprocessing.
+        get_single_product_image(id, image_list, ray_worker_node_id, gcs_bucket, gcs_folder, existing_blobs, negative_cache): Downloads the first working image of a single product.
+        lemmatize(doc) -> str: Joins the unique lemmas of a spaCy document.
+        get_description_cache() -> MemoCache: Returns the per-process memo cache of lemmatized descriptions.
+        parse_nlp_description(description: str) -> str: Lemmatizes a single product description.
+        parse_nlp_descriptions(texts, batch_size) -> List[str]: Lemmatizes descriptions in batches through the memo cache.
+        prep_product_desc(df, batch_size): Prepares the product description by performing batched NLP preprocessing.
+        parse_specification(specification: str) -> Dict[str, str]: Parses product specifications into a dictionary in a single pass.
+        encode_json(attributes) -> str: Encodes parsed attributes with the configured JSON backend.
         parse_attributes(specification: str): Parses product specifications into a JSON string.
-        get_product_image(df, ray_worker_node_id, gcs_bucket,gcs_folder): Downloads product images and adds their GCS URIs to the DataFrame.
+        parse_attributes_series(specifications: pd.Series) -> pd.Series: Parses a Series of product specifications.
+        get_product_image(df, ray_worker_node_id, gcs_bucket, gcs_folder, max_download_workers): Downloads product images concurrently and adds their GCS URIs to the DataFrame.
         reformat(text: str) -> str: Reformats a string by removing brackets and quotes.
-        prep_cat(df: pd.DataFrame) -> pd.DataFrame: Prepares product category information by splitting and cleaning the category tree.
-        process_data(df, ray_worker_node_id, gcs_bucket): Performs the complete data preprocessing pipeline.
+        prep_cat(df: pd.DataFrame, max_depth) -> pd.DataFrame: Prepares product category information by splitting and cleaning the category tree.
+        process_downloaded_batch(df) -> pd.DataFrame: Runs the description, attribute and category stages on a batch with image URIs.
+        process_batches(batches, ray_worker_node_id, gcs_bucket, gcs_folder) -> Iterator[pd.DataFrame]: Streams batches through the pipeline, downloading images ahead.
+        process_data(df, ray_worker_node_id, gcs_bucket): Performs the complete data preprocessing pipeline and records its metrics.
     """
 
     logger = logging.getLogger(__name__)
 
-    def __init__(self):
-        pass
+    def __init__(
+        self,
+        max_download_workers: int = 1,
+        max_in_memory_image_bytes: int = 8 * 1024 * 1024,
+        download_dir: str = "/tmp/images",
+        skip_existing_images: bool = False,
+        nlp_batch_size: int = 256,
+        description_cache_size: int = 100000,
+        description_cache_path: Optional[str] = None,
+        json_backend: str = "json",
+        max_category_depth: Optional[int] = None,
+        arrow_strings: bool = False,
+        hedged_fetch_urls: int = 0,
+        hedge_delay: float = 0.5,
+        use_negative_cache: bool = False,
+        negative_cache_ttls: Optional[Dict[str, int]] = None,
+        max_connections_per_host: int = 8,
+        host_requests_per_second: Optional[float] = None,
+        request_timeout: Tuple[float, float] = (10.0, 10.0),
+        normalize_images: bool = False,
+        max_image_edge: int = 1024,
+        image_quality: int = 85,
+        keep_original_images: bool = False,
+        dedup_images: bool = False,
+        stream_batch_size: Optional[int] = None,
+        prefetch_batches: int = 1,
+    ):
+        """
+        Initializes a DataPreprocessor object.
+
+        Args:
+            max_download_workers (int, optional): The number of image downloads kept in flight per worker. Defaults to 1.
+            max_in_memory_image_bytes (int, optional): The size above which a downloaded image is spooled to disk. Defaults to 8 MiB.
+            download_dir (str, optional): The directory used for images larger than max_in_memory_image_bytes. Defaults to "/tmp/images".
+            skip_existing_images (bool, optional): Whether to reuse product images already present in GCS instead of downloading them again. Defaults to False.
+            nlp_batch_size (int, optional): The number of descriptions per nlp.pipe batch. Defaults to 256.
+            description_cache_size (int, optional): The number of lemmatized descriptions kept in memory per process. Defaults to 100000.
+            description_cache_path (str, optional): The path of a SQLite database persisting lemmatized descriptions across runs. Defaults to None.
+            json_backend (str, optional): The encoder of the parsed attributes, "json" or "jsonpickle". Both produce the same output. Defaults to "json".
+            max_category_depth (int, optional): The fixed number of category level columns, or None for the depth of each chunk. Defaults to None.
+            arrow_strings (bool, optional): Whether to split the category tree as Arrow-backed strings. Requires pyarrow. Defaults to False.
+            hedged_fetch_urls (int, optional): The number of candidate URLs of a product raced against each other. 0 or 1 disables hedging. Defaults to 0.
+            hedge_delay (float, optional): The seconds to wait before starting the next hedged request. Defaults to 0.5.
+            use_negative_cache (bool, optional): Whether to skip image URLs that failed in earlier chunks or runs. Defaults to False.
+            negative_cache_ttls (Dict[str, int], optional): The seconds a failure is remembered, per error class. Defaults to DEFAULT_NEGATIVE_CACHE_TTLS.
+            max_connections_per_host (int, optional): The maximum number of concurrent image requests per host and process. Defaults to 8.
+            host_requests_per_second (float, optional): The image request rate limit per host and process. Defaults to None.
+            request_timeout (Tuple[float, float], optional): The connect and read timeouts of an image request, in seconds. Defaults to (10.0, 10.0).
+            normalize_images (bool, optional): Whether images are decoded, validated, resized and re-encoded as JPEG before upload. Requires Pillow. Defaults to False.
+            max_image_edge (int, optional): The maximum width and height of a normalized image, in pixels. Defaults to 1024.
+            image_quality (int, optional): The JPEG quality of a normalized image. Defaults to 85.
+            keep_original_images (bool, optional): Whether the original image is also uploaded as '{name}_original.jpg'. Defaults to False.
+            dedup_images (bool, optional): Whether byte-identical images are stored once as 'sha256-{sha256}.jpg' and an
+                'image_sha256' column is added. Cannot be combined with skip_existing_images, whose check looks for
+                the per-product names. Defaults to False.
+            stream_batch_size (int, optional): The number of rows process_data streams through the stages at a time. Defaults to None (the whole chunk).
+            prefetch_batches (int, optional): The number of batches whose images are downloaded ahead. Defaults to 1.
+        """
+        if skip_existing_images and dedup_images:
+            raise ValueError(
+                "skip_existing_images cannot be combined with dedup_images"
+            )
+        self.max_download_workers = max_download_workers
+        self.max_in_memory_image_bytes = max_in_memory_image_bytes
+        self.download_dir = download_dir
+        self.skip_existing_images = skip_existing_images
+        self.nlp_batch_size = nlp_batch_size
+        self.description_cache_size = description_cache_size
+        self.description_cache_path = description_cache_path
+        if json_backend not in ("json", "jsonpickle"):
+            raise ValueError(f"Unsupported JSON backend '{json_backend}'")
+        self.json_backend = json_backend
+        self.max_category_depth = max_category_depth
+        self.arrow_strings = arrow_strings
+        self.hedged_fetch_urls = hedged_fetch_urls
+        self.hedge_delay = hedge_delay
+        self.use_negative_cache = use_negative_cache
+        self.negative_cache_ttls = negative_cache_ttls
+        self.max_connections_per_host = max_connections_per_host
+        self.host_requests_per_second = host_requests_per_second
+        self.request_timeout = tuple(request_timeout)
+        self.normalize_images = normalize_images
+        self.max_image_edge = max_image_edge
+        self.image_quality = image_quality
+        self.keep_original_images = keep_original_images
+        self.dedup_images = dedup_images
+        self.stream_batch_size = stream_batch_size
+        self.prefetch_batches = prefetch_batches
 
     def extract_url(self, image_list: str) -> List[str]:
         """
@@ -63,53 +257,295 @@ class DataPreprocessor:
         """
         return image_list.replace("[", "").replace("]", "").replace('"', "").split(",")
 
-    def download_image(
+    def get_http_fetcher(self) -> HttpFetcher:
+        """
+        Returns the HTTP fetcher of the current process, which keeps connections and politeness limits per host
+        across the chunks a worker processes.
+
+        Returns:
+            HttpFetcher: The HTTP fetcher.
+        """
+        return get_http_fetcher(
+            max_connections_per_host=self.max_connections_per_host,
+            requests_per_second=self.host_requests_per_second,
+            timeout=self.request_timeout,
+        )
+
+    def setup(self) -> None:
+        """
+        Loads the per-process resources used by process_data ahead of the first chunk: the spaCy model, the
+        description cache, the HTTP fetcher and the GCS client. Called once by a long-lived worker, such as an
+        actor of RayUtils, so their setup cost is not paid by the chunk it processes first.
+        """
+        load_spacy_model()
+        self.get_description_cache()
+        self.get_http_fetcher()
+        get_storage_client()
+
+    def fetch_image(
+        self, image_url: str, cancel_event: Optional[threading.Event] = None
+    ) -> tempfile.SpooledTemporaryFile:
+        """
+        Streams an image from a URL into a buffer that is kept in memory up to max_in_memory_image_bytes
+        and rolls over to a temporary file in download_dir above that size. download_dir is only created
+        when a buffer rolls over.
+
+        Args:
+            image_url (str): The URL of the image to download.
+            cancel_event (threading.Event, optional): When set, the download is abandoned with ImageFetchCancelled. Defaults to None.
+
+        Returns:
+            tempfile.SpooledTemporaryFile: The buffer holding the image, rewound to the start. The caller must close it.
+        """
+        image_file = tempfile.SpooledTemporaryFile(
+            max_size=self.max_in_memory_image_bytes, dir=self.download_dir
+        )
+        downloaded = 0
+        try:
+            with self.get_http_fetcher().open(image_url) as response:
+                for chunk in response.iter_content(IMAGE_READ_CHUNK_SIZE):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ImageFetchCancelled(image_url)
+                    if (
+                        downloaded
+                        <= self.max_in_memory_image_bytes
+                        < downloaded + len(chunk)
+                    ):
+                        # This write rolls the buffer over to a file in download_dir
+                        os.makedirs(self.download_dir, exist_ok=True)
+                    image_file.write(chunk)
+                    downloaded += len(chunk)
+            image_file.seek(0)
+            return image_file
+        except BaseException:
+            image_file.close()
+            raise
+        finally:
+            metrics.count("image_requests")
+            metrics.count("image_bytes_downloaded", downloaded)
+
+    def upload_image(
         self,
-        image_url: str,
-        image_file_name: str,
+        image_file,
         destination_blob_name: str,
-        ray_worker_node_id: int,
         gcs_bucket: str,
-    ) -> bool:
+        if_generation_match: Optional[int] = None,
+    ) -> None:
         """
-        Downloads an image from a URL and uploads it to Google Cloud Storage.
+        Uploads an image from a file-like object to Google Cloud Storage. The size is passed to the client
+        so small images go out as a single multipart request and large ones as a resumable upload.
 
         Args:
-            image_url (str): The URL of the image to download.
-            image_file_name (str): The local file name to save the downloaded image as.
+            image_file (file-like): The image data, positioned at the start.
+            destination_blob_name (str): The name of the blob in GCS to upload the image to.
+            gcs_bucket (str): The name of the GCS bucket.
+            if_generation_match (int, optional): A generation precondition, 0 to only create the blob. Defaults to None.
+        """
+        size = image_file.seek(0, os.SEEK_END)
+        image_file.seek(0)
+        bucket = get_bucket(gcs_bucket)
+        blob = bucket.blob(destination_blob_name)
+        blob.upload_from_file(
+            image_file,
+            size=size,
+            retry=DEFAULT_RETRY,
+            if_generation_match=if_generation_match,
+        )
+        metrics.count("images_uploaded")
+        metrics.count("image_bytes_uploaded", size)
+
+    def store_image(
+        self, image_file, destination_blob_name: str, gcs_bucket: str
+    ) -> str:
+        """
+        Uploads a downloaded image to Google Cloud Storage.
+
+        When normalize_images is set, the image is decoded and validated, resized to fit within max_image_edge and
+        re-encoded as JPEG first, so corrupt images never get a GCS URI and the embedding step downloads compact
+        images only. When dedup_images is set, the image is stored as 'sha256-{sha256}.jpg' next to
+        destination_blob_name instead, keyed by the SHA-256 of the stored bytes, and is only uploaded if no
+        product stored the same bytes before. Each upload only creates its object, and an object that already
+        exists is left as it is.
+
+        Args:
+            image_file (file-like): The downloaded image data, positioned at the start.
             destination_blob_name (str): The name of the blob in GCS to upload the image to.
-            ray_worker_node_id (int): The ID of the Ray worker node (for logging).
             gcs_bucket (str): The name of the GCS bucket.
 
         Returns:
-            bool: True if the image was downloaded and uploaded successfully, False otherwise.  Raises exceptions on errors.
+            str: The name of the blob holding the image.
+
+        Raises:
+            CorruptImageError: If normalize_images is set and the image cannot be decoded.
         """
-        storage_client = storage.Client()
-        download_dir = "/tmp/images"
+        if not self.normalize_images and not self.dedup_images:
+            self.upload_image(image_file, destination_blob_name, gcs_bucket)
+            return destination_blob_name
+        if self.normalize_images:
+            image = open_image(
+                image_file, draft_size=(self.max_image_edge, self.max_image_edge)
+            )
+            stored = encode_jpeg(image, self.max_image_edge, self.image_quality)
+        else:
+            image_file.seek(0)
+            stored = image_file
+        if_generation_match = None
+        if self.dedup_images:
+            folder = os.path.dirname(destination_blob_name)
+            digest = hashlib.sha256()
+            for block in iter(lambda: stored.read(IMAGE_READ_CHUNK_SIZE), b""):
+                digest.update(block)
+            destination_blob_name = f"{folder}/sha256-{digest.hexdigest()}.jpg"
+            if_generation_match = 0
+        uploads = [(stored, destination_blob_name)]
+        if self.keep_original_images and self.normalize_images:
+            root, ext = os.path.splitext(destination_blob_name)
+            uploads.insert(0, (image_file, f"{root}_original{ext}"))
         try:
-            if not os.path.exists(download_dir):
-                os.makedirs(download_dir)
-        except FileExistsError as err:
-            self.logger.warning(f"Directory '{download_dir}' already exists")
+            # The original and the normalized image are checked separately, either may exist already
+            for data, blob_name in uploads:
+                try:
+                    self.upload_image(data, blob_name, gcs_bucket, if_generation_match)
+                except PreconditionFailed:
+                    self.logger.debug(f"Image {blob_name} is already stored")
+                    if blob_name == destination_blob_name:
+                        metrics.count("images_deduplicated")
+        finally:
+            if stored is not image_file:
+                stored.close()
+        return destination_blob_name
 
+    def fetch_first_image(
+        self,
+        image_urls: List[str],
+        ray_worker_node_id: int,
+        negative_cache: Optional[NegativeCache] = None,
+        failed: Optional[Set[int]] = None,
+    ) -> Tuple[Optional[int], Optional[tempfile.SpooledTemporaryFile]]:
+        """
+        Races the candidate image URLs of a product and returns the first good response.
+
+        The first URL is requested right away and each further URL is started hedge_delay seconds later, or
+        as soon as an earlier request fails. When several requests have succeeded by the time one is picked,
+        the one with the lowest index wins. All other requests are cancelled.
+
+        Args:
+            image_urls (List[str]): The candidate image URLs, in priority order.
+            ray_worker_node_id (int): The ID of the Ray worker node (for logging).
+            negative_cache (NegativeCache, optional): The cache failed URLs are recorded in. Defaults to None.
+            failed (Set[int], optional): Collects the indexes of the URLs whose requests failed. Defaults to None.
+
+        Returns:
+            Tuple[Optional[int], Optional[tempfile.SpooledTemporaryFile]]: The index of the winning URL and the
+                buffer holding its image, which the caller must close, or (None, None) if every URL failed.
+        """
+        cancel_event = threading.Event()
+        executor = ThreadPoolExecutor(
+            max_workers=len(image_urls),
+            thread_name_prefix=f"image-hedge-{ray_worker_node_id}",
+        )
+        indexes = {}
+        pending = set()
         try:
-            download_file = f"{download_dir}/{image_file_name}"
+            next_index = 0
+            while next_index < len(image_urls) or pending:
+                timeout = None
+                if next_index < len(image_urls):
+                    future = executor.submit(
+                        contextvars.copy_context().run,
+                        self.fetch_image,
+                        image_urls[next_index].strip(),
+                        cancel_event,
+                    )
+                    indexes[future] = next_index
+                    pending.add(future)
+                    next_index += 1
+                    if next_index < len(image_urls):
+                        timeout = self.hedge_delay
+                done, pending = wait(
+                    pending, timeout=timeout, return_when=FIRST_COMPLETED
+                )
+                succeeded = []
+                for future in sorted(done, key=indexes.get):
+                    if future.exception() is None:
+                        succeeded.append(future)
+                    else:
+                        if failed is not None:
+                            failed.add(indexes[future])
+                        self.handle_download_error(
+                            future.exception(),
+                            image_urls[indexes[future]].strip(),
+                            ray_worker_node_id,
+                            negative_cache,
+                        )
+                if succeeded:
+                    for future in succeeded[1:]:
+                        future.result().close()
+                    return indexes[succeeded[0]], succeeded[0].result()
+            return None, None
+        finally:
+            cancel_event.set()
+            for future in pending:
+                future.add_done_callback(close_fetched_image)
+            executor.shutdown(wait=False, cancel_futures=True)
 
-            socket.setdefaulttimeout(10)
-            urllib.request.urlretrieve(image_url, download_file)
-            bucket = storage_client.bucket(gcs_bucket)
-            blob = bucket.blob(destination_blob_name)
-            blob.upload_from_filename(download_file, retry=DEFAULT_RETRY)
-            self.logger.info(
-                f"ray_worker_node_id:{ray_worker_node_id} File {image_file_name} uploaded to {destination_blob_name}"
-            )
-            os.remove(download_file)
-            return True
-        except TimeoutError as err:
+    def classify_download_error(self, err: Exception) -> Optional[str]:
+        """
+        Maps an image download error to its error class.
+
+        Args:
+            err (Exception): The exception raised while downloading the image.
+
+        Returns:
+            Optional[str]: "timeout", "not_found", "gateway_timeout", "rate_limited", "server_error", "http_error",
+                "url_error" or "corrupt_image", or None for unexpected errors.
+        """
+        if isinstance(err, CorruptImageError):
+            return "corrupt_image"
+        if isinstance(err, TimeoutError):
+            return "timeout"
+        if isinstance(err, urllib.error.HTTPError):
+            if err.code == 404:
+                return "not_found"
+            if err.code == 504:
+                return "gateway_timeout"
+            if err.code == 429:
+                return "rate_limited"
+            if err.code >= 500:
+                return "server_error"
+            return "http_error"
+        if isinstance(err, urllib.error.URLError):
+            return "url_error"
+        return None
+
+    def handle_download_error(
+        self,
+        err: Exception,
+        image_url: str,
+        ray_worker_node_id: int,
+        negative_cache: Optional[NegativeCache] = None,
+    ) -> Optional[str]:
+        """
+        Logs an expected image download error, records the URL in the negative cache and re-raises any other exception.
+
+        Args:
+            err (Exception): The exception raised while downloading or uploading the image.
+            image_url (str): The URL of the image.
+            ray_worker_node_id (int): The ID of the Ray worker node (for logging).
+            negative_cache (NegativeCache, optional): The cache failed URLs are recorded in. Defaults to None.
+
+        Returns:
+            Optional[str]: The error class of the failure.
+        """
+        error_class = self.classify_download_error(err)
+        metrics.count(f"download_errors.{error_class or 'unhandled'}")
+        if error_class is not None and negative_cache is not None:
+            negative_cache.record(image_url, error_class)
+        if isinstance(err, TimeoutError):
             self.logger.warning(
                 f"ray_worker_node_id:{ray_worker_node_id} Image '{image_url}' request timeout"
             )
-        except urllib.error.HTTPError as err:
+        elif isinstance(err, urllib.error.HTTPError):
             if err.code == 404:
                 self.logger.warning(
                     f"ray_worker_node_id:{ray_worker_node_id} Image '{image_url}' not found"
@@ -122,50 +558,290 @@ class DataPreprocessor:
                 self.logger.error(
                     f"ray_worker_node_id:{ray_worker_node_id} Unhandled HTTPError exception: {err}"
                 )
-        except urllib.error.URLError as err:
+        elif isinstance(err, urllib.error.URLError):
             self.logger.error(
                 f"ray_worker_node_id:{ray_worker_node_id} URLError exception: {err}"
             )
-        except Exception as err:
+        elif isinstance(err, CorruptImageError):
+            self.logger.warning(
+                f"ray_worker_node_id:{ray_worker_node_id} Image '{image_url}' is corrupt: {err}"
+            )
+        else:
             self.logger.error(
                 f"ray_worker_node_id:{ray_worker_node_id} Unhandled exception: {err}"
             )
-            raise
+            raise err
+        return error_class
+
+    def store_downloaded_image(
+        self,
+        image_url: str,
+        image_file_name: str,
+        destination_blob_name: str,
+        ray_worker_node_id: int,
+        gcs_bucket: str,
+        negative_cache: Optional[NegativeCache] = None,
+    ) -> Optional[str]:
+        """
+        Downloads an image from a URL, stores it in Google Cloud Storage and returns the name of the blob holding it.
+
+        The response body is streamed into a spooled buffer and uploaded from there, so local disk is only
+        touched for images larger than max_in_memory_image_bytes. The upload goes through the per-process
+        GCS client and bucket cache, so the client, its HTTP session and its connections are reused across images.
+
+        Args:
+            image_url (str): The URL of the image to download.
+            image_file_name (str): The file name of the image (for logging).
+            destination_blob_name (str): The name of the blob in GCS to upload the image to.
+            ray_worker_node_id (int): The ID of the Ray worker node (for logging).
+            gcs_bucket (str): The name of the GCS bucket.
+            negative_cache (NegativeCache, optional): The cache failed URLs are recorded in. Defaults to None.
+
+        Returns:
+            Optional[str]: The name of the blob holding the image, which differs from destination_blob_name when
+                dedup_images is set, or None if the image could not be downloaded. Raises exceptions on errors.
+        """
+        try:
+            with self.fetch_image(image_url) as image_file:
+                stored_blob_name = self.store_image(
+                    image_file, destination_blob_name, gcs_bucket
+                )
+            self.logger.info(
+                f"ray_worker_node_id:{ray_worker_node_id} File {image_file_name} uploaded to {stored_blob_name}"
+            )
+            return stored_blob_name
+        except Exception as err:
+            self.handle_download_error(
+                err, image_url, ray_worker_node_id, negative_cache
+            )
 
-        return False
+        return None
 
-    def prep_product_desc(self, df: pd.DataFrame) -> pd.DataFrame:
+    def download_image(
+        self,
+        image_url: str,
+        image_file_name: str,
+        destination_blob_name: str,
+        ray_worker_node_id: int,
+        gcs_bucket: str,
+        negative_cache: Optional[NegativeCache] = None,
+    ) -> bool:
+        """
+        Downloads an image from a URL and uploads it to Google Cloud Storage.
+
+        Args:
+            image_url (str): The URL of the image to download.
+            image_file_name (str): The file name of the image (for logging).
+            destination_blob_name (str): The name of the blob in GCS to upload the image to.
+            ray_worker_node_id (int): The ID of the Ray worker node (for logging).
+            gcs_bucket (str): The name of the GCS bucket.
+            negative_cache (NegativeCache, optional): The cache failed URLs are recorded in. Defaults to None.
+
+        Returns:
+            bool: True if the image was downloaded and uploaded successfully, False otherwise.  Raises exceptions on errors.
+        """
+        return (
+            self.store_downloaded_image(
+                image_url,
+                image_file_name,
+                destination_blob_name,
+                ray_worker_node_id,
+                gcs_bucket,
+                negative_cache,
+            )
+            is not None
+        )
+
+    def lemmatize(self, doc) -> str:
+        """
+        Joins the unique lemmas of the alphabetic, non stop word tokens of a spaCy document.
+
+        Args:
+            doc (spacy.tokens.Doc): The processed document.
+
+        Returns:
+            str: The space separated lemmas, in order of first occurrence.
+        """
+        lemmas = []
+        seen = set()
+        for token in doc:
+            if token.lemma_ not in seen and not token.is_stop and token.is_alpha:
+                seen.add(token.lemma_)
+                lemmas.append(token.lemma_)
+        return " ".join(lemmas)
+
+    def get_description_cache(self) -> MemoCache:
+        """
+        Returns the memo cache of lemmatized descriptions for the current process.
+
+        Returns:
+            MemoCache: The memo cache, keyed by the spaCy model and the lower-cased description.
+        """
+        return get_memo_cache(
+            f"{SPACY_MODEL}:{spacy.__version__}",
+            self.description_cache_size,
+            self.description_cache_path,
+        )
+
+    def parse_nlp_description(self, description: str) -> Optional[str]:
+        """
+        Lemmatizes a single product description.
+
+        Args:
+            description (str): The product description.
+
+        Returns:
+            Optional[str]: The lemmatized description, or None if the input is NaN or cannot be processed.
+        """
+        if not pd.isna(description):
+            try:
+                text = description.lower()
+                cache = self.get_description_cache()
+                key = cache.key(text)
+                cached = cache.get_many([key])
+                if key in cached:
+                    return cached[key]
+                model = load_spacy_model()
+                lemmas = self.lemmatize(model(text))
+                cache.put_many([(key, lemmas)])
+                return lemmas
+            except:
+                self.logger.error("Unable to load spacy model")
+        return None
+
+    def parse_nlp_descriptions(
+        self, texts: List[str], batch_size: Optional[int] = None
+    ) -> List[str]:
+        """
+        Lemmatizes lower-cased descriptions in batches. Each distinct text is processed once, and texts
+        already in the description memo cache are not processed at all.
+
+        Args:
+            texts (List[str]): The lower-cased product descriptions.
+            batch_size (int, optional): The number of descriptions per nlp.pipe batch. Defaults to the instance setting.
+
+        Returns:
+            List[str]: The lemmatized descriptions, in the order of the input.
+        """
+        if batch_size is None:
+            batch_size = self.nlp_batch_size
+        cache = self.get_description_cache()
+        keys = [cache.key(text) for text in texts]
+        results = cache.get_many(list(dict.fromkeys(keys)))
+        pending = {key: text for key, text in zip(keys, texts) if key not in results}
+        if pending:
+            model = load_spacy_model()
+            parsed = dict(
+                zip(
+                    pending.keys(),
+                    (
+                        self.lemmatize(doc)
+                        for doc in model.pipe(pending.values(), batch_size=batch_size)
+                    ),
+                )
+            )
+            cache.put_many(parsed.items())
+            results.update(parsed)
+        metrics.count("descriptions_lemmatized", len(pending))
+        metrics.count("descriptions_reused", len(texts) - len(pending))
+        self.logger.debug(
+            f"Lemmatized {len(pending)} of {len(texts)} descriptions, the rest were duplicates or cached"
+        )
+        return [results[key] for key in keys]
+
+    def prep_product_desc(
+        self, df: pd.DataFrame, batch_size: Optional[int] = None
+    ) -> pd.DataFrame:
         """
         Prepares the product description by performing NLP preprocessing using spaCy.
 
+        The descriptions are lemmatized in batches with nlp.pipe, using the spaCy model cached for the worker
+        process with the components lemmas do not depend on disabled. Repeated descriptions are served from
+        the description memo cache.
+
         Args:
             df (pd.DataFrame): The input DataFrame containing the 'description' column.
+            batch_size (int, optional): The number of descriptions per nlp.pipe batch. Defaults to the instance setting.
 
         Returns:
             pd.DataFrame: The DataFrame with the preprocessed 'description' column.
         """
-        spacy.cli.download("en_core_web_sm")
-        model = spacy.load("en_core_web_sm")
+        descriptions = df["description"]
+        is_text = descriptions.map(lambda description: isinstance(description, str))
+        texts = [description.lower() for description in descriptions[is_text]]
 
-        def parse_nlp_description(description: str) -> str:
-            if not pd.isna(description):
-                try:
-                    doc = model(description.lower())
-                    lemmas = []
-                    for token in doc:
-                        if (
-                            token.lemma_ not in lemmas
-                            and not token.is_stop
-                            and token.is_alpha
-                        ):
-                            lemmas.append(token.lemma_)
-                    return " ".join(lemmas)
-                except:
-                    self.logger.error("Unable to load spacy model")
-
-        df["description"] = df["description"].apply(parse_nlp_description)
+        parsed = pd.Series(
+            [None] * len(descriptions), index=descriptions.index, dtype=object
+        )
+        try:
+            parsed.loc[is_text] = self.parse_nlp_descriptions(texts, batch_size)
+            # Anything else that is not NaN goes through the single description path
+            others = ~is_text & descriptions.notna()
+            parsed.loc[others] = descriptions[others].map(self.parse_nlp_description)
+        except Exception:
+            self.logger.warning(
+                "Batched description parsing failed, parsing descriptions one at a time"
+            )
+            parsed = descriptions.map(self.parse_nlp_description)
+
+        df["description"] = parsed
         return df
 
+    def parse_specification(self, specification: str) -> Dict[str, str]:
+        """
+        Parses a product specification string of the form
+        '{"product_specification"=>[{"key"=>"k", "value"=>"v"}, ...]}' into a dictionary.
+
+        The string is scanned once: the list between the first '[' and the last ']' of the first line is split
+        on '}', and in each entry the first two '=>"..."' values are taken as the key and the value.
+
+        Args:
+            specification (str): A string containing the product specifications.
+
+        Returns:
+            Dict[str, str]: The parsed attributes, in order of first occurrence.
+        """
+        out = {}
+        # Only the first line is considered, as in a regex without DOTALL
+        line = specification.split("\n", 1)[0]
+        start = line.find("[")
+        end = line.rfind("]")
+        if start == -1 or end <= start:
+            return out
+        # Text after the last '}' is not a complete entry
+        for phrase in line[start + 1 : end].split("}")[:-1]:
+            key_start = phrase.find(SPEC_VALUE_PREFIX)
+            if key_start == -1:
+                continue
+            key_start += len(SPEC_VALUE_PREFIX)
+            key_end = phrase.find('"', key_start)
+            if key_end == -1:
+                continue
+            value_start = phrase.find(SPEC_VALUE_PREFIX, key_end + 1)
+            if value_start == -1:
+                continue
+            value_start += len(SPEC_VALUE_PREFIX)
+            value_end = phrase.find('"', value_start)
+            if value_end == -1:
+                continue
+            out[phrase[key_start:key_end]] = phrase[value_start:value_end]
+        return out
+
+    def encode_json(self, attributes: Dict[str, str]) -> str:
+        """
+        Encodes parsed attributes as a JSON string with the configured JSON backend.
+
+        Args:
+            attributes (Dict[str, str]): The parsed attributes.
+
+        Returns:
+            str: The JSON string.
+        """
+        if self.json_backend == "jsonpickle":
+            return jsonpickle.encode(attributes)
+        # The C accelerated encoder produces the same output as jsonpickle for string dictionaries
+        return json.dumps(attributes)
+
     def parse_attributes(self, specification: str) -> str:
         """
         Parses product specifications from a string into a JSON string.
@@ -176,83 +852,242 @@ class DataPreprocessor:
         Returns:
             str: A JSON string representing the parsed attributes, or None if the input is invalid or NaN.
         """
-        spec_match_one = re.compile("(.*?)\\[(.*)\\](.*)")
-        spec_match_two = re.compile('(.*?)=>"(.*?)"(.*?)=>"(.*?)"(.*)')
         if pd.isna(specification):
             return None
-        m = spec_match_one.match(specification)
-        out = {}
-        if m is not None and m.group(2) is not None:
-            phrase = ""
-            for c in m.group(2):
-                if c == "}":
-                    m2 = spec_match_two.match(phrase)
-                    if m2 and m2.group(2) is not None and m2.group(4) is not None:
-                        out[m2.group(2)] = m2.group(4)
-                    phrase = ""
-                else:
-                    phrase += c
-        json_string = jsonpickle.encode(out)
-        return json_string
+        return self.encode_json(self.parse_specification(specification))
 
-    def get_product_image(
+    def parse_attributes_series(self, specifications: pd.Series) -> pd.Series:
+        """
+        Parses a Series of product specifications into JSON strings, parsing each distinct specification once.
+
+        Args:
+            specifications (pd.Series): The product specifications.
+
+        Returns:
+            pd.Series: The JSON strings, with None for NaN specifications, aligned with the input index.
+        """
+        codes, uniques = pd.factorize(specifications)
+        # NaN specifications get the code -1, which picks the trailing None
+        parsed = np.array(
+            [self.parse_attributes(specification) for specification in uniques]
+            + [None],
+            dtype=object,
+        )
+        return pd.Series(parsed[codes], index=specifications.index, dtype=object)
+
+    def get_single_product_image(
         self,
-        df: pd.DataFrame,
+        id: str,
+        image_list: str,
         ray_worker_node_id: int,
         gcs_bucket: str,
         gcs_folder: str,
-    ) -> pd.DataFrame:
+        existing_blobs: Optional[FrozenSet[str]] = None,
+        negative_cache: Optional[NegativeCache] = None,
+    ) -> Optional[str]:
         """
-        Downloads product images for each product in the DataFrame and adds the GCS URI to a new 'image_uri' column.
+        Downloads the first working image of a single product and uploads it to GCS.
+
+        With hedged_fetch_urls set, the first candidate URLs are raced with fetch_first_image and the image
+        is stored under the index of the URL that won. Remaining candidates are tried in order.
 
         Args:
-            df (pd.DataFrame): The input DataFrame containing product information and image URLs.
+            id (str): The unique ID of the product.
+            image_list (str): A string containing the product's candidate image URLs.
             ray_worker_node_id (int): The ID of the Ray worker node (for logging).
             gcs_bucket (str): The name of the GCS bucket.
             gcs_folder (str): The folder in the GCS bucket where the images will be stored.
+            existing_blobs (FrozenSet[str], optional): Blob names already present in GCS. When one of the product's
+                images is in the set, it is reused and no download happens. Defaults to None.
+            negative_cache (NegativeCache, optional): The cache of failed URLs. Known dead URLs are skipped and
+                new failures are recorded. Defaults to None.
 
         Returns:
-            pd.DataFrame: The DataFrame with the added 'image_uri' column.
+            Optional[str]: The GCS URI of the uploaded image, or None if no image could be downloaded.
         """
-        products_with_no_image_count = 0
-        products_with_no_image = []
-        gcs_image_url = []
-
-        image_found_flag = False
-        for id, image_list in zip(df["uniq_id"], df["image"]):
-
-            if pd.isnull(image_list):  # No image url
-                self.logger.warning(f"No image url for product {id}")
-                products_with_no_image_count += 1
-                products_with_no_image.append(id)
-                gcs_image_url.append(None)
-                continue
-            image_urls = self.extract_url(image_list)
+        if pd.isnull(image_list):  # No image url
+            self.logger.warning(f"No image url for product {id}")
+            return None
+        image_urls = self.extract_url(image_list)
+        if existing_blobs:
             for index in range(len(image_urls)):
-                image_url = image_urls[index].strip()
-                image_file_name = f"{id}_{index}.jpg"
                 destination_blob_name = f"{gcs_folder}/{id}_{index}.jpg"
-                image_found_flag = self.download_image(
+                if destination_blob_name in existing_blobs:
+                    self.logger.debug(
+                        f"ray_worker_node_id:{ray_worker_node_id} Image {destination_blob_name} already exists"
+                    )
+                    metrics.count("images_reused")
+                    return "gs://" + gcs_bucket + "/" + destination_blob_name
+        candidates = [
+            (index, image_url.strip()) for index, image_url in enumerate(image_urls)
+        ]
+        if negative_cache is not None:
+            known_candidates = len(candidates)
+            candidates = [
+                (index, image_url)
+                for index, image_url in candidates
+                if negative_cache.lookup(image_url) is None
+            ]
+            metrics.count("image_urls_skipped_dead", known_candidates - len(candidates))
+        if self.hedged_fetch_urls > 1 and len(candidates) > 1:
+            hedged = candidates[: self.hedged_fetch_urls]
+            failed = set()
+            winner, image_file = self.fetch_first_image(
+                [image_url for _, image_url in hedged],
+                ray_worker_node_id,
+                negative_cache,
+                failed,
+            )
+            if image_file is not None:
+                index, image_url = hedged[winner]
+                destination_blob_name = f"{gcs_folder}/{id}_{index}.jpg"
+                try:
+                    with image_file:
+                        stored_blob_name = self.store_image(
+                            image_file, destination_blob_name, gcs_bucket
+                        )
+                    self.logger.info(
+                        f"ray_worker_node_id:{ray_worker_node_id} File {id}_{index}.jpg uploaded to {stored_blob_name}"
+                    )
+                    return "gs://" + gcs_bucket + "/" + stored_blob_name
+                except CorruptImageError as err:
+                    self.handle_download_error(
+                        err, image_url, ray_worker_node_id, negative_cache
+                    )
+                # The losers of the race that did not fail are tried again one at a time
+                failed_urls = {hedged[i][1] for i in failed}
+                candidates = [
+                    (index, url)
+                    for index, url in candidates
+                    if url != image_url
+                    and url not in failed_urls
+                    and (negative_cache is None or negative_cache.lookup(url) is None)
+                ]
+            else:
+                # Candidates beyond the hedged ones are still tried one at a time
+                candidates = candidates[len(hedged) :]
+        for index, image_url in candidates:
+            image_file_name = f"{id}_{index}.jpg"
+            destination_blob_name = f"{gcs_folder}/{id}_{index}.jpg"
+            if self.dedup_images:
+                # The canonical name of a deduplicated image is only known once it is downloaded
+                stored_blob_name = self.store_downloaded_image(
                     image_url,
                     image_file_name,
                     destination_blob_name,
                     ray_worker_node_id,
                     gcs_bucket,
+                    negative_cache,
                 )
-                if image_found_flag:
-                    gcs_image_url.append(
-                        "gs://" + gcs_bucket + "/" + destination_blob_name
-                    )
-                    break
-            if not image_found_flag:
-                self.logger.warning(f"No image found for product {id}")
-                products_with_no_image_count += 1
-                products_with_no_image.append(id)
-                gcs_image_url.append(None)
+                if stored_blob_name:
+                    return "gs://" + gcs_bucket + "/" + stored_blob_name
+                continue
+            image_found_flag = self.download_image(
+                image_url,
+                image_file_name,
+                destination_blob_name,
+                ray_worker_node_id,
+                gcs_bucket,
+                negative_cache=negative_cache,
+            )
+            if image_found_flag:
+                return "gs://" + gcs_bucket + "/" + destination_blob_name
+        self.logger.warning(f"No image found for product {id}")
+        return None
+
+    def get_product_image(
+        self,
+        df: pd.DataFrame,
+        ray_worker_node_id: int,
+        gcs_bucket: str,
+        gcs_folder: str,
+        max_download_workers: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Downloads product images for each product in the DataFrame and adds the GCS URI to a new 'image_uri' column.
+
+        Products are downloaded concurrently on a bounded thread pool when more than one download worker is
+        configured. The candidate URLs of a single product are still tried in order, so the first working URL
+        wins, and the 'image_uri' column keeps the row order of the input DataFrame.
+
+        When skip_existing_images is set, the destination folder is listed once per worker process and products
+        whose image is already in GCS are not downloaded again. When use_negative_cache is set, URLs that failed
+        recently are skipped, and new failures are written to '{gcs_folder}_negative_cache/' at the end of the chunk.
+        When dedup_images is set, products showing the same image get the same 'image_uri', and an 'image_sha256'
+        column holding the SHA-256 of the stored image is added.
+
+        Args:
+            df (pd.DataFrame): The input DataFrame containing product information and image URLs.
+            ray_worker_node_id (int): The ID of the Ray worker node (for logging).
+            gcs_bucket (str): The name of the GCS bucket.
+            gcs_folder (str): The folder in the GCS bucket where the images will be stored.
+            max_download_workers (int, optional): The number of downloads kept in flight. Defaults to the instance setting.
+
+        Returns:
+            pd.DataFrame: The DataFrame with the added 'image_uri' column.
+        """
+        if max_download_workers is None:
+            max_download_workers = self.max_download_workers
+        existing_blobs = None
+        if self.skip_existing_images:
+            existing_blobs = list_blob_names(gcs_bucket, f"{gcs_folder}/")
+        negative_cache = None
+        if self.use_negative_cache:
+            negative_cache = get_negative_cache(
+                gcs_bucket, f"{gcs_folder}_negative_cache/", self.negative_cache_ttls
+            )
+
+        def get_image(row) -> Optional[str]:
+            id, image_list = row
+            return self.get_single_product_image(
+                id,
+                image_list,
+                ray_worker_node_id,
+                gcs_bucket,
+                gcs_folder,
+                existing_blobs,
+                negative_cache,
+            )
+
+        rows = list(zip(df["uniq_id"], df["image"]))
+        if max_download_workers > 1 and len(rows) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(max_download_workers, len(rows)),
+                thread_name_prefix=f"image-download-{ray_worker_node_id}",
+            ) as executor:
+                # Each download runs in a copy of this context, so it records
+                # into the metrics of this chunk. Results keep submission order.
+                futures = [
+                    executor.submit(contextvars.copy_context().run, get_image, row)
+                    for row in rows
+                ]
+                gcs_image_url = [future.result() for future in futures]
+        else:
+            gcs_image_url = [get_image(row) for row in rows]
+
+        products_with_no_image_count = sum(uri is None for uri in gcs_image_url)
+        metrics.count("products_without_image", products_with_no_image_count)
+        if products_with_no_image_count:
+            self.logger.warning(
+                f"ray_worker_node_id:{ray_worker_node_id} {products_with_no_image_count} of {len(rows)} products have no image"
+            )
+        if negative_cache is not None:
+            negative_cache.flush()
+            self.logger.info(
+                f"ray_worker_node_id:{ray_worker_node_id} Negative cache size by error class, across runs: {negative_cache.counts()}"
+            )
 
         # appending gcs image uri into dataframe
         gcs_image_loc = pd.DataFrame(gcs_image_url, index=df.index)
         gcs_image_loc.columns = ["image_uri"]
+        if self.dedup_images:
+            # Products showing the same image share its canonical object and hash
+            gcs_image_loc["image_sha256"] = (
+                gcs_image_loc["image_uri"]
+                .str.extract(CONTENT_BLOB_NAME, expand=False)
+                .astype(object)
+                .where(lambda digest: digest.notna(), None)
+            )
         df_with_gcs_image_uri = pd.concat([df, gcs_image_loc], axis=1)
         return df_with_gcs_image_uri
 
@@ -270,31 +1105,123 @@ class DataPreprocessor:
             return ""
         return text.replace("[", "").replace("]", "").replace('"', "")
 
-    def prep_cat(self, df: pd.DataFrame) -> pd.DataFrame:
+    def prep_cat(
+        self, df: pd.DataFrame, max_depth: Optional[int] = None
+    ) -> pd.DataFrame:
         """
         Prepares product category information by splitting the 'product_category_tree' column into separate category levels.
 
+        The cleanup, split and strip run as vectorized pandas string operations. With a maximum depth, every
+        chunk returns exactly the columns c0_name to c{max_depth - 1}_name, levels below it are dropped and
+        missing levels are None.
+
         Args:
             df (pd.DataFrame): The input DataFrame containing the 'product_category_tree' column.
+            max_depth (int, optional): The number of category levels to keep. Defaults to the instance setting,
+                where None keeps as many levels as the deepest tree of the chunk.
 
         Returns:
             pd.DataFrame: The DataFrame with the added category level columns.
         """
-        df["product_category_tree"] = df["product_category_tree"].apply(
-            lambda x: self.reformat(x)
+        if max_depth is None:
+            max_depth = self.max_category_depth
+        tree = df["product_category_tree"]
+        if self.arrow_strings:
+            tree = tree.astype("string[pyarrow]")
+        tree = tree.fillna("").str.replace(CATEGORY_TREE_PUNCTUATION, "", regex=True)
+        if max_depth is None:
+            levels = tree.str.split(">>", expand=True)
+        else:
+            # The extra split holds the levels below max_depth, which are dropped
+            levels = tree.str.split(">>", n=max_depth, expand=True)
+            levels = levels.reindex(columns=range(max_depth))
+            levels = levels.astype(tree.dtype).where(levels.notna(), None)
+        levels.columns = [f"c{i}_name" for i in range(levels.shape[1])]
+        for col in levels.columns:
+            levels[col] = levels[col].str.strip()
+        df_with_cat = pd.concat(
+            [df.drop("product_category_tree", axis=1), levels], axis=1
         )
-        temp_df = df["product_category_tree"].str.split(">>", expand=True)
-        max_splits = temp_df.shape[1]  # Get the number of columns after splitting
-        # Create column names dynamically
-        column_names = [f"c{i}_name" for i in range(max_splits)]
-        temp_df.columns = column_names
-        for col in temp_df.columns:
-            temp_df[col] = temp_df[col].apply(lambda x: x.strip() if x else x)
-        # concatenating df1 and df2 along rows
-        df_with_cat = pd.concat([df, temp_df], axis=1)
-        df_with_cat = df_with_cat.drop("product_category_tree", axis=1)
         return df_with_cat
 
+    def process_downloaded_batch(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Runs the description, attribute and category stages on a batch whose images were downloaded.
+
+        Args:
+            df (pd.DataFrame): The batch, as returned by get_product_image.
+
+        Returns:
+            pd.DataFrame: The preprocessed batch.
+        """
+        with metrics.stage("descriptions"):
+            df_with_desc = self.prep_product_desc(df)
+        with metrics.stage("attributes"):
+            df_with_desc["attributes"] = self.parse_attributes_series(
+                df_with_desc["product_specifications"]
+            )
+            df_with_desc = df_with_desc.drop("product_specifications", axis=1)
+        with metrics.stage("categories"):
+            result_df = self.prep_cat(df_with_desc)
+        return result_df
+
+    def process_batches(
+        self,
+        batches: Iterable[pd.DataFrame],
+        ray_worker_node_id: int,
+        gcs_bucket: str,
+        gcs_folder: str,
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Streams batches of rows through the preprocessing pipeline and yields each processed batch.
+
+        The images of the next prefetch_batches batches are downloaded on a background thread while the current
+        batch goes through the CPU-bound description, attribute and category stages, so network and CPU work
+        overlap. At most prefetch_batches + 1 input batches are held at a time, so memory stays bounded however
+        many rows the iterator produces. Metrics are recorded into the chunk being recorded, if any.
+
+        Args:
+            batches (Iterable[pd.DataFrame]): The input batches, e.g. a chunked CSV reader.
+            ray_worker_node_id (int): The ID of the Ray worker node (for logging).
+            gcs_bucket (str): The name of the GCS bucket.
+            gcs_folder (str): The folder in the GCS bucket where the images will be stored.
+
+        Yields:
+            pd.DataFrame: The preprocessed batches, in input order.
+        """
+
+        def download(batch: pd.DataFrame) -> pd.DataFrame:
+            metrics.count("rows_in", len(batch))
+            with metrics.stage("images"):
+                return self.get_product_image(
+                    batch, ray_worker_node_id, gcs_bucket, gcs_folder
+                )
+
+        pending = collections.deque()
+        executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix=f"image-prefetch-{ray_worker_node_id}"
+        )
+        try:
+            batches = iter(batches)
+            while True:
+                # Keep the next batches downloading while the oldest one is processed
+                while len(pending) <= self.prefetch_batches:
+                    batch = next(batches, None)
+                    if batch is None:
+                        break
+                    pending.append(
+                        executor.submit(contextvars.copy_context().run, download, batch)
+                    )
+                if not pending:
+                    break
+                result_df = self.process_downloaded_batch(pending.popleft().result())
+                metrics.count("rows_out", len(result_df))
+                yield result_df
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
     def process_data(
         self,
         df: pd.DataFrame,
@@ -306,6 +1233,8 @@ class DataPreprocessor:
         Performs the complete data preprocessing pipeline, including image downloading, description preprocessing,
         attribute parsing, and category preparation.
 
+        The chunk goes through process_batches, in batches of stream_batch_size rows when set.
+
         Args:
             df (pd.DataFrame): The input DataFrame.
             ray_worker_node_id (int): The ID of the Ray worker node (for logging).
@@ -313,17 +1242,28 @@ class DataPreprocessor:
             gcs_folder (str): The folder in the GCS bucket where the images will be stored.
 
         Returns:
-            pd.DataFrame: The preprocessed DataFrame.
+            pd.DataFrame: The preprocessed DataFrame. Its attrs["metrics"] holds the stage wall times and counters
+                of the chunk, see metrics.ChunkMetrics.to_dict().
         """
-        df_with_gcs_image_uri = self.get_product_image(
-            df, ray_worker_node_id, gcs_bucket, gcs_folder
+        batch_size = self.stream_batch_size or max(len(df), 1)
+        # An empty chunk still goes through the stages as one empty batch
+        batches = (
+            df.iloc[start : start + batch_size]
+            for start in range(0, max(len(df), 1), batch_size)
         )
-        df_with_desc = self.prep_product_desc(df_with_gcs_image_uri)
-        df_with_desc["attributes"] = df_with_desc["product_specifications"].apply(
-            self.parse_attributes
+        chunk_metrics = metrics.ChunkMetrics()
+        with metrics.recording(chunk_metrics):
+            results = list(
+                self.process_batches(
+                    batches, ray_worker_node_id, gcs_bucket, gcs_folder
+                )
+            )
+        # Batches can have different category columns when max_category_depth is not set
+        result_df = results[0] if len(results) == 1 else pd.concat(results)
+        self.logger.info(
+            f"ray_worker_node_id:{ray_worker_node_id} Chunk metrics: {chunk_metrics.to_dict()}"
         )
-        df_with_desc = df_with_desc.drop("product_specifications", axis=1)
-        result_df = self.prep_cat(df_with_desc)
+        result_df.attrs[metrics.METRICS_ATTR] = chunk_metrics.to_dict()
         return result_df
 
 
@@ -407,18 +1347,20 @@ class DataPrepForRag:
             clothing_filtered_df, "c3_name", 10
         )
         # prep RA df with subset of the columns
-        rag_df = c3_filtered_df[
-            [
-                "Id",
-                "Name",
-                "Description",
-                "Brand",
-                "image",
-                "image_uri",
-                "c1_name",
-                "Specifications",
-            ]
+        rag_columns = [
+            "Id",
+            "Name",
+            "Description",
+            "Brand",
+            "image",
+            "image_uri",
+            "c1_name",
+            "Specifications",
         ]
+        # Products sharing an image also share its image_uri, so the table loader embeds it once
+        if "image_sha256" in c3_filtered_df.columns:
+            rag_columns.append("image_sha256")
+        rag_df = c3_filtered_df[rag_columns]
         # Drop duplicates
         rag_df.drop_duplicates(inplace=True)
         # Replace NaN with None
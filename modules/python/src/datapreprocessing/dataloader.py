@@ -12,33 +12,248 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import glob
+import hashlib
 import logging
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Union
 
 import pandas as pd
 
+from .gcs_utils import get_bucket
+
+# File formats read through pyarrow.dataset, by file extension
+DATASET_FORMATS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".arrow": "ipc",
+    ".ipc": "ipc",
+    ".feather": "ipc",
+}
+
 
 class DataLoader:
     """
     A class for loading data from Google Cloud Storage (GCS).
 
+    CSV files are read with pd.read_csv. Parquet and Arrow IPC files or directories are read with
+    pyarrow.dataset, which only fetches the projected columns and skips Parquet row groups whose
+    statistics cannot match the filters.
+
+    With a cache_dir, the file is downloaded once per GCS generation and read from local disk afterwards.
+    A metadata request checks the generation on every load, so a changed object is downloaded again.
+
     Attributes:
         bucket_name (str): The name of the GCS bucket.
         file_path (str): The path to the file within the GCS bucket.
+        usecols (List[str]): The columns to read, or None for all columns.
+        dtype (Dict[str, Any]): The dtypes of columns, or None to infer them.
+        engine (str): The CSV parser engine, e.g. "pyarrow" for the multithreaded Arrow parser, or None for the pandas default.
+        dtype_backend (str): "pyarrow" for Arrow-backed dtypes (including strings), "numpy_nullable", or None for the pandas default.
+        file_format (str): "csv", "parquet" or "ipc". Inferred from the file extension when None, defaulting to "csv".
+        filters: A pyarrow.compute.Expression or DNF filters, e.g. [("image", "!=", "")], applied to Parquet and Arrow IPC reads.
+        cache_dir (str): The local directory of the read-through cache, or None to always read from GCS.
+        memory_map (bool): Whether cached Parquet and Arrow IPC files are memory-mapped instead of read.
         logger (logging.Logger): A logger instance for logging messages.
+
+    Methods:
+        load_raw_data() -> pd.DataFrame: Loads the whole file as a Pandas DataFrame.
+        iter_raw_data(chunksize: int) -> Iterator[pd.DataFrame]: Loads the file as an iterator of DataFrames.
+        get_file_format() -> str: Returns the format of the file.
+        get_cached_path() -> Optional[str]: Returns the path of the file in the local cache, downloading it when stale.
+        get_source() -> str: Returns the local path or the GCS URI the file is read from.
+        get_dataset() -> pyarrow.dataset.Dataset: Opens a Parquet or Arrow IPC dataset.
+        get_dataset_filter() -> pyarrow.compute.Expression: Returns the filters as a pyarrow expression.
+        to_pandas(data) -> pd.DataFrame: Converts Arrow data to a DataFrame with the configured dtypes.
     """
 
     logger = logging.getLogger(__name__)
 
-    def __init__(self, bucket_name: str, file_path: str):
+    def __init__(
+        self,
+        bucket_name: str,
+        file_path: str,
+        usecols: Optional[List[str]] = None,
+        dtype: Optional[Dict[str, Any]] = None,
+        engine: Optional[str] = None,
+        dtype_backend: Optional[str] = None,
+        file_format: Optional[str] = None,
+        filters: Optional[Union[List, Any]] = None,
+        cache_dir: Optional[str] = None,
+        memory_map: bool = True,
+    ):
         """
         Initializes a DataLoader object.
 
         Args:
             bucket_name (str): The name of the GCS bucket.
             file_path (str): The path to the file within the GCS bucket.
+            usecols (List[str], optional): The columns to read. Defaults to None (all columns).
+            dtype (Dict[str, Any], optional): The dtypes of columns, e.g. {"uniq_id": "string[pyarrow]"}. Defaults to None.
+            engine (str, optional): The CSV parser engine, "c", "python" or "pyarrow". Requires pyarrow for "pyarrow". Defaults to None.
+            dtype_backend (str, optional): "pyarrow" or "numpy_nullable". Requires pyarrow for "pyarrow". Defaults to None.
+            file_format (str, optional): "csv", "parquet" or "ipc". Defaults to None (inferred from the file extension).
+            filters (optional): A pyarrow.compute.Expression or DNF filters in the pyarrow.parquet format, for Parquet
+                and Arrow IPC only. Defaults to None.
+            cache_dir (str, optional): The local directory of the read-through cache. Defaults to None.
+            memory_map (bool, optional): Whether cached Parquet and Arrow IPC files are memory-mapped. Defaults to True.
+
+        Raises:
+            ValueError: If filters are set for a CSV file, which would be read unfiltered.
         """
         self.bucket_name = bucket_name
         self.file_path = file_path
+        self.usecols = usecols
+        self.dtype = dtype
+        self.engine = engine
+        self.dtype_backend = dtype_backend
+        self.file_format = file_format
+        self.filters = filters
+        self.cache_dir = cache_dir
+        self.memory_map = memory_map
+        if self.filters is not None and self.get_file_format() == "csv":
+            raise ValueError(
+                "filters are only supported for Parquet and Arrow IPC files"
+            )
+
+    def read_csv_options(self) -> Dict[str, Any]:
+        """
+        Returns the pd.read_csv keyword arguments of the configured options, leaving out unset ones.
+
+        Returns:
+            Dict[str, Any]: The keyword arguments.
+        """
+        options = {
+            "usecols": self.usecols,
+            "dtype": self.dtype,
+            "engine": self.engine,
+            "dtype_backend": self.dtype_backend,
+        }
+        return {name: value for name, value in options.items() if value is not None}
+
+    def get_file_format(self) -> str:
+        """
+        Returns the format of the file, as configured or inferred from its extension.
+
+        Returns:
+            str: "csv", "parquet" or "ipc".
+        """
+        if self.file_format is not None:
+            return self.file_format
+        extension = os.path.splitext(self.file_path)[1].lower()
+        return DATASET_FORMATS.get(extension, "csv")
+
+    def get_cached_path(self) -> Optional[str]:
+        """
+        Returns the path of the file in the local cache, keyed by bucket, object and generation.
+
+        The current generation is read with a metadata request. When no cached copy of that generation exists,
+        the object is downloaded to a temporary file that is renamed into place, and older generations of the
+        object are removed.
+
+        Returns:
+            Optional[str]: The local path, or None if the path is not a single object, e.g. a dataset directory.
+        """
+        blob = get_bucket(self.bucket_name).get_blob(self.file_path)
+        if blob is None:
+            return None
+        key = hashlib.sha256(
+            f"{self.bucket_name}/{self.file_path}".encode()
+        ).hexdigest()[:32]
+        extension = os.path.splitext(self.file_path)[1]
+        cached_path = os.path.join(
+            self.cache_dir, f"{key}-{blob.generation}{extension}"
+        )
+        if os.path.exists(cached_path):
+            self.logger.info(
+                f"Using cached '{self.file_path}' generation {blob.generation} from '{cached_path}'"
+            )
+            return cached_path
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.logger.info(
+            f"Caching '{self.file_path}' generation {blob.generation} from '{self.bucket_name}' in '{cached_path}'"
+        )
+        # The generation of the blob is pinned, so a concurrent overwrite cannot mix two versions
+        fd, download_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            blob.download_to_filename(download_path)
+            os.replace(download_path, cached_path)
+        except BaseException:
+            os.remove(download_path)
+            raise
+        for stale_path in glob.glob(os.path.join(self.cache_dir, f"{key}-*")):
+            if stale_path != cached_path:
+                os.remove(stale_path)
+        return cached_path
+
+    def get_source(self) -> str:
+        """
+        Returns the location the file is read from: its path in the local cache when cache_dir is set and the
+        path is a single object, and its GCS URI otherwise.
+
+        Returns:
+            str: The local path or the GCS URI.
+        """
+        if self.cache_dir:
+            cached_path = self.get_cached_path()
+            if cached_path is not None:
+                return cached_path
+            self.logger.info(
+                f"'{self.file_path}' is not a single object, reading it from GCS"
+            )
+        return f"gs://{self.bucket_name}/{self.file_path}"
+
+    def get_dataset(self):
+        """
+        Opens the file, or the directory of files, as a Parquet or Arrow IPC dataset. Requires pyarrow.
+
+        Returns:
+            pyarrow.dataset.Dataset: The dataset.
+        """
+        import pyarrow.dataset as ds
+        import pyarrow.fs
+
+        source = self.get_source()
+        if source.startswith("gs://"):
+            return ds.dataset(source, format=self.get_file_format())
+        # Cached files are local, so the pages of the columns read can be mapped instead of copied
+        return ds.dataset(
+            source,
+            format=self.get_file_format(),
+            filesystem=pyarrow.fs.LocalFileSystem(use_mmap=self.memory_map),
+        )
+
+    def get_dataset_filter(self):
+        """
+        Returns the filters as a pyarrow expression.
+
+        Returns:
+            pyarrow.compute.Expression: The filter expression, or None.
+        """
+        if self.filters is None or not isinstance(self.filters, list):
+            return self.filters
+        import pyarrow.parquet as pq
+
+        return pq.filters_to_expression(self.filters)
+
+    def to_pandas(self, data) -> pd.DataFrame:
+        """
+        Converts an Arrow table or record batch to a Pandas DataFrame with the configured dtypes.
+
+        Args:
+            data (pyarrow.Table or pyarrow.RecordBatch): The Arrow data.
+
+        Returns:
+            pd.DataFrame: The converted data.
+        """
+        types_mapper = pd.ArrowDtype if self.dtype_backend == "pyarrow" else None
+        df = data.to_pandas(types_mapper=types_mapper)
+        if self.dtype:
+            df = df.astype(self.dtype)
+        return df
 
     def load_raw_data(self) -> pd.DataFrame:
         """
@@ -48,5 +263,39 @@ class DataLoader:
             pandas.DataFrame: The loaded data.
         """
         self.logger.info(f"Downloading '{self.file_path}' from '{self.bucket_name}'")
-        df = pd.read_csv(f"gs://{self.bucket_name}/{self.file_path}")
+        if self.get_file_format() != "csv":
+            table = self.get_dataset().to_table(
+                columns=self.usecols, filter=self.get_dataset_filter()
+            )
+            return self.to_pandas(table)
+        df = pd.read_csv(self.get_source(), **self.read_csv_options())
         return df
+
+    def iter_raw_data(self, chunksize: int) -> Iterator[pd.DataFrame]:
+        """
+        Loads raw data from GCS as an iterator of Pandas DataFrames, so the whole file is never held in memory.
+
+        Args:
+            chunksize (int): The number of rows per DataFrame.
+
+        Returns:
+            Iterator[pd.DataFrame]: The loaded data, at most chunksize rows at a time.
+        """
+        self.logger.info(
+            f"Streaming '{self.file_path}' from '{self.bucket_name}' in chunks of {chunksize} rows"
+        )
+        if self.get_file_format() != "csv":
+            batches = self.get_dataset().to_batches(
+                columns=self.usecols,
+                filter=self.get_dataset_filter(),
+                batch_size=chunksize,
+            )
+            return (self.to_pandas(batch) for batch in batches if batch.num_rows)
+        if self.engine == "pyarrow":
+            # The pyarrow engine of pd.read_csv cannot read in chunks
+            raise ValueError("Chunked loading is not supported by the pyarrow engine")
+        return pd.read_csv(
+            self.get_source(),
+            chunksize=chunksize,
+            **self.read_csv_options(),
+        )
@@ -12,26 +12,57 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import heapq
 import logging
-from typing import List
+import math
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 
+# Estimated relative cost of processing a row: a fixed part for the row, a part per candidate image URL and a
+# part per character of the description, which is lemmatized
+ROW_COST = 1.0
+IMAGE_URL_COST = 2.0
+DESCRIPTION_CHAR_COST = 1 / 500
+
+# Ways split_dataframe partitions the DataFrame
+PARTITIONING_MODES = ("rows", "contiguous", "lpt")
+
+# The fewest chunks per worker of the cost-balanced modes, so workers that finish early pick up more chunks
+# instead of idling while the last chunks run
+PARTITIONS_PER_WORKER = 4
+
 
 class DataPrep:
     """
     Prepares a Pandas DataFrame for further processing by splitting it into chunks and
     updating it based on specified columns and null value filtering.
 
+    The DataFrame is split in one of three ways:
+        - "rows": contiguous chunks of chunk_size rows.
+        - "contiguous": contiguous chunks of about equal estimated cost. Like "rows", the chunks are views of the
+          DataFrame and keep its row order.
+        - "lpt": chunks of about equal estimated cost built by longest-processing-time-first bin packing, which
+          balances better than "contiguous" when costs vary a lot, but copies the rows and mixes their order.
+    The cost of a row is estimated from the number of its image URLs and the length of its description.
+
     Attributes:
         df (pd.DataFrame): The input Pandas DataFrame.
         required_cols (list): A list of column names to keep in the DataFrame.
         filter_null_cols (list): A list of column names to check for null values.
         chunk_size (int, optional): The size of each chunk when splitting the DataFrame. Defaults to 199.
+        partitioning (str): "rows", "contiguous" or "lpt". Defaults to "rows".
+        num_partitions (int): The number of chunks of the cost-balanced modes, or None to derive it from
+            num_workers and chunk_size.
+        num_workers (int): The number of workers the chunks run on, e.g. the maximum size of the Ray actor pool,
+            or None.
         logger (logging.Logger): A logger object for logging information and errors.
 
     Methods:
-        split_dataframe(): Splits the DataFrame into chunks of a specified size.
+        split_dataframe(): Splits the DataFrame into non-empty chunks.
+        estimate_row_costs() -> np.ndarray: Estimates the relative processing cost of each row.
+        get_num_partitions() -> int: Returns the number of chunks to split the DataFrame into.
         update_dataframe(): Updates the DataFrame by selecting required columns and dropping rows with null values.
     """
 
@@ -43,6 +74,9 @@ class DataPrep:
         required_cols: List[str],
         filter_null_cols: List[str],
         chunk_size: int = 199,
+        partitioning: str = "rows",
+        num_partitions: Optional[int] = None,
+        num_workers: Optional[int] = None,
     ):
         """
         Initializes a DataPrep object.
@@ -52,26 +86,131 @@ class DataPrep:
             required_cols (list): A list of column names to keep.
             filter_null_cols (list): A list of column names to check for null values.
             chunk_size (int, optional): The size of each chunk. Defaults to 199.
+            partitioning (str, optional): "rows", "contiguous" or "lpt". Defaults to "rows".
+            num_partitions (int, optional): The number of chunks of the cost-balanced modes. Defaults to None.
+            num_workers (int, optional): The number of workers the chunks run on. Defaults to None.
         """
+        if partitioning not in PARTITIONING_MODES:
+            raise ValueError(
+                f"Unknown partitioning '{partitioning}', expected one of {PARTITIONING_MODES}"
+            )
         self.df = df
         self.required_cols = required_cols
         self.filter_null_cols = filter_null_cols
         self.chunk_size = chunk_size
+        self.partitioning = partitioning
+        self.num_partitions = num_partitions
+        self.num_workers = num_workers
 
     def split_dataframe(self) -> List[pd.DataFrame]:
         """
-        Splits the DataFrame into chunks of a specified size.
+        Splits the DataFrame into non-empty chunks, as configured by partitioning.
 
         Returns:
             list: A list of Pandas DataFrames, where each DataFrame is a chunk of the original DataFrame.
         """
-        self.logger.info(f"Splitting dataframe into chunk size of '{self.chunk_size}'")
-        chunks = list()
-        num_chunks = len(self.df) // self.chunk_size + 1
-        for i in range(num_chunks):
-            chunks.append(self.df[i * self.chunk_size : (i + 1) * self.chunk_size])
+        num_rows = len(self.df)
+        if self.partitioning == "rows":
+            self.logger.info(
+                f"Splitting dataframe into chunk size of '{self.chunk_size}'"
+            )
+            return [
+                self.df.iloc[start : start + self.chunk_size]
+                for start in range(0, num_rows, self.chunk_size)
+            ]
+
+        num_partitions = self.get_num_partitions()
+        self.logger.info(
+            f"Splitting dataframe into '{num_partitions}' cost-balanced chunks with '{self.partitioning}' partitioning"
+        )
+        if num_partitions == 0:
+            return []
+        costs = self.estimate_row_costs()
+        if self.partitioning == "contiguous":
+            chunks, loads = self._split_contiguous(costs, num_partitions)
+        else:
+            chunks, loads = self._split_lpt(costs, num_partitions)
+        self.logger.info(
+            f"Estimated chunk cost: max '{loads.max():.1f}', mean '{loads.mean():.1f}'"
+        )
         return chunks
 
+    def _split_contiguous(self, costs: np.ndarray, num_partitions: int):
+        # A row goes to the chunk whose share of the total cost contains the midpoint of the row's cost
+        midpoints = np.cumsum(costs) - costs / 2
+        targets = costs.sum() * np.arange(1, num_partitions) / num_partitions
+        cuts = np.searchsorted(midpoints, targets)
+        bounds = [0]
+        for i, cut in enumerate(cuts, start=1):
+            # Leave at least one row for this chunk and for each of the chunks after it
+            remaining = num_partitions - i
+            bounds.append(int(min(max(cut, bounds[-1] + 1), len(costs) - remaining)))
+        bounds.append(len(costs))
+        chunks = [
+            self.df.iloc[start:stop] for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        loads = np.add.reduceat(costs, bounds[:-1])
+        return chunks, loads
+
+    def _split_lpt(self, costs: np.ndarray, num_partitions: int):
+        # The costliest rows are placed first, each in the least loaded chunk. As every cost is positive and
+        # there are no more chunks than rows, every chunk receives a row.
+        heap = [(0.0, partition) for partition in range(num_partitions)]
+        assignment = np.empty(len(costs), dtype=np.int64)
+        for row in np.argsort(-costs, kind="stable"):
+            load, partition = heapq.heappop(heap)
+            assignment[row] = partition
+            heapq.heappush(heap, (load + costs[row], partition))
+        # A stable sort by chunk keeps the original row order within each chunk
+        order = np.argsort(assignment, kind="stable")
+        bounds = np.searchsorted(assignment[order], np.arange(num_partitions + 1))
+        chunks = [
+            self.df.take(order[start:stop])
+            for start, stop in zip(bounds[:-1], bounds[1:])
+        ]
+        loads = np.bincount(assignment, weights=costs, minlength=num_partitions)
+        return chunks, loads
+
+    def estimate_row_costs(self) -> np.ndarray:
+        """
+        Estimates the relative processing cost of each row from the number of its image URLs and the length of
+        its description. Missing columns do not add to the cost.
+
+        Returns:
+            np.ndarray: The positive cost of each row.
+        """
+        costs = np.full(len(self.df), ROW_COST)
+        if "image" in self.df.columns:
+            images = self.df["image"].astype("string").fillna("")
+            # Image lists are comma-separated, see DataPreprocessor.extract_url
+            num_urls = (images.str.count(",") + 1).where(images.str.len() > 0, 0)
+            costs += IMAGE_URL_COST * num_urls.to_numpy(dtype=float)
+        if "description" in self.df.columns:
+            lengths = self.df["description"].astype("string").str.len().fillna(0)
+            costs += DESCRIPTION_CHAR_COST * lengths.to_numpy(dtype=float)
+        return costs
+
+    def get_num_partitions(self) -> int:
+        """
+        Returns the number of chunks of the cost-balanced modes, but never more chunks than rows. This is
+        num_partitions when set. Otherwise, with num_workers, it is a whole number of waves of num_workers chunks:
+        at least PARTITIONS_PER_WORKER waves, and more when chunks would average over chunk_size rows. Without
+        num_workers, it is as many chunks as chunk_size gives.
+
+        Returns:
+            int: The number of chunks.
+        """
+        num_rows = len(self.df)
+        num_partitions = self.num_partitions
+        if num_partitions is None:
+            num_partitions = math.ceil(num_rows / self.chunk_size)
+            if self.num_workers:
+                waves = max(
+                    PARTITIONS_PER_WORKER, math.ceil(num_partitions / self.num_workers)
+                )
+                num_partitions = waves * self.num_workers
+        return min(num_partitions, num_rows)
+
     def update_dataframe(self) -> pd.DataFrame:
         """
         Updates the DataFrame by selecting only the required columns and dropping rows with null values
@@ -0,0 +1,158 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, FrozenSet, TypeVar
+
+import google.auth
+from google.auth.transport.requests import AuthorizedSession
+from google.cloud import storage
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Size of the pooled HTTP session shared by every GCS call of a process. It
+# should be at least the number of downloads a worker keeps in flight.
+DEFAULT_POOL_MAXSIZE = 64
+
+# The cache lives at module level so it is never pickled along with the
+# objects that use it. It is keyed by process ID so a forked or freshly
+# started Ray worker always builds its own client and HTTP session.
+_lock = threading.Lock()
+_clients: Dict[int, storage.Client] = {}
+_buckets: Dict[tuple, storage.Bucket] = {}
+_listings: Dict[tuple, FrozenSet[str]] = {}
+
+# Other objects shared by every chunk and thread of a process, see per_process.
+# Reentrant, so a factory may itself use per_process.
+_instances_lock = threading.RLock()
+_instances: Dict[tuple, Any] = {}
+
+T = TypeVar("T")
+
+
+def per_process(key: tuple, factory: Callable[[], T]) -> T:
+    """
+    Returns the object of the current process for a key, creating it with factory on first use.
+
+    Like the GCS client, the object lives at module level so it is never pickled along with the objects that
+    use it, and is keyed by process ID so a forked or freshly started Ray worker creates its own.
+
+    Args:
+        key (tuple): The key of the object, starting with a name unique to its kind.
+        factory (Callable[[], T]): Creates the object. Called at most once per key and process.
+
+    Returns:
+        T: The object of the current process.
+    """
+    key = (os.getpid(), *key)
+    instance = _instances.get(key)
+    if instance is None:
+        with _instances_lock:
+            instance = _instances.get(key)
+            if instance is None:
+                instance = factory()
+                _instances[key] = instance
+    return instance
+
+
+def get_storage_client(pool_maxsize: int = DEFAULT_POOL_MAXSIZE) -> storage.Client:
+    """
+    Returns the GCS client of the current process, creating it on first use.
+
+    The client is backed by a single authorized HTTP session with a connection
+    pool, so authentication, the HTTP session and TLS connections are reused
+    across calls instead of being set up for every object.
+
+    Args:
+        pool_maxsize (int, optional): The maximum number of pooled connections. Only used when the client is created. Defaults to DEFAULT_POOL_MAXSIZE.
+
+    Returns:
+        storage.Client: The GCS client of the current process.
+    """
+    pid = os.getpid()
+    client = _clients.get(pid)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(pid)
+        if client is None:
+            # Service account keys and impersonated credentials need scopes to refresh
+            credentials, project = google.auth.default(scopes=storage.Client.SCOPE)
+            session = AuthorizedSession(credentials)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+            session.mount("https://", adapter)
+            client = storage.Client(
+                project=project, credentials=credentials, _http=session
+            )
+            _clients.clear()
+            _buckets.clear()
+            _listings.clear()
+            _clients[pid] = client
+            logger.debug(f"Created GCS client for process {pid}")
+    return client
+
+
+def get_bucket(bucket_name: str) -> storage.Bucket:
+    """
+    Returns a cached bucket handle bound to the GCS client of the current process.
+
+    Args:
+        bucket_name (str): The name of the GCS bucket.
+
+    Returns:
+        storage.Bucket: The bucket handle.
+    """
+    key = (os.getpid(), bucket_name)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        client = get_storage_client()
+        with _lock:
+            bucket = _buckets.setdefault(key, client.bucket(bucket_name))
+    return bucket
+
+
+def list_blob_names(
+    bucket_name: str, prefix: str, refresh: bool = False
+) -> FrozenSet[str]:
+    """
+    Lists the names of the blobs under a prefix, once per process.
+
+    The listing is cached for the lifetime of the process, so the chunks a
+    worker processes during a run share a single listing of the prefix.
+
+    Args:
+        bucket_name (str): The name of the GCS bucket.
+        prefix (str): The prefix to list.
+        refresh (bool, optional): Whether to list the prefix again even if it is cached. Defaults to False.
+
+    Returns:
+        FrozenSet[str]: The names of the blobs under the prefix.
+    """
+    key = (os.getpid(), bucket_name, prefix)
+    names = _listings.get(key)
+    if names is None or refresh:
+        bucket = get_bucket(bucket_name)
+        names = frozenset(
+            blob.name
+            for blob in bucket.list_blobs(
+                prefix=prefix, fields="items(name),nextPageToken"
+            )
+        )
+        with _lock:
+            _listings[key] = names
+        logger.debug(f"Listed {len(names)} blobs under gs://{bucket_name}/{prefix}")
+    return names
@@ -0,0 +1,252 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextlib
+import email.utils
+import logging
+import threading
+import time
+import urllib.error
+import urllib.parse
+from typing import Dict, Iterator, Optional, Tuple
+
+import requests
+import urllib3
+from requests.adapters import HTTPAdapter
+
+from .gcs_utils import per_process
+
+# Status codes that come with a Retry-After header when a host throttles us
+RETRY_AFTER_STATUS_CODES = (429, 503)
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket rate limiter.
+
+    Attributes:
+        rate (float): The number of tokens added per second.
+        capacity (float): The maximum number of tokens, i.e. the allowed burst.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initializes a TokenBucket object, initially full.
+
+        Args:
+            rate (float): The number of tokens added per second.
+            capacity (float): The maximum number of tokens.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """
+        Takes one token, blocking until one is available.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated_at) * self.rate
+                )
+                self._updated_at = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_seconds = (1 - self._tokens) / self.rate
+            time.sleep(wait_seconds)
+
+
+class HostLimiter:
+    """
+    The politeness state of a single host: a cap on concurrent requests, an optional rate limit and the
+    time until which the host asked us to back off.
+    """
+
+    def __init__(self, max_concurrency: int, rate: Optional[float], burst: float):
+        self.semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.blocked_until = 0.0
+
+
+class HttpFetcher:
+    """
+    An HTTP client for image downloads with persistent connections per host and per-host politeness limits.
+
+    Connections are pooled per host by a single requests session. Every host gets a cap on concurrent
+    requests, an optional token-bucket rate limit, and honors Retry-After on 429 and 503 responses. Timeouts
+    apply to each request, never to the whole process. Errors are raised as the exceptions
+    urllib.request.urlopen raises: TimeoutError, urllib.error.HTTPError and urllib.error.URLError.
+
+    Attributes:
+        max_connections_per_host (int): The maximum number of concurrent requests and pooled connections per host.
+        requests_per_second (float): The rate limit per host, or None for no rate limit.
+        burst (float): The number of requests per host allowed in a burst above the rate limit.
+        timeout (Tuple[float, float]): The connect and read timeouts of a request, in seconds.
+        max_retries (int): The number of times a throttled request is retried after its Retry-After delay.
+        max_retry_after (float): The longest Retry-After delay honored, in seconds.
+        logger (logging.Logger): A logger object for logging information and errors.
+
+    Methods:
+        open(url: str): Opens a streaming response, as a context manager.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        max_connections_per_host: int = 8,
+        requests_per_second: Optional[float] = None,
+        burst: float = 1.0,
+        timeout: Tuple[float, float] = (10.0, 10.0),
+        max_retries: int = 2,
+        max_retry_after: float = 60.0,
+    ):
+        """
+        Initializes a HttpFetcher object.
+
+        Args:
+            max_connections_per_host (int, optional): The maximum number of concurrent requests per host. Defaults to 8.
+            requests_per_second (float, optional): The rate limit per host. Defaults to None.
+            burst (float, optional): The number of requests per host allowed in a burst. Defaults to 1.0.
+            timeout (Tuple[float, float], optional): The connect and read timeouts, in seconds. Defaults to (10.0, 10.0).
+            max_retries (int, optional): The number of retries of a throttled request. Defaults to 2.
+            max_retry_after (float, optional): The longest Retry-After delay honored, in seconds. Defaults to 60.0.
+        """
+        self.max_connections_per_host = max_connections_per_host
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_retry_after = max_retry_after
+        self._hosts: Dict[str, HostLimiter] = {}
+        self._hosts_lock = threading.Lock()
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=64, pool_maxsize=max_connections_per_host
+        )
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+
+    def _host_limiter(self, url: str) -> HostLimiter:
+        host = urllib.parse.urlsplit(url).netloc
+        limiter = self._hosts.get(host)
+        if limiter is None:
+            with self._hosts_lock:
+                limiter = self._hosts.setdefault(
+                    host,
+                    HostLimiter(
+                        self.max_connections_per_host,
+                        self.requests_per_second,
+                        self.burst,
+                    ),
+                )
+        return limiter
+
+    def _retry_after(self, response: requests.Response) -> Optional[float]:
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (
+                    email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+                )
+            except (TypeError, ValueError):
+                return None
+        return min(max(seconds, 0.0), self.max_retry_after)
+
+    @contextlib.contextmanager
+    def open(self, url: str) -> Iterator[requests.Response]:
+        """
+        Opens a streaming response for a URL within the politeness limits of its host.
+
+        The host's concurrency slot is held until the context exits, so the body should be read inside it.
+
+        Args:
+            url (str): The URL to request.
+
+        Yields:
+            requests.Response: The successful streaming response.
+        """
+        limiter = self._host_limiter(url)
+        with limiter.semaphore:
+            try:
+                for attempt in range(self.max_retries + 1):
+                    delay = limiter.blocked_until - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    if limiter.bucket is not None:
+                        limiter.bucket.acquire()
+                    response = self._session.get(url, stream=True, timeout=self.timeout)
+                    retry_after = None
+                    if response.status_code in RETRY_AFTER_STATUS_CODES:
+                        retry_after = self._retry_after(response)
+                    if retry_after is None or attempt == self.max_retries:
+                        break
+                    self.logger.debug(
+                        f"Host of '{url}' returned {response.status_code}, retrying after {retry_after}s"
+                    )
+                    limiter.blocked_until = max(
+                        limiter.blocked_until, time.monotonic() + retry_after
+                    )
+                    response.close()
+                with response:
+                    if response.status_code >= 400:
+                        raise urllib.error.HTTPError(
+                            url,
+                            response.status_code,
+                            response.reason,
+                            response.headers,
+                            None,
+                        )
+                    yield response
+            except requests.exceptions.Timeout as err:
+                raise TimeoutError(str(err)) from err
+            except requests.exceptions.ConnectionError as err:
+                # Read timeouts while streaming the body surface as connection errors
+                if err.args and isinstance(
+                    err.args[0], urllib3.exceptions.ReadTimeoutError
+                ):
+                    raise TimeoutError(str(err)) from err
+                raise urllib.error.URLError(err) from err
+            except requests.exceptions.ChunkedEncodingError as err:
+                # The body ended before Content-Length, like urllib.request.urlretrieve reports it
+                raise urllib.error.ContentTooShortError(
+                    f"retrieval incomplete: {err}", None
+                ) from err
+            except requests.exceptions.RequestException as err:
+                raise urllib.error.URLError(err) from err
+
+
+def get_http_fetcher(**settings) -> HttpFetcher:
+    """
+    Returns the HTTP fetcher of the current process for the given settings, creating it on first use. Its
+    connections and host limits are shared by every chunk of a worker.
+
+    Args:
+        **settings: The keyword arguments of HttpFetcher.
+
+    Returns:
+        HttpFetcher: The HTTP fetcher.
+    """
+    return per_process(
+        ("http_fetcher", *sorted(settings.items())), lambda: HttpFetcher(**settings)
+    )
@@ -0,0 +1,86 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+
+
+class CorruptImageError(ValueError):
+    """Raised when a downloaded image cannot be decoded."""
+
+
+def import_pillow():
+    """
+    Imports Pillow, which is only needed when images are processed at ingestion time.
+
+    Returns:
+        module: The PIL.Image module.
+    """
+    try:
+        from PIL import Image
+    except ImportError as err:
+        raise ImportError(
+            "Image normalization requires Pillow, install it with 'pip install Pillow'"
+        ) from err
+    return Image
+
+
+def open_image(image_file, draft_size=None):
+    """
+    Decodes an image into an RGB image, after validating the file.
+
+    Args:
+        image_file (file-like): The image data, positioned at the start.
+        draft_size (Tuple[int, int], optional): A size hint that lets JPEG images decode at a reduced scale. Defaults to None.
+
+    Returns:
+        PIL.Image.Image: The decoded RGB image, upright according to its EXIF orientation.
+
+    Raises:
+        CorruptImageError: If the data is not a valid image.
+    """
+    Image = import_pillow()
+    from PIL import ImageOps
+
+    try:
+        with Image.open(image_file) as image:
+            image.verify()
+        # verify() leaves the image unusable, so it is opened again to decode it
+        image_file.seek(0)
+        with Image.open(image_file) as image:
+            if draft_size is not None:
+                image.draft("RGB", draft_size)
+            image = ImageOps.exif_transpose(image).convert("RGB")
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as err:
+        raise CorruptImageError(str(err)) from err
+    return image
+
+
+def encode_jpeg(image, max_edge: int, quality: int = 85) -> io.BytesIO:
+    """
+    Resizes a decoded image to fit within max_edge pixels and encodes it as JPEG.
+
+    Args:
+        image (PIL.Image.Image): The decoded RGB image. It is resized in place.
+        max_edge (int): The maximum width and height of the encoded image, in pixels.
+        quality (int, optional): The JPEG quality. Defaults to 85.
+
+    Returns:
+        io.BytesIO: The JPEG image, rewound to the start.
+    """
+    Image = import_pillow()
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+    encoded = io.BytesIO()
+    image.save(encoded, format="JPEG", quality=quality, optimize=True)
+    encoded.seek(0)
+    return encoded
@@ -0,0 +1,165 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .gcs_utils import per_process
+
+
+class MemoCache:
+    """
+    A content-addressed memo cache for text transformations, with a bounded in-process LRU
+    and an optional SQLite store that persists results across chunks and reruns.
+
+    Attributes:
+        namespace (str): A string mixed into every key, e.g. the name and version of the model producing the values.
+        max_entries (int): The maximum number of entries kept in the in-process LRU.
+        db_path (str): The path of the SQLite database, or None to keep the cache in memory only.
+        logger (logging.Logger): A logger object for logging information and errors.
+
+    Methods:
+        key(text: str) -> str: Returns the cache key of a text.
+        get_many(keys: List[str]) -> Dict[str, str]: Returns the cached values of the given keys.
+        put_many(items: Iterable[Tuple[str, str]]): Stores values in the LRU and the SQLite store.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self, namespace: str, max_entries: int = 100000, db_path: Optional[str] = None
+    ):
+        """
+        Initializes a MemoCache object.
+
+        Args:
+            namespace (str): A string mixed into every key.
+            max_entries (int, optional): The maximum number of entries kept in the in-process LRU. Defaults to 100000.
+            db_path (str, optional): The path of the SQLite database. Defaults to None.
+        """
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._lru = OrderedDict()
+        self._db = None
+        if db_path:
+            db_dir = os.path.dirname(db_path)
+            if db_dir:
+                os.makedirs(db_dir, exist_ok=True)
+            # Several worker processes of a node can share the database file
+            self._db = sqlite3.connect(db_path, timeout=60, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS memo (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._db.commit()
+
+    def key(self, text: str) -> str:
+        """
+        Returns the cache key of a text.
+
+        Args:
+            text (str): The input text.
+
+        Returns:
+            str: The hex digest of the namespace and the text.
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(self.namespace.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(text.encode("utf-8", "surrogatepass"))
+        return digest.hexdigest()
+
+    def get_many(self, keys: List[str]) -> Dict[str, str]:
+        """
+        Returns the cached values of the given keys, looking in the LRU first and then in the SQLite store.
+
+        Args:
+            keys (List[str]): The keys to look up.
+
+        Returns:
+            Dict[str, str]: The values of the keys found in the cache.
+        """
+        found = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                if key in self._lru:
+                    self._lru.move_to_end(key)
+                    found[key] = self._lru[key]
+                else:
+                    missing.append(key)
+            if self._db is not None and missing:
+                # Stay below the default SQLite limit of bound parameters
+                for start in range(0, len(missing), 500):
+                    batch = missing[start : start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._db.execute(
+                        f"SELECT key, value FROM memo WHERE key IN ({placeholders})",
+                        batch,
+                    ).fetchall()
+                    for key, value in rows:
+                        found[key] = value
+                        self._remember(key, value)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, str]]) -> None:
+        """
+        Stores values in the LRU and, when configured, in the SQLite store.
+
+        Args:
+            items (Iterable[Tuple[str, str]]): The (key, value) pairs to store.
+        """
+        items = list(items)
+        with self._lock:
+            for key, value in items:
+                self._remember(key, value)
+            if self._db is not None and items:
+                with self._db:
+                    self._db.executemany(
+                        "INSERT OR REPLACE INTO memo (key, value) VALUES (?, ?)", items
+                    )
+
+    def _remember(self, key: str, value: str) -> None:
+        self._lru[key] = value
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+
+def get_memo_cache(
+    namespace: str, max_entries: int = 100000, db_path: Optional[str] = None
+) -> MemoCache:
+    """
+    Returns the memo cache of the current process for a namespace, creating it on first use. The chunks a
+    worker processes share it.
+
+    Args:
+        namespace (str): A string mixed into every key.
+        max_entries (int, optional): The maximum number of entries kept in the in-process LRU. Defaults to 100000.
+        db_path (str, optional): The path of the SQLite database. Defaults to None.
+
+    Returns:
+        MemoCache: The memo cache.
+    """
+    return per_process(
+        ("memo_cache", namespace, max_entries, db_path),
+        lambda: MemoCache(namespace, max_entries, db_path),
+    )
@@ -0,0 +1,183 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import contextlib
+import contextvars
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+
+# Key of the chunk metrics in the attrs of a processed DataFrame
+METRICS_ATTR = "metrics"
+
+
+class ChunkMetrics:
+    """
+    Stage wall times and counters collected while a chunk is processed.
+
+    Attributes:
+        stage_seconds (Dict[str, float]): The wall time of each stage, in seconds.
+        counters (collections.Counter): Event counts and byte totals, e.g. "image_bytes_downloaded".
+
+    Methods:
+        stage(name: str): Times a stage, as a context manager.
+        count(name: str, value: int): Adds a value to a counter.
+        to_dict() -> Dict[str, Any]: Returns the metrics as plain, picklable data.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty ChunkMetrics object.
+        """
+        self.stage_seconds: Dict[str, float] = {}
+        self.counters = collections.Counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Times a stage and adds its wall time to stage_seconds.
+
+        Args:
+            name (str): The name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + elapsed
+
+    def count(self, name: str, value: int = 1) -> None:
+        """
+        Adds a value to a counter. Safe to call from the download threads.
+
+        Args:
+            name (str): The name of the counter.
+            value (int, optional): The value to add. Defaults to 1.
+        """
+        with self._lock:
+            self.counters[name] += value
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Returns the metrics as plain, picklable data.
+
+        Returns:
+            Dict[str, Any]: The stage wall times under "stage_seconds" and the counters under "counters".
+        """
+        with self._lock:
+            return {
+                "stage_seconds": dict(self.stage_seconds),
+                "counters": dict(self.counters),
+            }
+
+
+# The metrics of the chunk being processed. A context variable instead of an
+# argument, so the download helpers can record into it without changing their
+# signatures. Thread pools must run their work in a copy of the submitting
+# context (contextvars.copy_context().run) to record into the same chunk.
+_current_metrics: contextvars.ContextVar[
+    Optional[ChunkMetrics]
+] = contextvars.ContextVar("chunk_metrics", default=None)
+
+
+@contextlib.contextmanager
+def recording(metrics: ChunkMetrics) -> Iterator[ChunkMetrics]:
+    """
+    Makes metrics the target of count() and stage() in the current context.
+
+    Args:
+        metrics (ChunkMetrics): The metrics of the chunk being processed.
+
+    Yields:
+        ChunkMetrics: The same metrics.
+    """
+    token = _current_metrics.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current_metrics.reset(token)
+
+
+def count(name: str, value: int = 1) -> None:
+    """
+    Adds a value to a counter of the chunk being processed, if metrics are being recorded.
+
+    Args:
+        name (str): The name of the counter.
+        value (int, optional): The value to add. Defaults to 1.
+    """
+    metrics = _current_metrics.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def stage(name: str):
+    """
+    Times a stage of the chunk being processed, if metrics are being recorded.
+
+    Args:
+        name (str): The name of the stage.
+
+    Returns:
+        A context manager timing the stage.
+    """
+    metrics = _current_metrics.get()
+    if metrics is None:
+        return contextlib.nullcontext()
+    return metrics.stage(name)
+
+
+def summarize_metrics(
+    chunk_metrics: List[Dict[str, Any]], percentiles: Sequence[float] = (50, 90, 99)
+) -> Dict[str, Any]:
+    """
+    Aggregates the metrics of many chunks into a run summary.
+
+    Args:
+        chunk_metrics (List[Dict[str, Any]]): The metrics of each chunk, as returned by ChunkMetrics.to_dict().
+        percentiles (Sequence[float], optional): The percentiles of the stage wall times. Defaults to (50, 90, 99).
+
+    Returns:
+        Dict[str, Any]: The number of chunks, the total, mean and percentiles of each stage wall time across
+            chunks, and the total of each counter.
+    """
+    stage_seconds = collections.defaultdict(list)
+    counters = collections.Counter()
+    for metrics in chunk_metrics:
+        for name, seconds in metrics.get("stage_seconds", {}).items():
+            stage_seconds[name].append(seconds)
+        counters.update(metrics.get("counters", {}))
+
+    stages = {}
+    for name, values in stage_seconds.items():
+        values = np.asarray(values)
+        stages[name] = {
+            "total": float(values.sum()),
+            "mean": float(values.mean()),
+            **{
+                f"p{p:g}": float(value)
+                for p, value in zip(percentiles, np.percentile(values, percentiles))
+            },
+        }
+    return {
+        "chunks": len(chunk_metrics),
+        "stage_seconds": stages,
+        "counters": dict(counters),
+    }
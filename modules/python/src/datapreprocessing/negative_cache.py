@@ -0,0 +1,245 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from .gcs_utils import get_bucket, per_process
+
+# How long a failed image URL is skipped, in seconds, per error class.
+# Missing images and other client errors rarely come back, timeouts, rate
+# limiting and server errors often do.
+DEFAULT_NEGATIVE_CACHE_TTLS = {
+    "not_found": 30 * 24 * 3600,
+    "corrupt_image": 30 * 24 * 3600,
+    "http_error": 7 * 24 * 3600,
+    "url_error": 24 * 3600,
+    "gateway_timeout": 6 * 3600,
+    "timeout": 6 * 3600,
+    "server_error": 3600,
+    "rate_limited": 15 * 60,
+}
+
+
+class NegativeCache:
+    """
+    A cache of image URLs that recently failed to download, stored in GCS next to the images.
+
+    Every flush writes the failures recorded since the previous flush to a new shard object under the
+    prefix, so concurrent workers never overwrite each other. Loading merges all shards, keeping the most
+    recent failure of each URL and dropping failures past their TTL, and compacts the shards it read into one,
+    so the number of shards and their size do not grow across runs.
+
+    Attributes:
+        bucket_name (str): The name of the GCS bucket.
+        prefix (str): The GCS prefix holding the cache shards.
+        ttls (Dict[str, int]): The seconds a failure is remembered, per error class.
+        logger (logging.Logger): A logger object for logging information and errors.
+
+    Methods:
+        load(): Loads and merges every shard under the prefix, and compacts them.
+        compact(blobs): Writes the loaded failures to a single shard and deletes the given shards.
+        is_expired(entry) -> bool: Returns whether a failure is past the TTL of its error class.
+        lookup(url: str) -> Optional[str]: Returns the error class of a URL that is known to be dead.
+        record(url: str, error_class: str): Records a failed URL.
+        flush(): Writes the failures recorded since the last flush to a new shard.
+        counts() -> Dict[str, int]: Counts the known dead URLs per error class, across runs.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self, bucket_name: str, prefix: str, ttls: Optional[Dict[str, int]] = None
+    ):
+        """
+        Initializes a NegativeCache object.
+
+        Args:
+            bucket_name (str): The name of the GCS bucket.
+            prefix (str): The GCS prefix holding the cache shards.
+            ttls (Dict[str, int], optional): The seconds a failure is remembered, per error class. Defaults to DEFAULT_NEGATIVE_CACHE_TTLS.
+        """
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        self.ttls = ttls or DEFAULT_NEGATIVE_CACHE_TTLS
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._unflushed = {}
+
+    def load(self) -> None:
+        """
+        Loads and merges every shard under the prefix, leaving out failures past their TTL. When the prefix
+        holds more than one shard or expired failures, the shards read are compacted into one.
+        """
+        bucket = get_bucket(self.bucket_name)
+        blobs = []
+        for blob in bucket.list_blobs(prefix=self.prefix):
+            try:
+                entries = json.loads(blob.download_as_bytes())
+            except Exception as err:
+                self.logger.warning(f"Skipping negative cache shard {blob.name}: {err}")
+                continue
+            blobs.append(blob)
+            with self._lock:
+                for url, (error_class, failed_at) in entries.items():
+                    if url not in self._entries or self._entries[url][1] < failed_at:
+                        self._entries[url] = (error_class, failed_at)
+        with self._lock:
+            loaded = len(self._entries)
+            self._entries = {
+                url: entry
+                for url, entry in self._entries.items()
+                if not self.is_expired(entry)
+            }
+            expired = loaded - len(self._entries)
+        self.logger.info(
+            f"Loaded {len(self._entries)} failed image URLs ({expired} expired) from {len(blobs)} shards under gs://{self.bucket_name}/{self.prefix}"
+        )
+        if len(blobs) > 1 or expired:
+            self.compact(blobs)
+
+    def compact(self, blobs: List) -> None:
+        """
+        Writes the loaded failures to a single new shard, then deletes the given shards. Shards written by
+        other workers in the meantime are left alone, and a shard deleted by a concurrent compaction is
+        ignored. Nothing is lost when the compaction fails, the shards are compacted by a later load.
+
+        Args:
+            blobs (List[storage.Blob]): The shards that were loaded.
+        """
+        with self._lock:
+            entries = dict(self._entries)
+        try:
+            if entries:
+                self._write_shard(entries)
+            get_bucket(self.bucket_name).delete_blobs(blobs, on_error=lambda blob: None)
+        except Exception as err:
+            self.logger.warning(f"Unable to compact negative cache shards: {err}")
+            return
+        self.logger.info(
+            f"Compacted {len(blobs)} negative cache shards into {1 if entries else 0}"
+        )
+
+    def _write_shard(self, entries: Dict[str, Tuple[str, float]]) -> None:
+        shard_name = f"{self.prefix}{os.getpid()}-{uuid.uuid4().hex}.json"
+        blob = get_bucket(self.bucket_name).blob(shard_name)
+        blob.upload_from_string(json.dumps(entries), content_type="application/json")
+
+    def is_expired(self, entry: Tuple[str, float]) -> bool:
+        """
+        Returns whether a failure is past the TTL of its error class.
+
+        Args:
+            entry (Tuple[str, float]): The error class and the time of the failure.
+
+        Returns:
+            bool: True if the failure is no longer remembered.
+        """
+        error_class, failed_at = entry
+        return time.time() - failed_at > self.ttls.get(error_class, 0)
+
+    def lookup(self, url: str) -> Optional[str]:
+        """
+        Returns the error class of a URL that failed within the TTL of that error class.
+
+        Args:
+            url (str): The image URL.
+
+        Returns:
+            Optional[str]: The error class, or None if the URL is not known to be dead.
+        """
+        entry = self._entries.get(url)
+        if entry is None or self.is_expired(entry):
+            return None
+        return entry[0]
+
+    def record(self, url: str, error_class: str) -> None:
+        """
+        Records a failed URL.
+
+        Args:
+            url (str): The image URL.
+            error_class (str): The class of the error, one of the keys of the TTLs.
+        """
+        entry = (error_class, time.time())
+        with self._lock:
+            self._entries[url] = entry
+            self._unflushed[url] = entry
+
+    def flush(self) -> None:
+        """
+        Writes the failures recorded since the last flush to a new shard. Failures that cannot be written
+        are kept for the next flush.
+        """
+        with self._lock:
+            unflushed, self._unflushed = self._unflushed, {}
+        if not unflushed:
+            return
+        try:
+            self._write_shard(unflushed)
+        except Exception as err:
+            self.logger.warning(f"Unable to write negative cache shard: {err}")
+            with self._lock:
+                self._unflushed = {**unflushed, **self._unflushed}
+
+    def counts(self) -> Dict[str, int]:
+        """
+        Counts the URLs that are currently known to be dead, per error class. This covers every failure in
+        the cache, including those recorded by earlier runs and other workers.
+
+        Returns:
+            Dict[str, int]: The number of dead URLs per error class.
+        """
+        with self._lock:
+            urls = list(self._entries)
+        return dict(
+            collections.Counter(
+                error_class
+                for error_class in map(self.lookup, urls)
+                if error_class is not None
+            )
+        )
+
+
+def get_negative_cache(
+    bucket_name: str, prefix: str, ttls: Optional[Dict[str, int]] = None
+) -> NegativeCache:
+    """
+    Returns the negative cache of the current process for a prefix and TTLs, loading it on first use. The
+    chunks a worker processes share it.
+
+    Args:
+        bucket_name (str): The name of the GCS bucket.
+        prefix (str): The GCS prefix holding the cache shards.
+        ttls (Dict[str, int], optional): The seconds a failure is remembered, per error class. Defaults to DEFAULT_NEGATIVE_CACHE_TTLS.
+
+    Returns:
+        NegativeCache: The loaded negative cache.
+    """
+    ttls = ttls or DEFAULT_NEGATIVE_CACHE_TTLS
+
+    def load() -> NegativeCache:
+        cache = NegativeCache(bucket_name, prefix, ttls)
+        cache.load()
+        return cache
+
+    return per_process(
+        ("negative_cache", bucket_name, prefix, tuple(sorted(ttls.items()))), load
+    )
@@ -12,18 +12,312 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import collections
+import concurrent.futures
 import importlib
 import logging
 import os
 import signal
 import sys
 import time
-from typing import Any, Dict
+from typing import Any, Callable, Dict, List, Optional, Set
 
 import numpy as np
 import pandas as pd
 import ray
 from datapreprocessing import *
+from datapreprocessing.checkpoint import RunCheckpoint
+from datapreprocessing.metrics import METRICS_ATTR, summarize_metrics
+
+# Minimum interval between two progress messages of a streaming run, in seconds
+PROGRESS_LOG_SECONDS = 30
+
+# Ray options accepted in ray_resources, as passed to .options() of the tasks and of the actors
+TASK_OPTIONS = (
+    "num_cpus",
+    "num_gpus",
+    "memory",
+    "resources",
+    "accelerator_type",
+    "max_retries",
+    "retry_exceptions",
+    "scheduling_strategy",
+)
+ACTOR_OPTIONS = (
+    "num_cpus",
+    "num_gpus",
+    "memory",
+    "resources",
+    "accelerator_type",
+    "max_concurrency",
+    "max_restarts",
+    "max_task_retries",
+    "scheduling_strategy",
+)
+
+# Backends of a local run without a Ray runtime: worker processes, or threads for I/O-bound methods
+LOCAL_BACKENDS = ("process", "thread")
+
+
+class FailedChunksError(RuntimeError):
+    """Raised at the end of a run when chunks still failed after all retries, so its results are incomplete."""
+
+    def __init__(self, failed_chunks: List[int]):
+        self.failed_chunks = sorted(failed_chunks)
+        super().__init__(
+            f"Chunks {self.failed_chunks} failed after all retries, the results are incomplete"
+        )
+
+
+def process_chunk(
+    preprocessor,
+    method_name: str,
+    df: pd.DataFrame,
+    ray_worker_node_id: int,
+    gcs_bucket: str,
+    gcs_folder: str,
+):
+    """
+    Invokes the specified data processing method on a Ray worker.
+
+    A module-level function rather than a method, so a task carries only its arguments. The preprocessor and the
+    chunk are passed as object references that Ray resolves on the worker, reading NumPy-backed columns from the
+    object store without copying them.
+
+    Args:
+        preprocessor (object): An instance of the data processing class.
+        method_name (str): The name of the method to call on the preprocessor.
+        df (pd.DataFrame): The Pandas DataFrame to be processed.
+        ray_worker_node_id (int): The ID of the Ray worker node.
+        gcs_bucket (str): The name of the GCS bucket.
+        gcs_folder (str): The folder in the GCS bucket where the images will be stored.
+
+    Returns:
+        pd.DataFrame: The processed Pandas DataFrame in this example. It returns the data returned by the function invoked as ray task.
+    """
+
+    def func_not_found():  # just in case we don't have the function
+        print("No Function " + method_name + " Found!")
+
+    func = getattr(preprocessor, method_name, func_not_found)
+    return func(df, ray_worker_node_id, gcs_bucket, gcs_folder)
+
+
+class ChunkProcessor:
+    """
+    The body of a Ray actor that instantiates the data processing class once and processes many chunks with it.
+
+    Methods:
+        ready() -> bool: Returns True once the actor has started.
+        process(method_name, df, ray_worker_node_id, gcs_bucket, gcs_folder): Processes a chunk with process_chunk.
+    """
+
+    def __init__(
+        self,
+        package_name: str,
+        module_name: str,
+        class_name: str,
+        class_kwargs: Dict[str, Any],
+    ):
+        """
+        Instantiates the data processing class and calls its setup() method, if it has one, so models and
+        clients are loaded before the first chunk.
+
+        Args:
+            package_name (str): The name of the Python package containing the processing class.
+            module_name (str): The name of the Python module containing the processing class.
+            class_name (str): The name of the class to instantiate for data processing.
+            class_kwargs (Dict[str, Any]): Keyword arguments used to instantiate the processing class.
+        """
+        module = importlib.import_module(package_name + "." + module_name)
+        self.preprocessor = getattr(module, class_name)(**class_kwargs)
+        setup = getattr(self.preprocessor, "setup", None)
+        if setup is not None:
+            setup()
+
+    def ready(self) -> bool:
+        return True
+
+    def process(
+        self,
+        method_name: str,
+        df: pd.DataFrame,
+        ray_worker_node_id: int,
+        gcs_bucket: str,
+        gcs_folder: str,
+    ):
+        return process_chunk(
+            self.preprocessor,
+            method_name,
+            df,
+            ray_worker_node_id,
+            gcs_bucket,
+            gcs_folder,
+        )
+
+
+# The processor of a worker process of the local process backend, created by init_local_worker
+_local_processor: Optional[ChunkProcessor] = None
+
+
+def init_local_worker(
+    package_name: str,
+    module_name: str,
+    class_name: str,
+    class_kwargs: Dict[str, Any],
+) -> None:
+    """
+    Initializes a worker process of the local process backend. The data processing class is instantiated once
+    per process, like in an actor, and its setup() method is called.
+
+    Args:
+        package_name (str): The name of the Python package containing the processing class.
+        module_name (str): The name of the Python module containing the processing class.
+        class_name (str): The name of the class to instantiate for data processing.
+        class_kwargs (Dict[str, Any]): Keyword arguments used to instantiate the processing class.
+    """
+    global _local_processor
+    _local_processor = ChunkProcessor(
+        package_name, module_name, class_name, class_kwargs
+    )
+
+
+def process_local_chunk(
+    method_name: str,
+    df: pd.DataFrame,
+    ray_worker_node_id: int,
+    gcs_bucket: str,
+    gcs_folder: str,
+):
+    """
+    Processes a chunk in a worker process of the local process backend, with the processor of the process.
+
+    Args:
+        method_name (str): The name of the method to call on the preprocessor.
+        df (pd.DataFrame): The Pandas DataFrame to be processed.
+        ray_worker_node_id (int): The ID of the worker, the index of the chunk.
+        gcs_bucket (str): The name of the GCS bucket.
+        gcs_folder (str): The folder in the GCS bucket where the images will be stored.
+
+    Returns:
+        pd.DataFrame: The processed Pandas DataFrame.
+    """
+    return _local_processor.process(
+        method_name, df, ray_worker_node_id, gcs_bucket, gcs_folder
+    )
+
+
+class ElasticActorPool:
+    """
+    A pool of actors that runs up to slots_per_actor chunks per actor at a time, and grows from min_size to
+    max_size actors while chunks are waiting.
+
+    The pool grows by one actor at a time, and only once the actor added last has started. On an autoscaling
+    cluster the pending actor is what makes the autoscaler add a node, so the pool grows as fast as nodes are
+    added rather than queueing work on actors that cannot be placed.
+
+    Attributes:
+        create_actor (Callable[[], ray.actor.ActorHandle]): Creates an actor.
+        min_size (int): The number of actors created up front, and kept when actors die.
+        max_size (int): The maximum number of actors.
+        slots_per_actor (int): The number of chunks an actor runs at once, its max_concurrency.
+        actors (list): The live actors.
+        logger (logging.Logger): A logger object for logging information and errors.
+
+    Methods:
+        capacity() -> int: Returns the number of chunks the pool can run at once, adding an actor when all are busy.
+        submit(call) -> ray.ObjectRef: Runs a call on an actor with a free slot.
+        release(ref, err): Returns the actor of a finished call to the pool, or replaces it if it died.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(
+        self,
+        create_actor: Callable[[], Any],
+        min_size: int,
+        max_size: int,
+        slots_per_actor: int = 1,
+    ):
+        """
+        Initializes an ElasticActorPool object and creates min_size actors.
+
+        Args:
+            create_actor (Callable[[], ray.actor.ActorHandle]): Creates an actor.
+            min_size (int): The number of actors created up front.
+            max_size (int): The maximum number of actors.
+            slots_per_actor (int, optional): The number of chunks an actor runs at once. Defaults to 1.
+        """
+        self.create_actor = create_actor
+        self.min_size = max(min_size, 1)
+        self.max_size = max(max_size, self.min_size)
+        self.slots_per_actor = max(slots_per_actor, 1)
+        self.actors = []
+        self._idle = collections.deque()
+        self._busy = {}
+        self._starting = None
+        for _ in range(self.min_size):
+            self._add_actor()
+
+    def _add_actor(self) -> None:
+        actor = self.create_actor()
+        self.actors.append(actor)
+        self._idle.extend([actor] * self.slots_per_actor)
+        self._starting = actor.ready.remote()
+
+    def capacity(self) -> int:
+        """
+        Returns the number of chunks the pool can run at once. Called while chunks are waiting, so an actor is
+        added when all actors are busy, the pool is below max_size and the actor added last has started.
+
+        Returns:
+            int: The number of slots of all actors.
+        """
+        if not self._idle and len(self.actors) < self.max_size:
+            started, _ = ray.wait([self._starting], timeout=0)
+            if started:
+                self._add_actor()
+                self.logger.info(f"Actor pool grown to {len(self.actors)} actors")
+        return len(self.actors) * self.slots_per_actor
+
+    def submit(self, call: Callable[[Any], ray.ObjectRef]) -> ray.ObjectRef:
+        """
+        Runs a call on an actor with a free slot.
+
+        Args:
+            call (Callable[[ray.actor.ActorHandle], ray.ObjectRef]): Invokes a method of the actor.
+
+        Returns:
+            ray.ObjectRef: The reference to the result of the call.
+        """
+        actor = self._idle.popleft()
+        ref = call(actor)
+        self._busy[ref] = actor
+        return ref
+
+    def release(self, ref: ray.ObjectRef, err: Optional[Exception] = None) -> None:
+        """
+        Returns the actor of a finished call to the pool. An actor that died is dropped, and replaced when the
+        pool falls below min_size.
+
+        Args:
+            ref (ray.ObjectRef): The reference to the result of the call.
+            err (Exception, optional): The error raised by the call. Defaults to None.
+        """
+        actor = self._busy.pop(ref)
+        if actor not in self.actors:
+            # Another call of the actor already reported its death
+            return
+        if isinstance(err, ray.exceptions.RayActorError):
+            self.logger.warning(f"Actor died, removing it from the pool: {err}")
+            self.actors.remove(actor)
+            self._idle = collections.deque(
+                idle for idle in self._idle if idle is not actor
+            )
+            if len(self.actors) < self.min_size:
+                self._add_actor()
+        else:
+            self._idle.append(actor)
 
 
 class RayUtils:
@@ -32,7 +326,9 @@ class RayUtils:
 
     Attributes:
         ray_cluster_host (str): The address of the Ray cluster.  Use "local" for local execution.
-        ray_resources (dict): Resource requirements for Ray actors.
+        ray_resources (dict): The Ray options of the tasks and actors, e.g. {"num_cpus": 0.5, "memory": 2 * 1024**3,
+            "scheduling_strategy": "SPREAD"}. Options are passed to .options() of the tasks (TASK_OPTIONS) and of the
+            actors (ACTOR_OPTIONS) they apply to. num_cpus defaults to 1. The legacy "cpu" key is read as num_cpus.
         ray_runtime (dict): Runtime environment configuration for Ray.
         package_name (str): The name of the Python package containing the processing class.
         module_name (str): The name of the Python module containing the processing class.
@@ -40,11 +336,46 @@ class RayUtils:
         method_name (str): The name of the method to call for data processing. This method will be run as a ray task.
         df (list of pd.DataFrames): A list of Pandas DataFrames.
         gcs_bucket (str): The name of the Google Cloud Storage bucket used for data storage.
+        gcs_folder (str): The folder in the GCS bucket where the images will be stored.
+        class_kwargs (dict): Keyword arguments used to instantiate the processing class on the driver.
+        max_in_flight (int): The maximum number of tasks running at once. When set, results are collected as tasks
+            complete with ray.wait instead of all at once. None submits every task at once and waits for all of them.
+        result_callback (Callable[[int, Any], None]): Called with the chunk index and the result of each task as it
+            completes, e.g. to write the result out. When set, results are not kept and run_remote returns None.
+            Requires max_in_flight, min_actors or local_backend.
+        max_task_retries (int): The number of times a failed task is submitted again before its chunk is given up.
+            Requires max_in_flight, min_actors or local_backend.
+        min_actors (int): When set, chunks are processed by a pool of actors instead of tasks. Each actor
+            instantiates the processing class once with class_kwargs and processes max_concurrency (of
+            ray_resources, 1 by default) chunks at a time. The pool starts with min_actors actors.
+        max_actors (int): The size the actor pool may grow to while chunks are waiting. Defaults to min_actors.
+        checkpoint (RunCheckpoint): When set, the result of every chunk is persisted to GCS as it completes, and a
+            restarted run only processes the chunks missing from the checkpoint. Requires max_in_flight, min_actors
+            or local_backend. The caller finishes the checkpoint once it has written the results.
+        local_backend (str): With ray_cluster_host "local", "process" or "thread" runs the chunks on a
+            concurrent.futures pool instead of starting a Ray runtime, with the same dispatch of the processing class
+            and method. Each worker process instantiates the processing class once, while threads share one instance.
+            Results are collected as chunks complete, like with max_in_flight. None starts a local Ray runtime.
+        local_workers (int): The number of worker processes or threads of local_backend. Defaults to the number of CPUs.
+        run_summary (dict): The aggregated metrics of the chunks of the last run, or None if the tasks returned no metrics.
+        failed_chunks (list): The indices of the chunks whose tasks failed after all retries in the last run.
         logger (logging.Logger): A logger object for logging information and errors.
 
     Methods:
         run_remote(): Initiate a ray connection and runs the data processing tasks remotely using Ray.
-        invoke_process_data(self, preprocessor, df, ray_worker_node_id, gcs_bucket): Invokes the data processing method as a task on Ray workers.
+        submit(preprocessor_ref, chunk_refs, index): Submits the task of a chunk.
+        deliver_result(index, result, results) -> int: Hands the result of a chunk to result_callback or results.
+        collect_results(indices, submit, capacity, release): Runs the chunks with a bounded number in flight and collects their results as they complete.
+        restore_results(indices) -> Dict[int, Any]: Loads the results of chunks completed by earlier attempts from the checkpoint.
+        get_checkpoint_config() -> Dict[str, Any]: Returns the configuration covered by the checkpoint fingerprint.
+        run_tasks(chunk_refs): Runs the chunks as tasks with at most max_in_flight in flight.
+        run_actors(chunk_refs): Runs the chunks on a pool of min_actors to max_actors actors.
+        run_local(indices): Runs the chunks on the worker processes or threads of local_backend.
+        finish_run(results_by_index, restored): Completes a streaming run and returns its results.
+        normalize_ray_resources(ray_resources) -> Dict[str, Any]: Validates the Ray options and maps legacy keys.
+        get_ray_options(actor) -> Dict[str, Any]: Returns the Ray options of the tasks or of the actors.
+        invoke_process_data: process_chunk as a Ray remote function, invoked as a task on Ray workers.
+        processor_actor: ChunkProcessor as a Ray actor class.
     """
 
     logger = logging.getLogger(__name__)
@@ -61,9 +392,18 @@ class RayUtils:
         df: pd.DataFrame,
         gcs_bucket: str,
         gcs_folder: str,
+        class_kwargs: Dict[str, Any] = None,
+        max_in_flight: Optional[int] = None,
+        result_callback: Optional[Callable[[int, Any], None]] = None,
+        max_task_retries: int = 0,
+        min_actors: Optional[int] = None,
+        max_actors: Optional[int] = None,
+        checkpoint: Optional[RunCheckpoint] = None,
+        local_backend: Optional[str] = None,
+        local_workers: Optional[int] = None,
     ):
         self.ray_cluster_host = ray_cluster_host
-        self.ray_resource = ray_resources
+        self.ray_resources = self.normalize_ray_resources(ray_resources)
         self.ray_runtime = ray_runtime
         self.module_name = module_name
         self.class_name = class_name
@@ -72,45 +412,440 @@ class RayUtils:
         self.df = df
         self.gcs_bucket = gcs_bucket
         self.gcs_folder = gcs_folder
+        self.class_kwargs = class_kwargs or {}
+        self.max_in_flight = max_in_flight
+        self.result_callback = result_callback
+        self.max_task_retries = max_task_retries
+        self.min_actors = min_actors
+        self.max_actors = max_actors
+        self.checkpoint = checkpoint
+        if local_backend is not None:
+            if local_backend not in LOCAL_BACKENDS:
+                raise ValueError(
+                    f"Unsupported local_backend '{local_backend}', expected one of {LOCAL_BACKENDS}"
+                )
+            if ray_cluster_host != "local":
+                raise ValueError("local_backend requires ray_cluster_host 'local'")
+        self.local_backend = local_backend
+        self.local_workers = local_workers
+        self.run_summary = None
+        self.failed_chunks: List[int] = []
+        self._chunk_metrics: List[Dict[str, Any]] = []
+
+    invoke_process_data = ray.remote(process_chunk)
+    processor_actor = ray.remote(ChunkProcessor)
+
+    def normalize_ray_resources(
+        self, ray_resources: Optional[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Validates the Ray options of ray_resources, reads the legacy "cpu" key as num_cpus and defaults num_cpus to 1.
+
+        Args:
+            ray_resources (Dict[str, Any]): The Ray options, or None for the defaults.
 
-    @ray.remote(resources={"cpu": 1})
-    def invoke_process_data(
+        Returns:
+            Dict[str, Any]: The Ray options.
+        """
+        options = dict(ray_resources or {})
+        if "cpu" in options:
+            self.logger.warning(
+                "The 'cpu' key of ray_resources is deprecated, use 'num_cpus' instead"
+            )
+            options.setdefault("num_cpus", options.pop("cpu"))
+        options.setdefault("num_cpus", 1)
+        unknown = set(options) - set(TASK_OPTIONS) - set(ACTOR_OPTIONS)
+        if unknown:
+            raise ValueError(
+                f"Unsupported Ray options in ray_resources: {sorted(unknown)}"
+            )
+        return options
+
+    def get_ray_options(self, actor: bool = False) -> Dict[str, Any]:
+        """
+        Returns the options of ray_resources that apply to the tasks or to the actors.
+
+        Args:
+            actor (bool, optional): Whether to return the options of the actors. Defaults to False.
+
+        Returns:
+            Dict[str, Any]: The keyword arguments of .options().
+        """
+        names = ACTOR_OPTIONS if actor else TASK_OPTIONS
+        return {
+            name: value for name, value in self.ray_resources.items() if name in names
+        }
+
+    def submit(
         self,
-        preprocessor,
-        df: pd.DataFrame,
-        ray_worker_node_id: int,
-        gcs_bucket: str,
-        gcs_folder: str,
-    ):
+        preprocessor_ref: ray.ObjectRef,
+        chunk_refs: Dict[int, ray.ObjectRef],
+        index: int,
+    ) -> ray.ObjectRef:
+        """
+        Submits the task of a chunk. The task carries only references to the preprocessor and the chunk.
+
+        Args:
+            preprocessor_ref (ray.ObjectRef): The reference to the instance of the data processing class.
+            chunk_refs (Dict[int, ray.ObjectRef]): The references to the chunks, by chunk index.
+            index (int): The index of the chunk, also passed to the task as its worker node ID.
+
+        Returns:
+            ray.ObjectRef: The reference to the result of the task.
+        """
+        return self.invoke_process_data.options(**self.get_ray_options()).remote(
+            preprocessor_ref,
+            self.method_name,
+            chunk_refs[index],
+            index,
+            self.gcs_bucket,
+            self.gcs_folder,
+        )
+
+    def deliver_result(self, index: int, result: Any, results: Dict[int, Any]) -> int:
+        """
+        Takes the metrics out of the result of a chunk, and hands the result to result_callback, or adds it to
+        results when there is no callback.
+
+        Args:
+            index (int): The index of the chunk.
+            result (Any): The result of the chunk.
+            results (Dict[int, Any]): The results by chunk index.
+
+        Returns:
+            int: The number of rows of the result.
+        """
+        rows = 0
+        if isinstance(result, pd.DataFrame):
+            rows = len(result)
+            if METRICS_ATTR in result.attrs:
+                self._chunk_metrics.append(result.attrs.pop(METRICS_ATTR))
+        if self.result_callback is not None:
+            self.result_callback(index, result)
+        else:
+            results[index] = result
+        return rows
+
+    def collect_results(
+        self,
+        indices: List[int],
+        submit: Callable[[int], ray.ObjectRef],
+        capacity: Callable[[], int],
+        release: Optional[Callable[[ray.ObjectRef, Optional[Exception]], None]] = None,
+        wait: Optional[Callable[[List[Any]], List[Any]]] = None,
+        get: Optional[Callable[[Any], Any]] = None,
+    ) -> Dict[int, Any]:
+        """
+        Runs the chunks with at most capacity() in flight, and collects their results with ray.wait as they
+        complete, or with wait and get for other handles than Ray object references. A failed chunk is queued again up to max_task_retries times, after which it is recorded in
+        failed_chunks and the run continues.
+
+        Args:
+            indices (List[int]): The indices of the chunks to run.
+            submit (Callable[[int], ray.ObjectRef]): Starts the processing of the chunk with the given index.
+            capacity (Callable[[], int]): Returns the number of chunks that can be in flight.
+            release (Callable[[ray.ObjectRef, Optional[Exception]], None], optional): Called when a chunk finished,
+                with its error if it failed. Defaults to None.
+            wait (Callable[[List[Any]], List[Any]], optional): Blocks until some of the given handles completed and
+                returns them. Defaults to ray.wait for one reference.
+            get (Callable[[Any], Any], optional): Returns the result of a completed handle, raising the error of a
+                failed chunk. Defaults to ray.get.
+
+        Returns:
+            Dict[int, Any]: The results by chunk index, or an empty dict when result_callback takes them.
+        """
+        if wait is None:
+            wait = lambda refs: ray.wait(refs, num_returns=1)[0]
+        if get is None:
+            get = ray.get
+        results = {}
+        # (chunk index, attempt) of the chunks waiting to be submitted
+        queue = collections.deque((index, 0) for index in indices)
+        # Task reference -> (chunk index, attempt)
+        pending = {}
+        completed = 0
+        rows = 0
+        start_time = time.time()
+        last_log_time = start_time
+        while queue or pending:
+            while queue and len(pending) < capacity():
+                index, attempt = queue.popleft()
+                pending[submit(index)] = (index, attempt)
+
+            for ref in wait(list(pending)):
+                index, attempt = pending.pop(ref)
+                try:
+                    result = get(ref)
+                except Exception as err:
+                    if release is not None:
+                        release(ref, err)
+                    if attempt < self.max_task_retries:
+                        self.logger.warning(
+                            f"Task of chunk {index} failed, retrying ({attempt + 1}/{self.max_task_retries}): {err}"
+                        )
+                        queue.append((index, attempt + 1))
+                    else:
+                        self.logger.error(f"Task of chunk {index} failed: {err}")
+                        self.failed_chunks.append(index)
+                    continue
+                if release is not None:
+                    release(ref, None)
+
+                if self.checkpoint is not None and isinstance(result, pd.DataFrame):
+                    # Saved with its metrics, so a resumed run still reports them
+                    self.checkpoint.save_chunk(index, result)
+                rows += self.deliver_result(index, result, results)
+                completed += 1
+
+            now = time.time()
+            if now - last_log_time >= PROGRESS_LOG_SECONDS or not (queue or pending):
+                elapsed = max(now - start_time, 1e-9)
+                self.logger.info(
+                    f"Completed {completed}/{len(indices)} chunks ({len(self.failed_chunks)} failed) "
+                    f"in {elapsed:.1f} seconds, {completed / elapsed:.2f} chunks/s, {rows / elapsed:.1f} rows/s"
+                )
+                last_log_time = now
+        return results
+
+    def restore_results(self, indices: List[int]) -> Dict[int, Any]:
+        """
+        Loads the results of chunks completed by earlier attempts of the run from the checkpoint, and hands them
+        to result_callback like the results of this attempt.
+
+        Args:
+            indices (List[int]): The indices of the completed chunks.
+
+        Returns:
+            Dict[int, Any]: The results by chunk index, or an empty dict when result_callback takes them.
+        """
+        results = {}
+        for index in sorted(indices):
+            self.deliver_result(index, self.checkpoint.load_chunk(index), results)
+        return results
+
+    def get_checkpoint_config(self) -> Dict[str, Any]:
+        """
+        Returns the configuration covered by the checkpoint fingerprint, so a run with a different processing
+        class, method, settings or destination does not resume from it.
+
+        Returns:
+            Dict[str, Any]: The configuration.
+        """
+        return {
+            "package_name": self.package_name,
+            "module_name": self.module_name,
+            "class_name": self.class_name,
+            "method_name": self.method_name,
+            "class_kwargs": self.class_kwargs,
+            "gcs_bucket": self.gcs_bucket,
+            "gcs_folder": self.gcs_folder,
+        }
+
+    def run_tasks(self, chunk_refs: Dict[int, ray.ObjectRef]) -> Dict[int, Any]:
+        """
+        Runs the chunks as tasks with at most max_in_flight in flight. The processing class is instantiated on
+        the driver and placed in the object store once.
+
+        Args:
+            chunk_refs (List[ray.ObjectRef]): The references to the chunks.
+
+        Returns:
+            Dict[int, Any]: The results by chunk index, or an empty dict when result_callback takes them.
+        """
+        preprocessor_ref = ray.put(self.create_preprocessor())
+        return self.collect_results(
+            list(chunk_refs),
+            lambda index: self.submit(preprocessor_ref, chunk_refs, index),
+            lambda: self.max_in_flight,
+        )
+
+    def run_actors(self, chunk_refs: Dict[int, ray.ObjectRef]) -> Dict[int, Any]:
+        """
+        Runs the chunks on a pool of min_actors to max_actors actors, each instantiating the processing class
+        once and processing one chunk at a time.
+
+        Args:
+            chunk_refs (List[ray.ObjectRef]): The references to the chunks.
+
+        Returns:
+            Dict[int, Any]: The results by chunk index, or an empty dict when result_callback takes them.
+        """
+        actor_options = self.get_ray_options(actor=True)
+        pool = ElasticActorPool(
+            lambda: self.processor_actor.options(**actor_options).remote(
+                self.package_name, self.module_name, self.class_name, self.class_kwargs
+            ),
+            self.min_actors,
+            self.max_actors or self.min_actors,
+            slots_per_actor=actor_options.get("max_concurrency", 1),
+        )
+        self.logger.info(f"Started an actor pool of {len(pool.actors)} actors")
+
+        def submit(index: int) -> ray.ObjectRef:
+            return pool.submit(
+                lambda actor: actor.process.remote(
+                    self.method_name,
+                    chunk_refs[index],
+                    index,
+                    self.gcs_bucket,
+                    self.gcs_folder,
+                )
+            )
+
+        return self.collect_results(
+            list(chunk_refs), submit, pool.capacity, pool.release
+        )
+
+    def run_local(self, indices: List[int]) -> Dict[int, Any]:
         """
-        Invokes the specified data processing method on a Ray worker.
+        Runs the chunks on the worker processes or threads of local_backend, without a Ray runtime. Worker
+        processes instantiate the processing class once each with init_local_worker, and receive their chunks
+        pickled. Threads share one instance of the processing class and the chunks.
 
         Args:
-            preprocessor (object): An instance of the data processing class.
-            df (pd.DataFrame): The Pandas DataFrame to be processed.
-            ray_worker_node_id (int): The ID of the Ray worker node.
-            gcs_bucket (str): The name of the GCS bucket.
-            gcs_folder (str): The folder in the GCS bucket where the images will be stored.
+            indices (List[int]): The indices of the chunks to run.
 
         Returns:
-            pd.DataFrame: The processed Pandas DataFrame in this example. It returns the data returned by the function invoked as ray task.
+            Dict[int, Any]: The results by chunk index, or an empty dict when result_callback takes them.
         """
+        workers = self.local_workers or os.cpu_count() or 1
+        processor_args = (
+            self.package_name,
+            self.module_name,
+            self.class_name,
+            self.class_kwargs,
+        )
+        if self.local_backend == "thread":
+            process = ChunkProcessor(*processor_args).process
+            executor = concurrent.futures.ThreadPoolExecutor(workers)
+        else:
+            process = process_local_chunk
+            executor = concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=init_local_worker, initargs=processor_args
+            )
+        self.logger.info(
+            f"Started a local {self.local_backend} pool of {workers} workers"
+        )
+
+        def submit(index: int) -> concurrent.futures.Future:
+            return executor.submit(
+                process,
+                self.method_name,
+                self.df[index],
+                index,
+                self.gcs_bucket,
+                self.gcs_folder,
+            )
 
-        def func_not_found():  # just in case we don't have the function
-            print("No Function " + self.method_name + " Found!")
+        try:
+            return self.collect_results(
+                indices,
+                submit,
+                lambda: self.max_in_flight or workers,
+                wait=lambda futures: concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED
+                ).done,
+                get=lambda future: future.result(),
+            )
+        finally:
+            executor.shutdown(cancel_futures=True)
 
-        func = getattr(preprocessor, self.method_name, func_not_found)
-        return func(df, ray_worker_node_id, gcs_bucket, gcs_folder)
+    def finish_run(
+        self, results_by_index: Dict[int, Any], restored: Set[int]
+    ) -> Optional[pd.DataFrame]:
+        """
+        Completes a streaming run: adds the results restored from the checkpoint, records the completed chunks in
+        the checkpoint and aggregates the metrics into run_summary.
+
+        Args:
+            results_by_index (Dict[int, Any]): The results of this attempt by chunk index.
+            restored (Set[int]): The indices of the chunks completed by earlier attempts of the run.
+
+        Returns:
+            pd.DataFrame: The results concatenated in chunk order, or None when result_callback takes them.
+
+        Raises:
+            FailedChunksError: If chunks failed after all retries. The completed chunks are in the checkpoint, so a
+                restarted run only processes the failed ones.
+        """
+        if restored:
+            results_by_index.update(self.restore_results(restored))
+        if self.checkpoint is not None:
+            self.checkpoint.record(set(range(len(self.df))) - set(self.failed_chunks))
+        if self._chunk_metrics:
+            self.run_summary = summarize_metrics(self._chunk_metrics)
+            self.logger.info(f"Run summary: {self.run_summary}")
+        if self.failed_chunks:
+            raise FailedChunksError(self.failed_chunks)
+        if self.result_callback is not None:
+            return None
+        if not results_by_index:
+            return pd.DataFrame()
+        return pd.concat(
+            [results_by_index[i] for i in sorted(results_by_index)],
+            axis=0,
+            ignore_index=True,
+        )
+
+    def create_preprocessor(self):
+        """
+        Instantiates the processing class with class_kwargs.
+
+        Returns:
+            object: An instance of the data processing class.
+        """
+        complete_module_name = self.package_name + "." + self.module_name
+        module = importlib.import_module(complete_module_name)
+        MyClass = getattr(module, self.class_name)
+        return MyClass(**self.class_kwargs)
 
     def run_remote(self):
         """
         Runs the data processing tasks remotely using Ray.  This method initializes the Ray cluster,
         imports the necessary modules and classes, instantiates the data processing class, and
-        distributes the data processing tasks to Ray workers.
+        distributes the data processing tasks to Ray workers. Metrics returned by the tasks in the attrs of their
+        DataFrames are aggregated into run_summary.
+
+        With max_in_flight set, the chunks are run as tasks by run_tasks, and with min_actors set on a pool of actors
+        by run_actors. Both collect results as they complete and raise FailedChunksError at the end of the run when
+        chunks failed after all retries. With a
+        checkpoint, chunks completed by earlier attempts of the run are loaded instead of processed again. With
+        local_backend, the chunks are run by run_local in the same way, without initializing Ray.
 
         Returns:
             pd.DataFrame: A concatenated Pandas DataFrame containing the results from all ray workers in this example. It returns the data returned by the function invoked as ray task.
+                None when result_callback takes the results.
+
+        Raises:
+            FailedChunksError: If chunks of a streaming run failed after all retries.
         """
+        streaming = (
+            self.max_in_flight is not None
+            or self.min_actors is not None
+            or self.local_backend is not None
+        )
+        if self.result_callback is not None and not streaming:
+            raise ValueError(
+                "result_callback requires max_in_flight, min_actors or local_backend"
+            )
+        if self.checkpoint is not None and not streaming:
+            raise ValueError(
+                "checkpoint requires max_in_flight, min_actors or local_backend"
+            )
+        self.run_summary = None
+        self.failed_chunks = []
+        self._chunk_metrics = []
+        restored = set()
+        if self.checkpoint is not None:
+            restored = self.checkpoint.start(self.df, self.get_checkpoint_config())
+
+        if self.local_backend is not None:
+            self.logger.debug("Data Preparation started")
+            results_by_index = self.run_local(
+                [index for index in range(len(self.df)) if index not in restored]
+            )
+            return self.finish_run(results_by_index, restored)
+
         # Initiate a driver: start and connect with Ray cluster
         if self.ray_cluster_host != "local":
             ClientContext = ray.init(
@@ -127,20 +862,30 @@ class RayUtils:
             RayContext = ray.init()
             self.logger.debug(RayContext)
 
-        complete_module_name = self.package_name + "." + self.module_name
-        module = importlib.import_module(complete_module_name)
-        MyClass = getattr(module, self.class_name)
-        preprocessor = MyClass()
+        # Every chunk, and the preprocessor of tasks, is placed in the object store once, so each submission
+        # only carries small references, even when a chunk is retried
+        chunk_refs = {
+            index: ray.put(chunk)
+            for index, chunk in enumerate(self.df)
+            if index not in restored
+        }
         # Probably make this comment generic since any function can be passed to rayutil for running as a task
         self.logger.debug("Data Preparation started")
         start_time = time.time()
+        if streaming:
+            try:
+                if self.min_actors is not None:
+                    results_by_index = self.run_actors(chunk_refs)
+                else:
+                    results_by_index = self.run_tasks(chunk_refs)
+            finally:
+                # Disconnect the worker, and terminate processes started by ray.init()
+                ray.shutdown()
+            return self.finish_run(results_by_index, restored)
+
+        preprocessor_ref = ray.put(self.create_preprocessor())
         results = ray.get(
-            [
-                self.invoke_process_data.remote(
-                    self, preprocessor, self.df[i], i, self.gcs_bucket, self.gcs_folder
-                )
-                for i in range(len(self.df))
-            ]
+            [self.submit(preprocessor_ref, chunk_refs, i) for i in sorted(chunk_refs)]
         )
         duration = time.time() - start_time
         self.logger.debug(f"Data Preparation finished in {duration} seconds")
@@ -148,7 +893,19 @@ class RayUtils:
         # Disconnect the worker, and terminate processes started by ray.init()
         ray.shutdown()
 
+        # Collect the per-chunk metrics before concat, which would otherwise merge the attrs
+        chunk_metrics = [
+            result.attrs.pop(METRICS_ATTR)
+            for result in results
+            if isinstance(result, pd.DataFrame) and METRICS_ATTR in result.attrs
+        ]
+        if chunk_metrics:
+            self.run_summary = summarize_metrics(chunk_metrics)
+            self.logger.info(f"Run summary: {self.run_summary}")
+
         # concat all the resulting data frames
+        if not results:
+            return pd.DataFrame()
         result_df = pd.concat(results, axis=0, ignore_index=True)
 
         return result_df
@@ -12,4 +12,15 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-__all__ = ["test_dataloader", "test_dataprep", "test_datacleaner"]
+__all__ = [
+    "test_dataloader",
+    "test_dataprep",
+    "test_datacleaner",
+    "test_gcs_utils",
+    "test_memo_cache",
+    "test_negative_cache",
+    "test_http_fetcher",
+    "test_image_utils",
+    "test_metrics",
+    "test_checkpoint",
+]
@@ -0,0 +1,147 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import unittest
+from unittest.mock import patch
+
+import pandas as pd
+from src.datapreprocessing.checkpoint import RunCheckpoint
+
+
+class FakeBlob:
+    """An in-memory stand-in for a GCS blob."""
+
+    def __init__(self, objects, name):
+        self.objects = objects
+        self.name = name
+
+    def exists(self):
+        return self.name in self.objects
+
+    def upload_from_string(self, data, content_type=None):
+        self.objects[self.name] = data.encode() if isinstance(data, str) else data
+
+    def upload_from_file(self, file, content_type=None):
+        self.objects[self.name] = file.read()
+
+    def download_as_bytes(self):
+        return self.objects[self.name]
+
+    def delete(self):
+        del self.objects[self.name]
+
+
+class TestRunCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.objects = {}
+        get_bucket = patch("src.datapreprocessing.checkpoint.get_bucket").start()
+        get_bucket.return_value.blob.side_effect = lambda name: FakeBlob(
+            self.objects, name
+        )
+        list_blob_names = patch(
+            "src.datapreprocessing.checkpoint.list_blob_names"
+        ).start()
+        list_blob_names.side_effect = lambda bucket, prefix, refresh: frozenset(
+            name for name in self.objects if name.startswith(prefix)
+        )
+        self.addCleanup(patch.stopall)
+        self.chunks = [
+            pd.DataFrame({"uniq_id": ["a", "b"]}),
+            pd.DataFrame({"uniq_id": ["c"]}),
+        ]
+
+    def test_resume_skips_completed_chunks(self):
+        """Test if a restarted run gets the chunks completed before, with their attrs."""
+        checkpoint = RunCheckpoint("bucket", "checkpoints/", "run-1")
+        self.assertEqual(
+            checkpoint.start(self.chunks, {"method_name": "process_data"}), set()
+        )
+        result = pd.DataFrame({"uniq_id": ["c"], "image_uri": ["gs://bucket/c.jpg"]})
+        result.attrs["metrics"] = {"counters": {"rows_in": 1}}
+        checkpoint.save_chunk(1, result)
+        self.assertIn("checkpoints/run-1/chunks/chunk-000001.parquet", self.objects)
+
+        restarted = RunCheckpoint("bucket", "checkpoints", "run-1")
+        self.assertEqual(
+            restarted.start(self.chunks, {"method_name": "process_data"}), {1}
+        )
+        loaded = restarted.load_chunk(1)
+        pd.testing.assert_frame_equal(loaded, result)
+        self.assertEqual(loaded.attrs, result.attrs)
+
+        restarted.record({0, 1})
+        manifest = json.loads(self.objects["checkpoints/run-1/manifest.json"])
+        self.assertFalse(manifest["complete"])
+        self.assertEqual(manifest["completed"], [0, 1])
+        # The chunks are kept until the caller has written the output
+        self.assertIn("checkpoints/run-1/chunks/chunk-000001.parquet", self.objects)
+
+        restarted.finish()
+        manifest = json.loads(self.objects["checkpoints/run-1/manifest.json"])
+        self.assertTrue(manifest["complete"])
+        self.assertNotIn("checkpoints/run-1/chunks/chunk-000001.parquet", self.objects)
+
+    def test_completed_run_starts_over(self):
+        """Test if a run ID reused after its run completed does not resume the completed run."""
+        checkpoint = RunCheckpoint("bucket", "checkpoints", "run-1")
+        checkpoint.start(self.chunks)
+        checkpoint.save_chunk(0, self.chunks[0])
+        checkpoint.finish()
+
+        checkpoint.save_chunk(1, self.chunks[1])
+        rerun = RunCheckpoint("bucket", "checkpoints", "run-1")
+        self.assertEqual(rerun.start(self.chunks), set())
+        self.assertNotIn("checkpoints/run-1/chunks/chunk-000001.parquet", self.objects)
+        manifest = json.loads(self.objects["checkpoints/run-1/manifest.json"])
+        self.assertFalse(manifest["complete"])
+
+        rerun.save_chunk(0, self.chunks[0])
+        self.assertEqual(
+            RunCheckpoint("bucket", "checkpoints", "run-1").start(self.chunks), {0}
+        )
+
+    def test_incomplete_run_keeps_chunks(self):
+        """Test if the chunks of a run with failed chunks are kept for its restart."""
+        checkpoint = RunCheckpoint("bucket", "checkpoints", "run-1")
+        checkpoint.start(self.chunks)
+        checkpoint.save_chunk(0, self.chunks[0])
+        checkpoint.record({0})
+
+        restarted = RunCheckpoint("bucket", "checkpoints", "run-1")
+        self.assertEqual(restarted.start(self.chunks), {0})
+
+    def test_changed_run_starts_over(self):
+        """Test if the results of a run ID reused with other chunks or settings are discarded."""
+        checkpoint = RunCheckpoint("bucket", "checkpoints", "run-1")
+        checkpoint.start(self.chunks, {"class_kwargs": {"dedup_images": False}})
+        checkpoint.save_chunk(0, self.chunks[0])
+
+        restarted = RunCheckpoint("bucket", "checkpoints", "run-1")
+        self.assertEqual(
+            restarted.start(self.chunks, {"class_kwargs": {"dedup_images": True}}),
+            set(),
+        )
+        self.assertNotIn("checkpoints/run-1/chunks/chunk-000000.parquet", self.objects)
+
+        changed_chunks = [self.chunks[0], pd.DataFrame({"uniq_id": ["d"]})]
+        restarted.save_chunk(0, self.chunks[0])
+        self.assertEqual(
+            restarted.start(changed_chunks, {"class_kwargs": {"dedup_images": True}}),
+            set(),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -12,12 +12,26 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import contextlib
+import hashlib
+import io
+import os
+import random
+import re
+import tempfile
+import threading
 import unittest
+import urllib.error
 from unittest.mock import Mock, patch
 
+import jsonpickle
 import pandas as pd
+from google.api_core.exceptions import PreconditionFailed
+from PIL import Image
 import src.datapreprocessing.datacleaner
-from src.datapreprocessing.datacleaner import DataPreprocessor
+import src.datapreprocessing.memo_cache
+from src.datapreprocessing.datacleaner import DataPreprocessor, ImageFetchCancelled
+from src.datapreprocessing.negative_cache import NegativeCache
 
 
 class TestDataCleaner(unittest.TestCase):
@@ -45,6 +59,7 @@ class TestDataCleaner(unittest.TestCase):
             }
         )
         self.cleaner = DataPreprocessor()
+        src.datapreprocessing.gcs_utils._instances.clear()
 
     def test_extract_url(self):
         """Test if image URLs are extracted correctly from the image column."""
@@ -53,6 +68,56 @@ class TestDataCleaner(unittest.TestCase):
         urls = self.cleaner.extract_url(self.df["image"][1])
         self.assertEqual(urls, ["url2", " url3"])
 
+    def mock_response(self, body: bytes):
+        """Creates a mocked HTTP fetcher response streaming the given body."""
+        response = Mock()
+        response.iter_content.side_effect = lambda chunk_size: iter(
+            [body[i : i + chunk_size] for i in range(0, len(body), chunk_size)]
+        )
+        return contextlib.nullcontext(response)
+
+    @patch("src.datapreprocessing.datacleaner.get_bucket")
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.get_http_fetcher")
+    def test_download_image_streams_to_gcs(
+        self, mock_get_http_fetcher, mock_get_bucket
+    ):
+        """Test if an image is uploaded from memory without touching the download directory."""
+        mock_get_http_fetcher.return_value.open.return_value = self.mock_response(
+            b"image-bytes"
+        )
+        mock_blob = mock_get_bucket.return_value.blob.return_value
+        uploaded = []
+        mock_blob.upload_from_file.side_effect = (
+            lambda image_file, size, retry, if_generation_match: uploaded.append(
+                (image_file.read(), size)
+            )
+        )
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            download_dir = os.path.join(temp_dir, "images")
+            cleaner = DataPreprocessor(download_dir=download_dir)
+            self.assertTrue(
+                cleaner.download_image("url1", "1_0.jpg", "path/1_0.jpg", 1, "bucket")
+            )
+            self.assertFalse(os.path.exists(download_dir))
+        mock_get_bucket.return_value.blob.assert_called_with("path/1_0.jpg")
+        self.assertEqual(uploaded, [(b"image-bytes", 11)])
+
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.get_http_fetcher")
+    def test_fetch_image_spools_oversized_images(self, mock_get_http_fetcher):
+        """Test if images above the in-memory threshold are spooled to disk."""
+        mock_get_http_fetcher.return_value.open.return_value = self.mock_response(
+            b"x" * 100
+        )
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cleaner = DataPreprocessor(
+                max_in_memory_image_bytes=10,
+                download_dir=os.path.join(temp_dir, "images"),
+            )
+            with cleaner.fetch_image("url1") as image_file:
+                self.assertTrue(image_file._rolled)
+                self.assertEqual(image_file.read(), b"x" * 100)
+
     @patch("src.datapreprocessing.datacleaner.spacy.load")
     def test_prep_product_desc(self, mock_spacy_load):
         """Test if product descriptions are cleaned correctly."""
@@ -65,6 +130,32 @@ class TestDataCleaner(unittest.TestCase):
         cleaned_df = self.cleaner.prep_product_desc(self.df.copy())
         self.assertEqual(cleaned_df["description"][0], "test")
 
+    @patch("src.datapreprocessing.datacleaner.spacy.load")
+    def test_prep_product_desc_batched(self, mock_spacy_load):
+        """Test if descriptions are lemmatized in batches with a model loaded once."""
+        mock_nlp = mock_spacy_load.return_value
+        mock_nlp.pipe.side_effect = lambda texts, batch_size: [
+            [
+                Mock(lemma_="test", is_stop=False, is_alpha=True),
+                Mock(lemma_=text.split()[0], is_stop=False, is_alpha=True),
+                Mock(lemma_="test", is_stop=False, is_alpha=True),
+            ]
+            for text in texts
+        ]
+        cleaned_df = self.cleaner.prep_product_desc(self.df.copy(), batch_size=2)
+        self.cleaner.prep_product_desc(self.df.copy(), batch_size=2)
+
+        self.assertEqual(cleaned_df["description"][0], "test this")
+        self.assertEqual(cleaned_df["description"][1], "test another")
+        self.assertIsNone(cleaned_df["description"][2])
+        mock_spacy_load.assert_called_once_with(
+            "en_core_web_sm", disable=["parser", "ner"]
+        )
+        self.assertEqual(mock_nlp.pipe.call_args.kwargs["batch_size"], 2)
+        self.assertEqual(
+            mock_nlp.pipe.call_count, 1
+        )  # second run is served from the cache
+
     def test_parse_attributes(self):
         """Test if product attributes are parsed correctly."""
         attributes = self.cleaner.parse_attributes(self.df["product_specifications"][0])
@@ -72,6 +163,56 @@ class TestDataCleaner(unittest.TestCase):
         attributes = self.cleaner.parse_attributes(self.df["product_specifications"][1])
         self.assertEqual(attributes, "{}")
 
+    def legacy_parse_attributes(self, specification):
+        """The regex based parser parse_attributes must stay byte-identical to."""
+        spec_match_one = re.compile("(.*?)\\[(.*)\\](.*)")
+        spec_match_two = re.compile('(.*?)=>"(.*?)"(.*?)=>"(.*?)"(.*)')
+        m = spec_match_one.match(specification)
+        out = {}
+        if m is not None and m.group(2) is not None:
+            phrase = ""
+            for c in m.group(2):
+                if c == "}":
+                    m2 = spec_match_two.match(phrase)
+                    if m2 and m2.group(2) is not None and m2.group(4) is not None:
+                        out[m2.group(2)] = m2.group(4)
+                    phrase = ""
+                else:
+                    phrase += c
+        return jsonpickle.encode(out)
+
+    def test_parse_attributes_matches_regex_parser(self):
+        """Test if the single pass parser matches the regex parser on random specifications."""
+        rng = random.Random(0)
+        alphabet = ["[", "]", "{", "}", '=>"', '"', "=>", "k", "v", " ", ",", "\n", "é"]
+        specifications = [
+            '{"product_specification"=>[{"key"=>"Color", "value"=>"Blue"}, {"value"=>"Cotton"}]}'
+        ] + ["".join(rng.choices(alphabet, k=rng.randint(0, 40))) for _ in range(2000)]
+        for backend in ("json", "jsonpickle"):
+            cleaner = DataPreprocessor(json_backend=backend)
+            for specification in specifications:
+                self.assertEqual(
+                    cleaner.parse_attributes(specification),
+                    self.legacy_parse_attributes(specification),
+                    specification,
+                )
+
+    def test_parse_attributes_series(self):
+        """Test if a Series of specifications is parsed with NaN mapped to None."""
+        specifications = pd.Series(
+            [
+                '[{key1=>"value1", key2=>"value2"}]',
+                None,
+                '[{key1=>"value1", key2=>"value2"}]',
+            ],
+            index=[10, 11, 12],
+        )
+        attributes = self.cleaner.parse_attributes_series(specifications)
+        self.assertEqual(
+            attributes.tolist(), ['{"value1": "value2"}', None, '{"value1": "value2"}']
+        )
+        self.assertEqual(attributes.index.tolist(), [10, 11, 12])
+
     @patch("src.datapreprocessing.datacleaner.DataPreprocessor.download_image")
     def test_get_product_image(self, mock_download_image):
         """Test if product images are downloaded and URIs are updated."""
@@ -105,6 +246,264 @@ class TestDataCleaner(unittest.TestCase):
             mock_download_image.call_count, 2
         )  # 1 for url1, 1 for url2/url3
 
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.download_image")
+    def test_get_product_image_concurrent(self, mock_download_image):
+        """Test if concurrent downloads keep the row order and the first working URL."""
+        mock_download_image.side_effect = lambda *args, **kwargs: args[0] in (
+            "url1",
+            "url3",
+        )
+
+        cleaner = DataPreprocessor(max_download_workers=4)
+        cleaned_df = cleaner.get_product_image(
+            self.df.copy(), 1, "test_bucket", "test_path"
+        )
+        self.assertEqual(
+            cleaned_df["image_uri"].tolist(),
+            [
+                "gs://test_bucket/test_path/1_0.jpg",
+                "gs://test_bucket/test_path/2_1.jpg",
+                None,
+            ],
+        )
+        self.assertEqual(mock_download_image.call_count, 3)
+
+    @patch("src.datapreprocessing.datacleaner.list_blob_names")
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.download_image")
+    def test_get_product_image_skips_existing(
+        self, mock_download_image, mock_list_blob_names
+    ):
+        """Test if images already present in GCS are reused without downloading."""
+        mock_list_blob_names.return_value = frozenset(["test_path/2_1.jpg"])
+        mock_download_image.return_value = True
+
+        cleaner = DataPreprocessor(skip_existing_images=True)
+        cleaned_df = cleaner.get_product_image(
+            self.df.copy(), 1, "test_bucket", "test_path"
+        )
+        self.assertEqual(
+            cleaned_df["image_uri"][1], "gs://test_bucket/test_path/2_1.jpg"
+        )
+        mock_list_blob_names.assert_called_once_with("test_bucket", "test_path/")
+        mock_download_image.assert_called_once()  # only url1 is downloaded
+
+    @patch("src.datapreprocessing.datacleaner.get_negative_cache")
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.fetch_image")
+    def test_get_product_image_negative_cache(
+        self, mock_fetch_image, mock_get_negative_cache
+    ):
+        """Test if known dead URLs are skipped and new failures are recorded."""
+        negative_cache = NegativeCache("test_bucket", "test_path_negative_cache/")
+        negative_cache.record("url2", "not_found")
+        mock_get_negative_cache.return_value = negative_cache
+        mock_fetch_image.side_effect = urllib.error.HTTPError(
+            "url", 504, "Gateway Timeout", {}, None
+        )
+
+        cleaner = DataPreprocessor(use_negative_cache=True)
+        with patch.object(negative_cache, "flush") as mock_flush:
+            cleaned_df = cleaner.get_product_image(
+                self.df.copy(), 1, "test_bucket", "test_path"
+            )
+
+        self.assertEqual(cleaned_df["image_uri"].tolist(), [None, None, None])
+        self.assertEqual(
+            [call.args[0] for call in mock_fetch_image.call_args_list], ["url1", "url3"]
+        )
+        self.assertEqual(negative_cache.lookup("url3"), "gateway_timeout")
+        mock_get_negative_cache.assert_called_once_with(
+            "test_bucket", "test_path_negative_cache/", None
+        )
+        mock_flush.assert_called_once()
+
+    def test_classify_download_error(self):
+        """Test if transient HTTP errors are told apart from permanent ones."""
+        for code, error_class in [
+            (404, "not_found"),
+            (403, "http_error"),
+            (429, "rate_limited"),
+            (500, "server_error"),
+            (503, "server_error"),
+            (504, "gateway_timeout"),
+        ]:
+            err = urllib.error.HTTPError("url", code, "Error", {}, None)
+            self.assertEqual(self.cleaner.classify_download_error(err), error_class)
+
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.upload_image")
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.fetch_image")
+    def test_get_product_image_hedged(self, mock_fetch_image, mock_upload_image):
+        """Test if hedged fetches keep the first good response and cancel the rest."""
+        url2_started = threading.Event()
+        url2_cancelled = threading.Event()
+
+        def fetch_image_side_effect(image_url, cancel_event=None):
+            if image_url == "url2":  # slow host, only answers once cancelled
+                url2_started.set()
+                if cancel_event.wait(5):
+                    url2_cancelled.set()
+                raise ImageFetchCancelled(image_url)
+            if image_url == "url3":  # the hedge, sent while url2 is in flight
+                url2_started.wait(5)
+            return io.BytesIO(image_url.encode())
+
+        mock_fetch_image.side_effect = fetch_image_side_effect
+        cleaner = DataPreprocessor(hedged_fetch_urls=2, hedge_delay=0.01)
+        cleaned_df = cleaner.get_product_image(
+            self.df.copy(), 1, "test_bucket", "test_path"
+        )
+
+        self.assertEqual(
+            cleaned_df["image_uri"].tolist()[:2],
+            [
+                "gs://test_bucket/test_path/1_0.jpg",
+                "gs://test_bucket/test_path/2_1.jpg",
+            ],
+        )
+        self.assertEqual(
+            mock_upload_image.call_args.args[1:], ("test_path/2_1.jpg", "test_bucket")
+        )
+        self.assertTrue(url2_cancelled.wait(5))
+
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.fetch_image")
+    def test_fetch_first_image_prefers_lower_index(self, mock_fetch_image):
+        """Test if failed candidates are skipped and the lowest successful index wins."""
+
+        def fetch_image_side_effect(image_url, cancel_event=None):
+            if image_url == "url1":
+                raise urllib.error.HTTPError(image_url, 404, "Not Found", {}, None)
+            return io.BytesIO(image_url.encode())
+
+        mock_fetch_image.side_effect = fetch_image_side_effect
+        cleaner = DataPreprocessor(hedged_fetch_urls=3, hedge_delay=1)
+        index, image_file = cleaner.fetch_first_image(["url1", " url2", "url3"], 1)
+        self.assertEqual(index, 1)
+        self.assertEqual(image_file.read(), b"url2")
+
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.upload_image")
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.fetch_image")
+    def test_get_product_image_hedged_corrupt_winner(
+        self, mock_fetch_image, mock_upload_image
+    ):
+        """Test if a corrupt race winner falls back to the candidates that did not fail in the race."""
+        fetched = []
+
+        def fetch_image_side_effect(image_url, cancel_event=None):
+            fetched.append(image_url)
+            if image_url == "url1":
+                raise urllib.error.HTTPError(image_url, 404, "Not Found", {}, None)
+            return io.BytesIO(b"not an image")
+
+        mock_fetch_image.side_effect = fetch_image_side_effect
+        cleaner = DataPreprocessor(
+            hedged_fetch_urls=2, hedge_delay=1, normalize_images=True
+        )
+        self.assertIsNone(
+            cleaner.get_single_product_image(
+                "1", '["url1", "url2", "url3"]', 1, "test_bucket", "test_path"
+            )
+        )
+        # url1 failed in the race and url2 won with a corrupt image, only url3 is left
+        self.assertEqual(sorted(fetched), ["url1", "url2", "url3"])
+        mock_upload_image.assert_not_called()
+
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.upload_image")
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.fetch_image")
+    def test_download_image_normalizes(self, mock_fetch_image, mock_upload_image):
+        """Test if images are resized before upload and corrupt images are flagged."""
+        image_file = io.BytesIO()
+        Image.new("RGB", (400, 200), "red").save(image_file, format="PNG")
+        original = image_file.getvalue()
+        image_file.seek(0)
+        mock_fetch_image.return_value = image_file
+        uploads = {}
+
+        def upload_image_side_effect(
+            image_file, name, bucket, if_generation_match=None
+        ):
+            image_file.seek(0)
+            uploads[name] = image_file.read()
+
+        mock_upload_image.side_effect = upload_image_side_effect
+        cleaner = DataPreprocessor(
+            normalize_images=True, max_image_edge=100, keep_original_images=True
+        )
+        self.assertTrue(
+            cleaner.download_image("url1", "1_0.jpg", "path/1_0.jpg", 1, "bucket")
+        )
+        self.assertEqual(set(uploads), {"path/1_0.jpg", "path/1_0_original.jpg"})
+        self.assertEqual(uploads["path/1_0_original.jpg"], original)
+        self.assertEqual(
+            Image.open(io.BytesIO(uploads["path/1_0.jpg"])).size, (100, 50)
+        )
+
+        negative_cache = NegativeCache("test_bucket", "prefix/")
+        mock_fetch_image.return_value = io.BytesIO(b"not an image")
+        self.assertFalse(
+            cleaner.download_image(
+                "url2", "2_0.jpg", "path/2_0.jpg", 1, "bucket", negative_cache
+            )
+        )
+        self.assertEqual(negative_cache.lookup("url2"), "corrupt_image")
+
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.upload_image")
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.fetch_image")
+    def test_get_product_image_dedup(self, mock_fetch_image, mock_upload_image):
+        """Test if products showing the same image share one canonical object."""
+        image_file = io.BytesIO()
+        Image.linear_gradient("L").convert("RGB").save(image_file, format="PNG")
+        # Product 1 and 2 show the same image, product 3 has none
+        mock_fetch_image.side_effect = lambda image_url: io.BytesIO(
+            image_file.getvalue()
+        )
+        mock_upload_image.side_effect = [None, PreconditionFailed("exists")]
+
+        cleaner = DataPreprocessor(dedup_images=True)
+        cleaned_df = cleaner.get_product_image(
+            self.df.copy(), 1, "test_bucket", "test_path"
+        )
+
+        digest = hashlib.sha256(image_file.getvalue()).hexdigest()
+        self.assertEqual(
+            cleaned_df["image_uri"].tolist(),
+            [f"gs://test_bucket/test_path/sha256-{digest}.jpg"] * 2 + [None],
+        )
+        self.assertEqual(cleaned_df["image_sha256"].tolist(), [digest, digest, None])
+        self.assertEqual(
+            [call.args[3] for call in mock_upload_image.call_args_list], [0, 0]
+        )
+
+    @patch("src.datapreprocessing.datacleaner.DataPreprocessor.upload_image")
+    def test_store_image_dedup_keys_on_content(self, mock_upload_image):
+        """Test if colour variants of an image get their own object, and each upload is checked on its own."""
+        stored = []
+
+        def upload_image_side_effect(image_file, name, bucket, if_generation_match):
+            if name.endswith("_original.jpg"):
+                raise PreconditionFailed("exists")
+            stored.append(name)
+
+        mock_upload_image.side_effect = upload_image_side_effect
+        cleaner = DataPreprocessor(
+            normalize_images=True, keep_original_images=True, dedup_images=True
+        )
+        names = []
+        for colour in ("red", "blue", "red"):
+            image_file = io.BytesIO()
+            Image.new("RGB", (64, 64), colour).save(image_file, format="PNG")
+            image_file.seek(0)
+            names.append(cleaner.store_image(image_file, "path/1_0.jpg", "bucket"))
+
+        self.assertNotEqual(names[0], names[1])
+        self.assertEqual(names[0], names[2])
+        self.assertRegex(names[0], r"^path/sha256-[0-9a-f]{64}\.jpg$")
+        # The normalized images were uploaded although their originals existed
+        self.assertEqual(stored, names)
+
+    def test_skip_existing_images_excludes_dedup(self):
+        """Test if skipping existing images cannot be combined with deduplication."""
+        with self.assertRaises(ValueError):
+            DataPreprocessor(skip_existing_images=True, dedup_images=True)
+
     def test_reformat(self):
         """Test if the reformat method cleans the text correctly."""
         text = '[ "Test" ]'
@@ -116,6 +515,26 @@ class TestDataCleaner(unittest.TestCase):
         cleaned_df = self.cleaner.prep_cat(self.df.copy())
         self.assertEqual(cleaned_df["c0_name"][0], "Category A")
         self.assertEqual(cleaned_df["c1_name"][0], "Category B")
+        self.assertIsNone(cleaned_df["c1_name"][1])
+        self.assertEqual(cleaned_df["c0_name"][2], "")
+        self.assertNotIn("product_category_tree", cleaned_df.columns)
+
+    def test_prep_cat_max_depth(self):
+        """Test if a maximum depth gives the same category columns for every chunk."""
+        df = self.df.copy()
+        df.loc[1, "product_category_tree"] = '["A >> B >> C"]'
+        cleaned_df = self.cleaner.prep_cat(df, max_depth=2)
+        self.assertEqual(
+            [col for col in cleaned_df.columns if col.endswith("_name")],
+            ["c0_name", "c1_name"],
+        )
+        self.assertEqual(cleaned_df["c1_name"].tolist(), ["Category B", "B", None])
+
+        cleaner = DataPreprocessor(max_category_depth=4)
+        cleaned_df = cleaner.prep_cat(self.df.copy().iloc[:0])
+        self.assertEqual(
+            list(cleaned_df.columns[-4:]), ["c0_name", "c1_name", "c2_name", "c3_name"]
+        )
 
     @patch.object(
         src.datapreprocessing.datacleaner.DataPreprocessor, "get_product_image"
@@ -135,6 +554,71 @@ class TestDataCleaner(unittest.TestCase):
             self.df.copy(), 1, "test_bucket", "test_path"
         )
         self.assertEqual(len(cleaned_df), 3)
+        chunk_metrics = cleaned_df.attrs["metrics"]
+        self.assertEqual(
+            list(chunk_metrics["stage_seconds"]),
+            ["images", "descriptions", "attributes", "categories"],
+        )
+        self.assertEqual(chunk_metrics["counters"], {"rows_in": 3, "rows_out": 3})
+
+    @patch.object(
+        src.datapreprocessing.datacleaner.DataPreprocessor, "process_downloaded_batch"
+    )
+    @patch.object(
+        src.datapreprocessing.datacleaner.DataPreprocessor, "get_product_image"
+    )
+    def test_process_batches_prefetches_images(
+        self, mock_get_product_image, mock_process_downloaded_batch
+    ):
+        """Test if the images of the next batch download while the current batch is processed."""
+        second_batch_downloaded = threading.Event()
+        overlapped = []
+
+        def get_product_image_side_effect(batch, *args):
+            if batch["uniq_id"].iloc[0] == 2:
+                second_batch_downloaded.set()
+            return batch
+
+        def process_downloaded_batch_side_effect(batch):
+            if batch["uniq_id"].iloc[0] == 1:
+                overlapped.append(second_batch_downloaded.wait(5))
+            return batch
+
+        mock_get_product_image.side_effect = get_product_image_side_effect
+        mock_process_downloaded_batch.side_effect = process_downloaded_batch_side_effect
+        batches = [self.df.iloc[i : i + 1] for i in range(3)]
+        results = list(
+            self.cleaner.process_batches(iter(batches), 1, "test_bucket", "test_path")
+        )
+
+        self.assertEqual(overlapped, [True])
+        self.assertEqual([len(batch) for batch in results], [1, 1, 1])
+        self.assertEqual(mock_get_product_image.call_count, 3)
+
+    @patch.object(
+        src.datapreprocessing.datacleaner.DataPreprocessor, "prep_product_desc"
+    )
+    @patch.object(
+        src.datapreprocessing.datacleaner.DataPreprocessor, "get_product_image"
+    )
+    def test_process_data_streams_batches(
+        self, mock_get_product_image, mock_prep_product_desc
+    ):
+        """Test if process_data in batches gives the rows of the whole chunk in order."""
+        mock_get_product_image.side_effect = lambda batch, *args: batch.assign(
+            image_uri=None
+        )
+        mock_prep_product_desc.side_effect = lambda batch: batch
+        cleaner = DataPreprocessor(stream_batch_size=2, max_category_depth=2)
+        cleaned_df = cleaner.process_data(self.df.copy(), 1, "test_bucket", "test_path")
+
+        self.assertEqual(mock_get_product_image.call_count, 2)
+        self.assertEqual(cleaned_df["uniq_id"].tolist(), [1, 2, 3])
+        self.assertEqual(cleaned_df.index.tolist(), [0, 1, 2])
+        self.assertEqual(cleaned_df["c1_name"].tolist(), ["Category B", None, None])
+        self.assertEqual(
+            cleaned_df.attrs["metrics"]["counters"], {"rows_in": 3, "rows_out": 3}
+        )
 
 
 if __name__ == "__main__":
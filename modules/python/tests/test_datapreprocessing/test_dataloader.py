@@ -13,15 +13,28 @@
 # limitations under the License.
 
 import csv
+import io
 import os
+import shutil
 import sys
+import tempfile
 import unittest
 from unittest.mock import patch
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.fs
+import pyarrow.parquet as pq
 from pandas.testing import assert_frame_equal
 from src.datapreprocessing.dataloader import DataLoader
 
+# The real readers, kept before the tests patch them
+READ_CSV = pd.read_csv
+DATASET = ds.dataset
+
 
 class TestDataLoader(unittest.TestCase):
     @patch("src.datapreprocessing.dataloader.pd.read_csv")
@@ -32,6 +45,165 @@ class TestDataLoader(unittest.TestCase):
         read_csv_mock.assert_called_with("gs://fake_bucket/fake_path")
         assert_frame_equal(df, read_csv_mock.return_value)
 
+    def read_local_csv(self, csv_text):
+        """Returns a pd.read_csv replacement reading csv_text instead of GCS."""
+        return lambda path, **kwargs: READ_CSV(io.StringIO(csv_text), **kwargs)
+
+    @patch("src.datapreprocessing.dataloader.pd.read_csv")
+    def test_load_raw_data_options(self, read_csv_mock):
+        """Test if projection, dtypes, engine and dtype backend reach the parser."""
+        read_csv_mock.side_effect = self.read_local_csv(
+            "uniq_id,image,unused\na,url1,1\nb,,2\n"
+        )
+        dataloader = DataLoader(
+            "fake_bucket",
+            "fake_path",
+            usecols=["uniq_id", "image"],
+            engine="pyarrow",
+            dtype_backend="pyarrow",
+        )
+        df = dataloader.load_raw_data()
+        read_csv_mock.assert_called_with(
+            "gs://fake_bucket/fake_path",
+            usecols=["uniq_id", "image"],
+            engine="pyarrow",
+            dtype_backend="pyarrow",
+        )
+        self.assertEqual(list(df.columns), ["uniq_id", "image"])
+        self.assertEqual(str(df["image"].dtype), "string[pyarrow]")
+        self.assertTrue(pd.isnull(df["image"][1]))
+
+    @patch("src.datapreprocessing.dataloader.pd.read_csv")
+    def test_iter_raw_data(self, read_csv_mock):
+        """Test if the file is read in chunks of rows."""
+        read_csv_mock.side_effect = self.read_local_csv("col1\n1\n2\n3\n")
+        chunks = DataLoader("fake_bucket", "fake_path").iter_raw_data(chunksize=2)
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+
+        dataloader = DataLoader("fake_bucket", "fake_path", engine="pyarrow")
+        with self.assertRaises(ValueError):
+            dataloader.iter_raw_data(chunksize=2)
+
+    def write_catalog(self, directory):
+        """Writes a small catalog as Parquet, with one row group per row, and as Arrow IPC."""
+        table = pa.table(
+            {
+                "uniq_id": ["a", "b", "c"],
+                "image": ["url1", None, "url3"],
+                "product_category_tree": ['["Clothing >> Men', '["Clothing', '["Home'],
+            }
+        )
+        pq.write_table(
+            table, os.path.join(directory, "catalog.parquet"), row_group_size=1
+        )
+        feather.write_feather(table, os.path.join(directory, "catalog.arrow"))
+
+    def local_dataset(self, directory):
+        """Returns a pyarrow.dataset.dataset replacement reading from directory instead of GCS."""
+        return lambda path, **kwargs: DATASET(
+            os.path.join(directory, os.path.basename(path)), **kwargs
+        )
+
+    @patch("pyarrow.dataset.dataset")
+    def test_load_raw_data_parquet(self, dataset_mock):
+        """Test if Parquet and Arrow IPC files are read with projection and filters."""
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_catalog(directory)
+            dataset_mock.side_effect = self.local_dataset(directory)
+
+            dataloader = DataLoader(
+                "fake_bucket",
+                "catalog.parquet",
+                usecols=["uniq_id"],
+                filters=[("image", "!=", "")],
+            )
+            df = dataloader.load_raw_data()
+            dataset_mock.assert_called_with(
+                "gs://fake_bucket/catalog.parquet", format="parquet"
+            )
+            assert_frame_equal(df, pd.DataFrame({"uniq_id": ["a", "c"]}))
+
+            dataloader = DataLoader(
+                "fake_bucket",
+                "catalog.arrow",
+                filters=pc.starts_with(ds.field("product_category_tree"), '["Clothing'),
+                dtype_backend="pyarrow",
+            )
+            df = dataloader.load_raw_data()
+            self.assertEqual(df["uniq_id"].tolist(), ["a", "b"])
+            self.assertEqual(str(df["uniq_id"].dtype), "string[pyarrow]")
+
+    def test_filters_require_dataset_format(self):
+        """Test if filters are rejected for CSV files instead of being ignored."""
+        with self.assertRaises(ValueError):
+            DataLoader("fake_bucket", "catalog.csv", filters=[("image", "!=", "")])
+        with self.assertRaises(ValueError):
+            DataLoader(
+                "fake_bucket",
+                "catalog.parquet",
+                file_format="csv",
+                filters=[("image", "!=", "")],
+            )
+
+    @patch("pyarrow.dataset.dataset")
+    def test_iter_raw_data_parquet(self, dataset_mock):
+        """Test if Parquet files are streamed in batches."""
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_catalog(directory)
+            dataset_mock.side_effect = self.local_dataset(directory)
+            chunks = DataLoader("fake_bucket", "catalog.parquet").iter_raw_data(2)
+            self.assertEqual(
+                [chunk["uniq_id"].tolist() for chunk in chunks], [["a"], ["b"], ["c"]]
+            )
+
+    @patch("src.datapreprocessing.dataloader.get_bucket")
+    def test_read_through_cache(self, get_bucket_mock):
+        """Test if a file is downloaded once per generation and then read from disk."""
+        blob = get_bucket_mock.return_value.get_blob.return_value
+        blob.generation = 1
+
+        def download_to_filename(path):
+            with open(path, "w") as f:
+                f.write(f"col1\n{blob.generation}\n")
+
+        blob.download_to_filename.side_effect = download_to_filename
+        with tempfile.TemporaryDirectory() as cache_dir:
+            dataloader = DataLoader("fake_bucket", "raw/data.csv", cache_dir=cache_dir)
+            self.assertEqual(dataloader.load_raw_data()["col1"].tolist(), [1])
+            self.assertEqual(dataloader.load_raw_data()["col1"].tolist(), [1])
+            self.assertEqual(blob.download_to_filename.call_count, 1)
+            get_bucket_mock.return_value.get_blob.assert_called_with("raw/data.csv")
+
+            blob.generation = 2
+            self.assertEqual(dataloader.load_raw_data()["col1"].tolist(), [2])
+            self.assertEqual(blob.download_to_filename.call_count, 2)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    @patch("src.datapreprocessing.dataloader.get_bucket")
+    @patch("pyarrow.dataset.dataset")
+    def test_read_through_cache_memory_maps(self, dataset_mock, get_bucket_mock):
+        """Test if cached Parquet files are opened from disk with memory mapping."""
+        with tempfile.TemporaryDirectory() as directory:
+            self.write_catalog(directory)
+            blob = get_bucket_mock.return_value.get_blob.return_value
+            blob.generation = 7
+            blob.download_to_filename.side_effect = lambda path: shutil.copy(
+                os.path.join(directory, "catalog.parquet"), path
+            )
+            dataset_mock.side_effect = DATASET
+            cache_dir = os.path.join(directory, "cache")
+            df = DataLoader(
+                "fake_bucket", "catalog.parquet", cache_dir=cache_dir
+            ).load_raw_data()
+
+            self.assertEqual(df["uniq_id"].tolist(), ["a", "b", "c"])
+            path = dataset_mock.call_args.args[0]
+            self.assertTrue(path.startswith(cache_dir) and path.endswith("-7.parquet"))
+            self.assertEqual(
+                dataset_mock.call_args.kwargs["filesystem"],
+                pyarrow.fs.LocalFileSystem(use_mmap=True),
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -16,6 +16,7 @@ import os
 import sys
 import unittest
 
+import numpy as np
 import pandas as pd
 from src.datapreprocessing.dataprep import DataPrep
 
@@ -83,6 +84,77 @@ class TestDataPrep(unittest.TestCase):
         self.assertEqual(len(chunks[1]), 2)
         self.assertEqual(len(chunks[2]), 1)
 
+    def test_split_dataframe_without_empty_chunks(self):
+        """Test that a DataFrame that divides evenly into chunks has no empty trailing chunk."""
+        data_prep = DataPrep(self.df.iloc[:4], [], [], chunk_size=2)
+        chunks = data_prep.split_dataframe()
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 2])
+        self.assertEqual(DataPrep(self.df.iloc[:0], [], []).split_dataframe(), [])
+
+    def test_split_dataframe_contiguous(self):
+        """Test that contiguous partitioning balances estimated costs with views that keep the row order."""
+        df = pd.DataFrame(
+            {
+                "uniq_id": range(8),
+                "image": ['["a", "b", "c", "d", "e", "f", "g"]'] + ['["a"]'] * 7,
+                "description": ["x" * 10] * 8,
+                "price": np.arange(8, dtype=float),
+            }
+        )
+        data_prep = DataPrep(
+            df, [], [], chunk_size=4, partitioning="contiguous", num_partitions=2
+        )
+        chunks = data_prep.split_dataframe()
+        # The first row has 7 URLs, it costs about as much as the next 4 rows
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 6])
+        self.assertEqual(pd.concat(chunks)["uniq_id"].tolist(), df["uniq_id"].tolist())
+        self.assertTrue(
+            np.shares_memory(chunks[1]["price"].to_numpy(), df["price"].to_numpy())
+        )
+
+    def test_split_dataframe_lpt(self):
+        """Test that LPT partitioning balances estimated costs and never returns empty chunks."""
+        df = pd.DataFrame(
+            {
+                "uniq_id": range(6),
+                "image": [
+                    '["a", "b", "c"]',
+                    '["a", "b", "c"]',
+                    '["a"]',
+                    '["a"]',
+                    '["a"]',
+                    '["a"]',
+                ],
+            }
+        )
+        data_prep = DataPrep(df, [], [], partitioning="lpt", num_partitions=2)
+        chunks = data_prep.split_dataframe()
+        costs = data_prep.estimate_row_costs()
+        loads = [costs[chunk.index].sum() for chunk in chunks]
+        self.assertEqual(loads[0], loads[1])
+        self.assertEqual(sorted(pd.concat(chunks)["uniq_id"]), list(range(6)))
+        for chunk in chunks:
+            self.assertTrue(chunk["uniq_id"].is_monotonic_increasing)
+
+        # More chunks than rows are never requested
+        data_prep = DataPrep(df, [], [], partitioning="lpt", num_partitions=10)
+        chunks = data_prep.split_dataframe()
+        self.assertEqual([len(chunk) for chunk in chunks], [1] * 6)
+
+    def test_get_num_partitions(self):
+        """Test that the number of chunks is derived from the number of workers."""
+        df = pd.DataFrame({"uniq_id": range(1000)})
+        self.assertEqual(DataPrep(df, [], [], chunk_size=100).get_num_partitions(), 10)
+        data_prep = DataPrep(df, [], [], chunk_size=100, num_workers=4)
+        self.assertEqual(data_prep.get_num_partitions(), 16)
+        # Chunks of at most chunk_size rows on average, in whole waves of workers
+        data_prep = DataPrep(df, [], [], chunk_size=10, num_workers=8)
+        self.assertEqual(data_prep.get_num_partitions(), 104)
+        data_prep = DataPrep(df, [], [], num_partitions=3, num_workers=8)
+        self.assertEqual(data_prep.get_num_partitions(), 3)
+        data_prep = DataPrep(df.iloc[:20], [], [], num_workers=8)
+        self.assertEqual(data_prep.get_num_partitions(), 20)
+
     def test_update_dataframe(self):
         """Test if the DataFrame is updated correctly by dropping rows with null values."""
         required_cols = [
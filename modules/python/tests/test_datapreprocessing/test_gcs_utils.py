@@ -0,0 +1,89 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pickle
+import unittest
+from unittest.mock import Mock, patch
+
+import src.datapreprocessing.gcs_utils as gcs_utils
+from src.datapreprocessing.datacleaner import DataPreprocessor
+
+
+class TestGcsUtils(unittest.TestCase):
+    def setUp(self):
+        gcs_utils._clients.clear()
+        gcs_utils._buckets.clear()
+        gcs_utils._listings.clear()
+        gcs_utils._instances.clear()
+
+    def tearDown(self):
+        gcs_utils._clients.clear()
+        gcs_utils._buckets.clear()
+        gcs_utils._listings.clear()
+        gcs_utils._instances.clear()
+
+    @patch("src.datapreprocessing.gcs_utils.storage.Client")
+    @patch("src.datapreprocessing.gcs_utils.google.auth.default")
+    def test_client_and_bucket_are_cached(self, mock_auth_default, mock_client):
+        """Test if the client and bucket handles are created once per process."""
+        mock_auth_default.return_value = (Mock(), "test_project")
+
+        bucket = gcs_utils.get_bucket("test_bucket")
+        self.assertIs(gcs_utils.get_bucket("test_bucket"), bucket)
+        self.assertIs(gcs_utils.get_storage_client(), mock_client.return_value)
+
+        mock_auth_default.assert_called_once_with(scopes=mock_client.SCOPE)
+        mock_client.assert_called_once()
+        mock_client.return_value.bucket.assert_called_once_with("test_bucket")
+
+    @patch("src.datapreprocessing.gcs_utils.storage.Client")
+    @patch("src.datapreprocessing.gcs_utils.google.auth.default")
+    def test_list_blob_names_is_cached(self, mock_auth_default, mock_client):
+        """Test if a prefix is listed once per process unless refreshed."""
+        mock_auth_default.return_value = (Mock(), "test_project")
+        mock_bucket = mock_client.return_value.bucket.return_value
+        mock_bucket.list_blobs.return_value = [Mock(), Mock()]
+        mock_bucket.list_blobs.return_value[0].name = "images/1_0.jpg"
+        mock_bucket.list_blobs.return_value[1].name = "images/2_0.jpg"
+
+        names = gcs_utils.list_blob_names("test_bucket", "images/")
+        self.assertEqual(names, {"images/1_0.jpg", "images/2_0.jpg"})
+        gcs_utils.list_blob_names("test_bucket", "images/")
+        self.assertEqual(mock_bucket.list_blobs.call_count, 1)
+        gcs_utils.list_blob_names("test_bucket", "images/", refresh=True)
+        self.assertEqual(mock_bucket.list_blobs.call_count, 2)
+
+    def test_per_process(self):
+        """Test if per_process creates one object per key and process."""
+        factory = Mock(side_effect=lambda: object())
+        instance = gcs_utils.per_process(("test", 1), factory)
+        self.assertIs(gcs_utils.per_process(("test", 1), factory), instance)
+        self.assertIsNot(gcs_utils.per_process(("test", 2), factory), instance)
+        self.assertEqual(factory.call_count, 2)
+        with patch("src.datapreprocessing.gcs_utils.os.getpid", return_value=-1):
+            self.assertIsNot(gcs_utils.per_process(("test", 1), factory), instance)
+
+    @patch("src.datapreprocessing.gcs_utils.storage.Client")
+    @patch("src.datapreprocessing.gcs_utils.google.auth.default")
+    def test_preprocessor_pickles_without_client(self, mock_auth_default, mock_client):
+        """Test if a preprocessor stays picklable once the cache is populated."""
+        mock_auth_default.return_value = (Mock(), "test_project")
+        gcs_utils.get_bucket("test_bucket")
+
+        preprocessor = pickle.loads(pickle.dumps(DataPreprocessor()))
+        self.assertIsInstance(preprocessor, DataPreprocessor)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import unittest
+import urllib.error
+from unittest.mock import Mock, patch
+
+import requests
+import src.datapreprocessing.gcs_utils as gcs_utils
+import src.datapreprocessing.http_fetcher as http_fetcher
+from src.datapreprocessing.http_fetcher import HttpFetcher, TokenBucket
+
+
+class TestHttpFetcher(unittest.TestCase):
+    def mock_response(self, status_code, headers=None):
+        """Creates a mocked requests response."""
+        response = Mock(status_code=status_code, reason="reason", headers=headers or {})
+        response.__enter__ = Mock(return_value=response)
+        response.__exit__ = Mock(return_value=False)
+        return response
+
+    def test_token_bucket_limits_rate(self):
+        """Test if the token bucket allows a burst and then throttles to its rate."""
+        bucket = TokenBucket(rate=50, capacity=2)
+        start = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - start, 0.03)
+
+    @patch("src.datapreprocessing.http_fetcher.time.sleep")
+    @patch("src.datapreprocessing.http_fetcher.requests.Session.get")
+    def test_retry_after_is_honored(self, mock_get, mock_sleep):
+        """Test if a throttled request is retried after its Retry-After delay."""
+        ok = self.mock_response(200)
+        mock_get.side_effect = [
+            self.mock_response(429, {"Retry-After": "3"}),
+            ok,
+        ]
+        fetcher = HttpFetcher(timeout=(1.0, 2.0))
+        with fetcher.open("https://example.com/a.jpg") as response:
+            self.assertIs(response, ok)
+        self.assertEqual(mock_get.call_count, 2)
+        mock_get.assert_called_with(
+            "https://example.com/a.jpg", stream=True, timeout=(1.0, 2.0)
+        )
+        self.assertAlmostEqual(mock_sleep.call_args.args[0], 3, delta=0.5)
+
+    @patch("src.datapreprocessing.http_fetcher.requests.Session.get")
+    def test_errors_match_urllib(self, mock_get):
+        """Test if failures are raised as the exceptions urllib raises."""
+        fetcher = HttpFetcher()
+        mock_get.return_value = self.mock_response(404)
+        with self.assertRaises(urllib.error.HTTPError) as context:
+            with fetcher.open("https://example.com/a.jpg"):
+                pass
+        self.assertEqual(context.exception.code, 404)
+
+        mock_get.side_effect = requests.exceptions.ReadTimeout("read timed out")
+        with self.assertRaises(TimeoutError):
+            with fetcher.open("https://example.com/a.jpg"):
+                pass
+
+        mock_get.side_effect = requests.exceptions.ConnectionError("refused")
+        with self.assertRaises(urllib.error.URLError):
+            with fetcher.open("https://example.com/a.jpg"):
+                pass
+
+    def test_fetcher_is_cached_per_process(self):
+        """Test if the same settings share one fetcher per process."""
+        gcs_utils._instances.clear()
+        fetcher = http_fetcher.get_http_fetcher(max_connections_per_host=2)
+        self.assertIs(
+            http_fetcher.get_http_fetcher(max_connections_per_host=2), fetcher
+        )
+        self.assertIsNot(
+            http_fetcher.get_http_fetcher(max_connections_per_host=3), fetcher
+        )
+        gcs_utils._instances.clear()
+
+
+if __name__ == "__main__":
+    unittest.main()
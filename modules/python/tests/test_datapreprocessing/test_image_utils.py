@@ -0,0 +1,66 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import unittest
+
+from PIL import Image
+from src.datapreprocessing.image_utils import (
+    CorruptImageError,
+    encode_jpeg,
+    open_image,
+)
+
+
+class TestImageUtils(unittest.TestCase):
+    def image_file(self, size, image_format="JPEG", mode="RGB"):
+        """Creates an in-memory image file."""
+        image_file = io.BytesIO()
+        Image.new(mode, size).save(image_file, format=image_format)
+        image_file.seek(0)
+        return image_file
+
+    def normalize_image(self, image_file, max_edge):
+        """Decodes an image and re-encodes it as JPEG like DataPreprocessor.store_image."""
+        image = open_image(image_file, draft_size=(max_edge, max_edge))
+        return encode_jpeg(image, max_edge)
+
+    def test_normalize_image_resizes_to_max_edge(self):
+        """Test if large images are shrunk to the maximum edge, keeping their aspect ratio."""
+        normalized = self.normalize_image(self.image_file((2000, 1000)), max_edge=500)
+        image = Image.open(normalized)
+        self.assertEqual(image.format, "JPEG")
+        self.assertEqual(image.size, (500, 250))
+
+    def test_normalize_image_keeps_small_images(self):
+        """Test if small images are re-encoded as RGB JPEG without upscaling."""
+        normalized = self.normalize_image(
+            self.image_file((64, 32), "PNG", "RGBA"), max_edge=500
+        )
+        image = Image.open(normalized)
+        self.assertEqual(
+            (image.format, image.mode, image.size), ("JPEG", "RGB", (64, 32))
+        )
+
+    def test_normalize_image_rejects_corrupt_images(self):
+        """Test if undecodable and truncated images raise CorruptImageError."""
+        with self.assertRaises(CorruptImageError):
+            self.normalize_image(io.BytesIO(b"<html>Not found</html>"), max_edge=500)
+        truncated = io.BytesIO(self.image_file((256, 256), "PNG").getvalue()[:100])
+        with self.assertRaises(CorruptImageError):
+            self.normalize_image(truncated, max_edge=500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import tempfile
+import unittest
+
+from src.datapreprocessing.memo_cache import MemoCache
+
+
+class TestMemoCache(unittest.TestCase):
+    def test_lru_is_bounded(self):
+        """Test if the least recently used entries are evicted first."""
+        cache = MemoCache("test", max_entries=2)
+        cache.put_many([("a", "1"), ("b", "2")])
+        cache.get_many(["a"])
+        cache.put_many([("c", "3")])
+        self.assertEqual(cache.get_many(["a", "b", "c"]), {"a": "1", "c": "3"})
+
+    def test_keys_depend_on_namespace(self):
+        """Test if the same text gets different keys in different namespaces."""
+        self.assertEqual(MemoCache("a").key("text"), MemoCache("a").key("text"))
+        self.assertNotEqual(MemoCache("a").key("text"), MemoCache("b").key("text"))
+
+    def test_sqlite_store_persists(self):
+        """Test if values survive in the SQLite store across cache instances."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            db_path = os.path.join(cache_dir, "memo", "descriptions.db")
+            cache = MemoCache("test", max_entries=1, db_path=db_path)
+            cache.put_many([("a", "1"), ("b", "2")])
+            self.assertEqual(cache.get_many(["a", "b"]), {"a": "1", "b": "2"})
+
+            cache = MemoCache("test", db_path=db_path)
+            self.assertEqual(cache.get_many(["a", "c"]), {"a": "1"})
+
+
+if __name__ == "__main__":
+    unittest.main()
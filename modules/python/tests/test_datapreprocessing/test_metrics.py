@@ -0,0 +1,61 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextvars
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+from src.datapreprocessing import metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_count_records_into_current_chunk(self):
+        """Test if counts reach the recording chunk, also from threads running in a copied context."""
+        metrics.count("ignored")  # No chunk is being recorded
+        chunk_metrics = metrics.ChunkMetrics()
+        with metrics.recording(chunk_metrics):
+            metrics.count("rows_in", 3)
+            with metrics.stage("images"):
+                with ThreadPoolExecutor(max_workers=2) as executor:
+                    for _ in range(4):
+                        executor.submit(
+                            contextvars.copy_context().run, metrics.count, "images"
+                        )
+        metrics.count("ignored")
+
+        result = chunk_metrics.to_dict()
+        self.assertEqual(result["counters"], {"rows_in": 3, "images": 4})
+        self.assertEqual(list(result["stage_seconds"]), ["images"])
+
+    def test_summarize_metrics(self):
+        """Test if chunk metrics are aggregated into totals and percentiles."""
+        summary = metrics.summarize_metrics(
+            [
+                {"stage_seconds": {"images": float(i)}, "counters": {"rows_in": 10}}
+                for i in range(1, 101)
+            ]
+            + [{"stage_seconds": {}, "counters": {"download_errors.timeout": 2}}]
+        )
+        self.assertEqual(summary["chunks"], 101)
+        self.assertEqual(
+            summary["counters"], {"rows_in": 1000, "download_errors.timeout": 2}
+        )
+        images = summary["stage_seconds"]["images"]
+        self.assertEqual(images["total"], 5050.0)
+        self.assertAlmostEqual(images["p50"], 50.5)
+        self.assertAlmostEqual(images["p99"], 99.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
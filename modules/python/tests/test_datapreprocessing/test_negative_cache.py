@@ -0,0 +1,125 @@
+# Copyright 2025 Google LLC
+
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+
+# https://www.apache.org/licenses/LICENSE-2.0
+
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import time
+import unittest
+from unittest.mock import Mock, patch
+
+import src.datapreprocessing.gcs_utils as gcs_utils
+from src.datapreprocessing.negative_cache import NegativeCache, get_negative_cache
+
+
+class TestNegativeCache(unittest.TestCase):
+    def test_lookup_honors_ttl_per_error_class(self):
+        """Test if failures are remembered for the TTL of their error class."""
+        cache = NegativeCache("bucket", "images_negative_cache/", {"not_found": 60})
+        cache.record("url1", "not_found")
+        cache.record("url2", "timeout")  # no TTL configured
+        self.assertEqual(cache.lookup("url1"), "not_found")
+        self.assertIsNone(cache.lookup("url2"))
+        self.assertIsNone(cache.lookup("url3"))
+        self.assertEqual(cache.counts(), {"not_found": 1})
+
+    @patch("src.datapreprocessing.negative_cache.get_bucket")
+    def test_load_merges_shards(self, mock_get_bucket):
+        """Test if loading keeps the most recent failure of each URL and compacts the shards."""
+        now = time.time()
+        shards = [
+            {"url1": ["timeout", now - 10], "url2": ["not_found", now]},
+            {"url1": ["not_found", now]},
+        ]
+        blobs = []
+        for shard in shards:
+            blob = Mock()
+            blob.download_as_bytes.return_value = json.dumps(shard).encode()
+            blobs.append(blob)
+        mock_get_bucket.return_value.list_blobs.return_value = blobs
+
+        cache = NegativeCache("bucket", "images_negative_cache/")
+        cache.load()
+        self.assertEqual(cache.counts(), {"not_found": 2})
+        mock_get_bucket.return_value.list_blobs.assert_called_with(
+            prefix="images_negative_cache/"
+        )
+        # The two shards are replaced by one holding the merged failures
+        mock_blob = mock_get_bucket.return_value.blob.return_value
+        compacted = json.loads(mock_blob.upload_from_string.call_args.args[0])
+        self.assertEqual(
+            {url: entry[0] for url, entry in compacted.items()},
+            {"url1": "not_found", "url2": "not_found"},
+        )
+        self.assertEqual(
+            mock_get_bucket.return_value.delete_blobs.call_args.args[0], blobs
+        )
+
+    @patch("src.datapreprocessing.negative_cache.get_bucket")
+    def test_load_prunes_expired_failures(self, mock_get_bucket):
+        """Test if failures past their TTL are dropped, and a single live shard is left alone."""
+        now = time.time()
+        blob = Mock()
+        blob.download_as_bytes.return_value = json.dumps(
+            {"url1": ["timeout", now - 120], "url2": ["timeout", now]}
+        ).encode()
+        mock_get_bucket.return_value.list_blobs.return_value = [blob]
+        mock_blob = mock_get_bucket.return_value.blob.return_value
+
+        cache = NegativeCache("bucket", "images_negative_cache/", {"timeout": 60})
+        cache.load()
+        self.assertIsNone(cache.lookup("url1"))
+        self.assertEqual(cache.lookup("url2"), "timeout")
+        compacted = json.loads(mock_blob.upload_from_string.call_args.args[0])
+        self.assertEqual(list(compacted), ["url2"])
+        mock_get_bucket.return_value.delete_blobs.assert_called_once()
+
+        mock_blob.reset_mock()
+        mock_get_bucket.return_value.delete_blobs.reset_mock()
+        NegativeCache("bucket", "images_negative_cache/", {"timeout": 3600}).load()
+        mock_blob.upload_from_string.assert_not_called()
+        mock_get_bucket.return_value.delete_blobs.assert_not_called()
+
+    @patch("src.datapreprocessing.negative_cache.get_bucket")
+    def test_get_negative_cache_is_keyed_by_ttls(self, mock_get_bucket):
+        """Test if caches with different TTLs are not shared."""
+        mock_get_bucket.return_value.list_blobs.return_value = []
+        gcs_utils._instances.clear()
+        cache = get_negative_cache("bucket", "prefix/", {"timeout": 60})
+        self.assertIs(get_negative_cache("bucket", "prefix/", {"timeout": 60}), cache)
+        self.assertIsNot(get_negative_cache("bucket", "prefix/", {"timeout": 1}), cache)
+        self.assertIsNot(get_negative_cache("bucket", "prefix/"), cache)
+        gcs_utils._instances.clear()
+
+    @patch("src.datapreprocessing.negative_cache.get_bucket")
+    def test_flush_writes_new_failures_once(self, mock_get_bucket):
+        """Test if a flush writes only the failures recorded since the previous flush."""
+        mock_blob = mock_get_bucket.return_value.blob.return_value
+        cache = NegativeCache("bucket", "images_negative_cache/")
+        cache.flush()
+        mock_blob.upload_from_string.assert_not_called()
+
+        cache.record("url1", "gateway_timeout")
+        cache.flush()
+        cache.flush()
+        mock_blob.upload_from_string.assert_called_once()
+        shard = json.loads(mock_blob.upload_from_string.call_args.args[0])
+        self.assertEqual(list(shard), ["url1"])
+        self.assertTrue(
+            mock_get_bucket.return_value.blob.call_args.args[0].startswith(
+                "images_negative_cache/"
+            )
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
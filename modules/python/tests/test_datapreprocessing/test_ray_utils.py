@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 import unittest
 from unittest.mock import Mock, patch
 
@@ -20,13 +21,35 @@ import ray
 import src.datapreprocessing.ray_utils
 
 
+class ScaleProcessor:
+    """A processing class for the local backends, importable by the worker processes."""
+
+    def __init__(self, factor, fail_once=()):
+        self.factor = factor
+        self.fail_once = set(fail_once)
+        self.pid = None
+
+    def setup(self):
+        self.pid = os.getpid()
+
+    def process_data(self, df, ray_worker_node_id, gcs_bucket, gcs_folder):
+        if ray_worker_node_id in self.fail_once:
+            self.fail_once.remove(ray_worker_node_id)
+            raise RuntimeError(f"chunk {ray_worker_node_id} failed")
+        result = df * self.factor
+        result["pid"] = self.pid
+        result.attrs["metrics"] = {"counters": {"rows_in": len(df)}}
+        return result
+
+
 class TestRayUtils(unittest.TestCase):
+    @patch.object(src.datapreprocessing.ray_utils.ray, "put")
     @patch.object(src.datapreprocessing.ray_utils.ray, "init")
     @patch("src.datapreprocessing.ray_utils.importlib.import_module")
     @patch.object(src.datapreprocessing.ray_utils.ray, "get")
     @patch.object(src.datapreprocessing.ray_utils.ray, "shutdown")
     def test_run_remote_local(
-        self, mock_shutdown, mock_ray_get, mock_import_module, mock_ray_init
+        self, mock_shutdown, mock_ray_get, mock_import_module, mock_ray_init, mock_put
     ):
         """Test run_remote() with local Ray cluster."""
         # Mock necessary objects and functions
@@ -35,24 +58,34 @@ class TestRayUtils(unittest.TestCase):
             pd.DataFrame({"test": [4]}),
             pd.DataFrame({"test": [5, 6]}),
         ]
+        for chunk_df in mock_ray_get.return_value:
+            chunk_df.attrs["metrics"] = {
+                "stage_seconds": {"images": 1.0},
+                "counters": {"rows_in": len(chunk_df)},
+            }
         mock_module = Mock()
         mock_class = mock_module.DataPreprocessor.return_value
         mock_class.process_data.return_value = mock_df
         mock_import_module.return_value = mock_module
-        # Initialize RayUtils
-        ray_utils = src.datapreprocessing.ray_utils.RayUtils(
-            ray_cluster_host="local",
-            ray_resources={"cpu": 1},
-            ray_runtime={"pip": ["pandas"]},
-            package_name="datapreprocessing",
-            module_name="datacleaner",
-            class_name="DataPreprocessor",
-            method_name="process_data",
-            df=[pd.DataFrame({"test": [1]}), pd.DataFrame({"test": [2, 3]})],
-            gcs_bucket="test_bucket",
-            gcs_folder="test_path",
-        )
-        with patch.object(ray_utils.invoke_process_data, "remote") as mock_remote:
+        # Initialize RayUtils, with the deprecated "cpu" key
+        with self.assertLogs(
+            src.datapreprocessing.ray_utils.RayUtils.logger, "WARNING"
+        ):
+            ray_utils = src.datapreprocessing.ray_utils.RayUtils(
+                ray_cluster_host="local",
+                ray_resources={"cpu": 1},
+                ray_runtime={"pip": ["pandas"]},
+                package_name="datapreprocessing",
+                module_name="datacleaner",
+                class_name="DataPreprocessor",
+                method_name="process_data",
+                df=[pd.DataFrame({"test": [1]}), pd.DataFrame({"test": [2, 3]})],
+                gcs_bucket="test_bucket",
+                gcs_folder="test_path",
+            )
+        mock_put.side_effect = lambda value: ("ref", id(value))
+        with patch.object(ray_utils.invoke_process_data, "options") as mock_options:
+            mock_remote = mock_options.return_value.remote
             mock_remote.return_value = mock_df  # Return a mock DataFrame
             result_df = ray_utils.run_remote()
 
@@ -65,4 +98,380 @@ class TestRayUtils(unittest.TestCase):
 
         mock_ray_get.assert_called()  # ray.get called
         mock_remote.assert_called()  # invoke_process_data.remote called
+        mock_options.assert_called_with(num_cpus=1)
+        # The preprocessor and each chunk are put in the object store once, tasks only get references
+        self.assertEqual(mock_put.call_count, 3)
+        self.assertIs(mock_put.call_args.args[0], mock_class)
+        for i, call in enumerate(mock_remote.call_args_list):
+            self.assertEqual(
+                call.args,
+                (
+                    ("ref", id(mock_class)),
+                    "process_data",
+                    ("ref", id(ray_utils.df[i])),
+                    i,
+                    "test_bucket",
+                    "test_path",
+                ),
+            )
         mock_shutdown.assert_called_once()  # Ray shutdown
+        self.assertEqual(ray_utils.run_summary["chunks"], 2)
+        self.assertEqual(ray_utils.run_summary["counters"], {"rows_in": 3})
+        self.assertEqual(result_df.attrs, {})
+
+    @patch.object(src.datapreprocessing.ray_utils.ray, "put", side_effect=lambda v: v)
+    @patch.object(src.datapreprocessing.ray_utils.ray, "init")
+    @patch("src.datapreprocessing.ray_utils.importlib.import_module")
+    @patch.object(src.datapreprocessing.ray_utils.ray, "shutdown")
+    def test_run_remote_streaming(
+        self, mock_shutdown, mock_import_module, mock_ray_init, mock_put
+    ):
+        """Test run_remote() with bounded tasks in flight, a result callback and a retried task."""
+        chunks = [pd.DataFrame({"test": [i]}) for i in range(5)]
+        attempts = []
+        in_flight = set()
+        max_in_flight = []
+        bad_chunks = {3}
+
+        def remote(preprocessor, method_name, df, index, gcs_bucket, gcs_folder):
+            ref = (index, attempts.count(index))
+            attempts.append(index)
+            in_flight.add(ref)
+            max_in_flight.append(len(in_flight))
+            return ref
+
+        def wait(refs, num_returns):
+            # Tasks complete in reverse order of submission
+            return refs[-num_returns:], refs[:-num_returns]
+
+        def get(ref):
+            in_flight.discard(ref)
+            index, attempt = ref
+            if index == 1 and attempt == 0:
+                raise ray.exceptions.RayError("worker died")
+            if index in bad_chunks:
+                raise ray.exceptions.RayError("bad chunk")
+            result = pd.DataFrame({"test": [index]})
+            result.attrs["metrics"] = {"counters": {"rows_in": 1}}
+            return result
+
+        received = {}
+        ray_utils = src.datapreprocessing.ray_utils.RayUtils(
+            ray_cluster_host="local",
+            ray_resources={
+                "num_cpus": 0.5,
+                "scheduling_strategy": "SPREAD",
+                "max_concurrency": 2,
+            },
+            ray_runtime={"pip": ["pandas"]},
+            package_name="datapreprocessing",
+            module_name="datacleaner",
+            class_name="DataPreprocessor",
+            method_name="process_data",
+            df=chunks,
+            gcs_bucket="test_bucket",
+            gcs_folder="test_path",
+            max_in_flight=2,
+            result_callback=lambda index, result: received.update({index: result}),
+            max_task_retries=1,
+        )
+        with patch.object(
+            ray_utils.invoke_process_data, "options"
+        ) as mock_options, patch.object(
+            src.datapreprocessing.ray_utils.ray, "wait", side_effect=wait
+        ), patch.object(
+            src.datapreprocessing.ray_utils.ray, "get", side_effect=get
+        ):
+            mock_options.return_value.remote.side_effect = remote
+            with self.assertRaises(
+                src.datapreprocessing.ray_utils.FailedChunksError
+            ) as raised:
+                ray_utils.run_remote()
+
+        self.assertEqual(raised.exception.failed_chunks, [3])
+        # Actor-only options are not passed to tasks
+        mock_options.assert_called_with(num_cpus=0.5, scheduling_strategy="SPREAD")
+
+        self.assertEqual(max(max_in_flight), 2)
+        self.assertEqual(sorted(received), [0, 1, 2, 4])
+        self.assertEqual(received[1]["test"].tolist(), [1])
+        self.assertEqual(attempts.count(1), 2)
+        self.assertEqual(attempts.count(3), 2)
+        self.assertEqual(ray_utils.failed_chunks, [3])
+        # Retries reuse the chunk references, nothing is put again
+        self.assertEqual(mock_put.call_count, 6)
+        self.assertEqual(ray_utils.run_summary["counters"], {"rows_in": 4})
+        mock_shutdown.assert_called_once()
+
+        # Without a callback, the results are concatenated in chunk order
+        ray_utils.result_callback = None
+        attempts.clear()
+        bad_chunks.clear()
+        with patch.object(
+            ray_utils.invoke_process_data, "options"
+        ) as mock_options, patch.object(
+            src.datapreprocessing.ray_utils.ray, "wait", side_effect=wait
+        ), patch.object(
+            src.datapreprocessing.ray_utils.ray, "get", side_effect=get
+        ):
+            mock_options.return_value.remote.side_effect = remote
+            result_df = ray_utils.run_remote()
+        self.assertEqual(result_df["test"].tolist(), [0, 1, 2, 3, 4])
+
+    @patch.object(src.datapreprocessing.ray_utils.ray, "put", side_effect=lambda v: v)
+    @patch.object(src.datapreprocessing.ray_utils.ray, "init")
+    @patch.object(src.datapreprocessing.ray_utils.ray, "shutdown")
+    def test_run_remote_actor_pool(self, mock_shutdown, mock_ray_init, mock_put):
+        """Test run_remote() on a growing pool of actors that retries the chunk of a dead actor."""
+        actors = []
+        busy = set()
+        max_busy = []
+
+        def create_actor(*args):
+            actor = Mock()
+            actor.name = len(actors)
+            actor.ready.remote.return_value = ("ready", actor.name)
+
+            def process(method_name, df, index, gcs_bucket, gcs_folder):
+                busy.add(actor.name)
+                max_busy.append(len(busy))
+                return (actor.name, index)
+
+            actor.process.remote.side_effect = process
+            actors.append(actor)
+            return actor
+
+        def wait(refs, num_returns=1, timeout=None):
+            if timeout == 0:
+                # Actors start immediately
+                return refs, []
+            return refs[:num_returns], refs[num_returns:]
+
+        def get(ref):
+            name, index = ref
+            busy.discard(name)
+            if name == 0 and index == 0:
+                raise ray.exceptions.RayActorError()
+            return pd.DataFrame({"test": [index]})
+
+        ray_utils = src.datapreprocessing.ray_utils.RayUtils(
+            ray_cluster_host="local",
+            ray_resources={"num_cpus": 1, "max_retries": 3},
+            ray_runtime={"pip": ["pandas"]},
+            package_name="datapreprocessing",
+            module_name="datacleaner",
+            class_name="DataPreprocessor",
+            method_name="process_data",
+            df=[pd.DataFrame({"test": [i]}) for i in range(4)],
+            gcs_bucket="test_bucket",
+            gcs_folder="test_path",
+            class_kwargs={"max_download_workers": 4},
+            max_task_retries=1,
+            min_actors=1,
+            max_actors=2,
+        )
+        with patch.object(
+            ray_utils.processor_actor, "options"
+        ) as mock_options, patch.object(
+            src.datapreprocessing.ray_utils.ray, "wait", side_effect=wait
+        ), patch.object(
+            src.datapreprocessing.ray_utils.ray, "get", side_effect=get
+        ):
+            mock_actor = mock_options.return_value.remote
+            mock_actor.side_effect = create_actor
+            result_df = ray_utils.run_remote()
+
+        self.assertEqual(result_df["test"].tolist(), [0, 1, 2, 3])
+        # Task-only options are not passed to actors
+        mock_options.assert_called_with(num_cpus=1)
+        self.assertEqual(ray_utils.failed_chunks, [])
+        mock_actor.assert_called_with(
+            "datapreprocessing",
+            "datacleaner",
+            "DataPreprocessor",
+            {"max_download_workers": 4},
+        )
+        # The pool grew to two actors, and grew back to two after the first one died
+        self.assertEqual(len(actors), 3)
+        self.assertLessEqual(max(max_busy), 2)
+        processed = [
+            call.args[2]
+            for actor in actors
+            for call in actor.process.remote.call_args_list
+        ]
+        self.assertEqual(sorted(processed), [0, 0, 1, 2, 3])
+
+    def test_ray_resources(self):
+        """Test that unsupported Ray options are rejected."""
+        with self.assertRaises(ValueError):
+            src.datapreprocessing.ray_utils.RayUtils(
+                ray_cluster_host="local",
+                ray_resources={"gpu": 1},
+                ray_runtime={},
+                package_name="datapreprocessing",
+                module_name="datacleaner",
+                class_name="DataPreprocessor",
+                method_name="process_data",
+                df=[],
+                gcs_bucket="test_bucket",
+                gcs_folder="test_path",
+            )
+
+    @patch.object(src.datapreprocessing.ray_utils.ray, "wait")
+    def test_actor_pool_slots(self, mock_wait):
+        """Test that an actor pool runs max_concurrency chunks per actor and drops the slots of a dead actor."""
+        pool = src.datapreprocessing.ray_utils.ElasticActorPool(
+            Mock, min_size=1, max_size=1, slots_per_actor=2
+        )
+        self.assertEqual(pool.capacity(), 2)
+        refs = [pool.submit(lambda actor: (id(actor), i)) for i in range(2)]
+        pool.release(refs[0], ray.exceptions.RayActorError())
+        pool.release(refs[1], ray.exceptions.RayActorError())
+        # The dead actor was replaced, as the pool fell below min_size
+        self.assertEqual(len(pool.actors), 1)
+        self.assertEqual(pool.capacity(), 2)
+        new_actor = pool.actors[0]
+        refs = [pool.submit(lambda actor: (id(actor), i)) for i in range(2)]
+        self.assertEqual(refs, [(id(new_actor), 0), (id(new_actor), 1)])
+
+    @patch.object(src.datapreprocessing.ray_utils.ray, "put", side_effect=lambda v: v)
+    @patch.object(src.datapreprocessing.ray_utils.ray, "init")
+    @patch("src.datapreprocessing.ray_utils.importlib.import_module")
+    @patch.object(src.datapreprocessing.ray_utils.ray, "shutdown")
+    def test_run_remote_resumes_from_checkpoint(
+        self, mock_shutdown, mock_import_module, mock_ray_init, mock_put
+    ):
+        """Test run_remote() only processes the chunks missing from the checkpoint and saves them."""
+        checkpoint = Mock()
+        checkpoint.start.return_value = {1}
+        restored = pd.DataFrame({"test": [10]})
+        restored.attrs["metrics"] = {"counters": {"rows_in": 1}}
+        checkpoint.load_chunk.return_value = restored
+        saved = {}
+        checkpoint.save_chunk.side_effect = lambda index, df: saved.update(
+            {index: dict(df.attrs)}
+        )
+
+        def get(ref):
+            result = pd.DataFrame({"test": [ref]})
+            result.attrs["metrics"] = {"counters": {"rows_in": 1}}
+            return result
+
+        ray_utils = src.datapreprocessing.ray_utils.RayUtils(
+            ray_cluster_host="local",
+            ray_resources={"num_cpus": 1},
+            ray_runtime={"pip": ["pandas"]},
+            package_name="datapreprocessing",
+            module_name="datacleaner",
+            class_name="DataPreprocessor",
+            method_name="process_data",
+            df=[pd.DataFrame({"test": [i]}) for i in range(3)],
+            gcs_bucket="test_bucket",
+            gcs_folder="test_path",
+            max_in_flight=2,
+            checkpoint=checkpoint,
+        )
+        with patch.object(
+            ray_utils.invoke_process_data, "options"
+        ) as mock_options, patch.object(
+            src.datapreprocessing.ray_utils.ray,
+            "wait",
+            side_effect=lambda refs, num_returns: (refs[:1], refs[1:]),
+        ), patch.object(
+            src.datapreprocessing.ray_utils.ray, "get", side_effect=get
+        ):
+            mock_options.return_value.remote.side_effect = (
+                lambda preprocessor, method_name, df, index, bucket, folder: index
+            )
+            result_df = ray_utils.run_remote()
+
+        self.assertEqual(result_df["test"].tolist(), [0, 10, 2])
+        self.assertEqual(
+            checkpoint.start.call_args.args[1]["class_name"], "DataPreprocessor"
+        )
+        processed = [
+            call.args[3] for call in mock_options.return_value.remote.call_args_list
+        ]
+        self.assertEqual(processed, [0, 2])
+        # Chunks are saved with their metrics
+        self.assertEqual(
+            saved, {i: {"metrics": {"counters": {"rows_in": 1}}} for i in (0, 2)}
+        )
+        checkpoint.load_chunk.assert_called_once_with(1)
+        checkpoint.record.assert_called_once_with({0, 1, 2})
+        # The caller finishes the checkpoint once it has written the results
+        checkpoint.finish.assert_not_called()
+        self.assertEqual(ray_utils.run_summary["chunks"], 3)
+
+    def create_local_ray_utils(self, local_backend, **kwargs):
+        return src.datapreprocessing.ray_utils.RayUtils(
+            ray_cluster_host="local",
+            ray_resources=None,
+            ray_runtime=None,
+            package_name="test_datapreprocessing",
+            module_name="test_ray_utils",
+            class_name="ScaleProcessor",
+            method_name="process_data",
+            df=[pd.DataFrame({"test": list(range(i + 1))}) for i in range(4)],
+            gcs_bucket="test_bucket",
+            gcs_folder="test_path",
+            class_kwargs={"factor": 10, "fail_once": [1]},
+            local_backend=local_backend,
+            local_workers=2,
+            # Each worker process fails chunk 1 once
+            max_task_retries=2,
+            **kwargs,
+        )
+
+    @patch.object(src.datapreprocessing.ray_utils.ray, "init")
+    def test_run_remote_local_processes(self, mock_ray_init):
+        """Test run_remote() with the local process backend, which does not start Ray."""
+        ray_utils = self.create_local_ray_utils("process")
+        result_df = ray_utils.run_remote()
+
+        mock_ray_init.assert_not_called()
+        self.assertEqual(
+            result_df["test"].tolist(), [0, 0, 10, 0, 10, 20, 0, 10, 20, 30]
+        )
+        # The processing class is set up in the worker processes
+        self.assertNotIn(os.getpid(), result_df["pid"].tolist())
+        self.assertFalse(result_df["pid"].isna().any())
+        self.assertEqual(ray_utils.failed_chunks, [])
+        self.assertEqual(ray_utils.run_summary["counters"], {"rows_in": 10})
+
+    @patch.object(src.datapreprocessing.ray_utils.ray, "init")
+    def test_run_remote_local_threads(self, mock_ray_init):
+        """Test run_remote() with the local thread backend and a result callback."""
+        results = {}
+        ray_utils = self.create_local_ray_utils(
+            "thread", result_callback=lambda index, df: results.update({index: df})
+        )
+        with self.assertLogs(ray_utils.logger, "WARNING") as logs:
+            self.assertIsNone(ray_utils.run_remote())
+
+        mock_ray_init.assert_not_called()
+        self.assertEqual(sorted(results), [0, 1, 2, 3])
+        self.assertEqual(results[1]["test"].tolist(), [0, 10])
+        # Threads share the processing class, set up in this process
+        self.assertEqual(results[3]["pid"].unique().tolist(), [os.getpid()])
+        self.assertIn("Task of chunk 1 failed, retrying (1/2)", logs.output[0])
+        self.assertEqual(ray_utils.run_summary["chunks"], 4)
+
+    def test_local_backend_validation(self):
+        """Test that local_backend is validated and only accepted for local runs."""
+        with self.assertRaises(ValueError):
+            self.create_local_ray_utils("fork")
+        with self.assertRaises(ValueError):
+            src.datapreprocessing.ray_utils.RayUtils(
+                "ray-head:10001",
+                None,
+                None,
+                "test_datapreprocessing",
+                "test_ray_utils",
+                "ScaleProcessor",
+                "process_data",
+                [],
+                "test_bucket",
+                "test_path",
+                local_backend="thread",
+            )
@@ -111,6 +111,18 @@ resource "google_storage_bucket" "data" {
   name                        = local.bucket_data_name
   project                     = data.google_project.environment.project_id
   uniform_bucket_level_access = true
+
+  # Data processing checkpoints of runs that were never finished, e.g. of Jobs
+  # that failed without being restarted
+  lifecycle_rule {
+    action {
+      type = "Delete"
+    }
+    condition {
+      age            = 7
+      matches_prefix = ["checkpoints/"]
+    }
+  }
 }
 
 resource "google_storage_bucket" "model" {
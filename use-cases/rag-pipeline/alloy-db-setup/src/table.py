@@ -56,9 +56,24 @@ async def create_and_populate(
         logger.info("Resulting df shape: %s", df.shape)
 
         # 2. Transform: Embedding Generation (aiohttp)
-        num_rows = len(df)
+        # Products sharing an image (same canonical image_uri) or a description
+        # get their embeddings computed once and reused.
+        image_codes, image_uris = pd.factorize(df["image_uri"])
+        text_codes, texts = pd.factorize(df["Description"], use_na_sentinel=False)
+        pair_codes = (
+            df.groupby(["image_uri", "Description"], dropna=False, sort=False)
+            .ngroup()
+            .to_numpy()
+        )
+        pairs = df.drop_duplicates(subset=["image_uri", "Description"])
         embedding_tasks = []
-        logger.info("Starting embedding generation...")
+        logger.info(
+            "Starting embedding generation for %d rows: %d multimodal, %d text and %d image embeddings...",
+            len(df),
+            len(pairs),
+            len(texts),
+            len(image_uris),
+        )
 
         # ClientSession outside loop for connection reuse. Timeout included.
         timeout_settings = aiohttp.ClientTimeout(
@@ -69,28 +84,29 @@ async def create_and_populate(
             raise_for_status=True,
             timeout=timeout_settings,
         ) as session:
-            for i in range(num_rows):
-                row = df.iloc[i]
-                # Start all tasks concurrently for max performance
+            # Start all tasks concurrently for max performance
+            for image_uri, description in zip(pairs["image_uri"], pairs["Description"]):
                 embedding_tasks.append(
                     get_emb.get_embeddings_async(
                         session,
-                        row["image_uri"],
-                        row["Description"],
+                        image_uri,
+                        description,
                         timeout_settings,
                     )
                 )
+            for description in texts:
                 embedding_tasks.append(
                     get_emb.get_embeddings_async(
                         session,
-                        text=row["Description"],
+                        text=description,
                         timeout_settings=timeout_settings,
                     )
                 )
+            for image_uri in image_uris:
                 embedding_tasks.append(
                     get_emb.get_embeddings_async(
                         session,
-                        image_uri=row["image_uri"],
+                        image_uri=image_uri,
                         timeout_settings=timeout_settings,
                     )
                 )
@@ -98,13 +114,13 @@ async def create_and_populate(
             all_results = await asyncio.gather(*embedding_tasks)
 
         # Reshape Results
-        multimodal_results = all_results[::3]
-        text_results = all_results[1::3]
-        image_results = all_results[2::3]
+        multimodal_results = all_results[: len(pairs)]
+        text_results = all_results[len(pairs) : len(pairs) + len(texts)]
+        image_results = all_results[len(pairs) + len(texts) :]
 
-        df["multimodal_embeddings"] = multimodal_results
-        df["text_embeddings"] = text_results
-        df["image_embeddings"] = image_results
+        df["multimodal_embeddings"] = [multimodal_results[code] for code in pair_codes]
+        df["text_embeddings"] = [text_results[code] for code in text_codes]
+        df["image_embeddings"] = [image_results[code] for code in image_codes]
 
         logger.info("Embedding generation completed")
 
@@ -19,6 +19,7 @@ import signal
 import sys
 
 import numpy as np
+from datapreprocessing.checkpoint import RunCheckpoint
 from datapreprocessing.datacleaner import DataPrepForRag
 from datapreprocessing.dataloader import DataLoader
 from datapreprocessing.dataprep import DataPrep
@@ -28,6 +29,14 @@ IMAGE_BUCKET = os.environ["PROCESSING_BUCKET"]
 RAY_CLUSTER_HOST = os.environ["RAY_CLUSTER_HOST"]
 # Check if this can be passed an env to the container like IMAGE_BUCKET
 GCS_IMAGE_FOLDER = "flipkart_images"
+# Completed chunks are checkpointed under this run ID, a restarted run resumes
+# from them. The Job sets it to its UID, so every Job is a new run. A run ID
+# reused after its run completed, or with a different input or configuration,
+# starts over.
+CHECKPOINT_RUN_ID = os.environ.get("CHECKPOINT_RUN_ID", "preprocessing_rag")
+# With RAY_CLUSTER_HOST=local, "process" or "thread" runs the chunks on a local
+# pool of workers instead of starting a Ray runtime, e.g. for development.
+LOCAL_BACKEND = os.environ.get("LOCAL_BACKEND")
 
 # Configure logging at the module level
 logging.config.fileConfig("logging.conf")
@@ -46,8 +55,9 @@ def graceful_shutdown(signal_number, stack_frame):
     signal_name = signal.Signals(signal_number).name
 
     logger.info(f"Received {signal_name}({signal_number}), shutting down...")
-    # TODO: Add logic to handled checkpointing if required
-    sys.exit(0)
+    # Completed chunks are already checkpointed. Exit with a failure so the Job
+    # restarts the run, which resumes from the checkpoint.
+    sys.exit(128 + signal_number)
 
 
 def preprocess_rag():
@@ -87,7 +97,9 @@ def preprocess_rag():
         "product_specifications",
         "product_category_tree",
     ]
-    ray_resources = {"cpu": 1}
+    # Ray options of the actors processing the chunks. The head node has no CPUs,
+    # so chunks only run on the workers, spread across them.
+    ray_resources = {"num_cpus": 1, "scheduling_strategy": "SPREAD"}
     ray_runtime_env = {
         "py_modules": ["./datapreprocessing"],  # Path to your module's directory
         "pip": [
@@ -95,27 +107,64 @@ def preprocess_rag():
             "spacy==3.7.6",
             "jsonpickle==4.0.1",
             "pandas==2.2.3",
+            "pillow==11.0.0",
             "pydantic==2.10.5",
         ],
         "env_vars": {"PIP_NO_CACHE_DIR": "1", "PIP_DISABLE_PIP_VERSION_CHECK": "1"},
     }
     chunk_size = 199
+    # The 32 CPUs of the Ray worker group at its maximum size
+    max_actors = 32
     # The following 4 parameters define which method to run as ray remote
     package_name = "datapreprocessing"
     module_name = "datacleaner"
     class_name = "DataPreprocessor"
     method_name = "process_data"
+    # Keyword arguments used to instantiate the class above
+    class_kwargs = {
+        "max_download_workers": 16,
+        "skip_existing_images": True,
+        "hedged_fetch_urls": 2,
+        # The images come from a single CDN host, allow a request per download
+        # worker and hedge so no download waits for a connection.
+        "max_connections_per_host": 32,
+        "use_negative_cache": True,
+        # Store compact images so the embedding server does not resize them on every call.
+        # dedup_images is left off, reruns skip existing images by their product names.
+        "normalize_images": True,
+        # Shared by the worker processes of a node, on its local disk. The file lasts
+        # as long as the worker pod, reruns only reuse it while the workers are up.
+        "description_cache_path": "/tmp/cache/descriptions.db",
+    }
 
     logger.info("Started")
-    data_loader = DataLoader(IMAGE_BUCKET, input_processing_file)
+    # Only the required columns are parsed, the rest of the catalog is skipped.
+    # The catalog is cached on the emptyDir volume of the Job pod, so a restarted
+    # container reuses it while its generation is unchanged. A new pod downloads it again.
+    data_loader = DataLoader(
+        IMAGE_BUCKET,
+        input_processing_file,
+        usecols=required_cols,
+        cache_dir="/tmp/cache/raw",
+    )
     df = data_loader.load_raw_data()
 
-    data_prep = DataPrep(df, required_cols, filter_null_cols, chunk_size)
+    # Chunks of about equal estimated cost, so a few heavy chunks do not hold up the run.
+    # Their number is a few waves of the actor pool at its maximum size.
+    data_prep = DataPrep(
+        df,
+        required_cols,
+        filter_null_cols,
+        chunk_size,
+        partitioning="contiguous",
+        num_workers=max_actors,
+    )
     df = data_prep.update_dataframe()
 
     # Chunk the dataset
     res = data_prep.split_dataframe()
 
+    checkpoint = RunCheckpoint(IMAGE_BUCKET, "checkpoints", CHECKPOINT_RUN_ID)
     # create a RayUtils object with the info required to run a task
     ray_obj = RayUtils(
         RAY_CLUSTER_HOST,
@@ -128,7 +177,19 @@ def preprocess_rag():
         res,
         IMAGE_BUCKET,
         GCS_IMAGE_FOLDER,
+        class_kwargs,
+        # Process chunks on a pool of actors that load the spaCy model and clients
+        # once, growing up to the 32 CPUs of the worker group at its maximum size.
+        # Results are collected as chunks complete and failed chunks are retried.
+        min_actors=2,
+        max_actors=max_actors,
+        max_task_retries=2,
+        checkpoint=checkpoint,
+        local_backend=LOCAL_BACKEND,
     )
+    # Raises FailedChunksError when chunks failed after their retries, so no
+    # incomplete output is written. The Job restarts the container, which only
+    # processes the chunks missing from the checkpoint.
     result_df = ray_obj.run_remote()
     # Replace NaN with None
     result_df = result_df.replace({np.nan: None})
@@ -140,6 +201,8 @@ def preprocess_rag():
         "gs://" + IMAGE_BUCKET + rag_output_file,
         index=False,
     )
+    # The output is written, the checkpointed chunks are no longer needed
+    checkpoint.finish()
     logger.info("Finished")
 
 